@@ -203,6 +203,7 @@ LOGS_MEASUREMENT = "app_logs"
 METRICS_MEASUREMENT = "metric_logs"
 STRESS_MEASUREMENT = "stress_logs"
 ALERT_MEASUREMENT = "alert_events"
+ZMQ_SERVER_STATS_MEASUREMENT = "zmq_server_stats"
 
 # Message-Server msgs types:
 LOGS_HANDLER_MSG_TYPE = "logs"
@@ -213,6 +214,8 @@ METRICS_HANDLER_MSG_TYPE = "metrics"
 METRICS_QUERY_HANDLER_MSG_TYPE = "metrics_query"
 NOTIFICATIONS_HANDLER_MSG_TYPE = "notifications"
 ALERT_QUERY_HANDLER_MSG_TYPE = "alerts_query"
+BATCH_HANDLER_MSG_TYPE = "batch"
+SERVER_STATS_MSG_TYPE = "server_stats"
 
 CALLBACK_STDOUT_COLORS = {
     logging.DEBUG: "\033[36m",
@@ -235,3 +238,31 @@ SPAWNER_STDOUT_COLORS = {
 class DeactivationType:
     REQUESTED = "requested"
     AUTO_CLEARED = "auto_cleared"
+
+
+class OverflowPolicy:
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+
+
+class ExecutorType:
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class Priority:
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+# the priority lanes of the message types, the other types are of normal priority
+MSG_TYPE_PRIORITIES = {
+    COMMAND_HANDLER_MSG_TYPE: Priority.HIGH,
+    LOGS_HANDLER_MSG_TYPE: Priority.LOW,
+    SYSLOGS_HANDLER_MSG_TYPE: Priority.LOW,
+    BATCH_HANDLER_MSG_TYPE: Priority.LOW,
+}
+# the requests a ZMQServer handles from each lane in turn while the lanes are busy
+PRIORITY_WEIGHTS = {Priority.HIGH: 8, Priority.NORMAL: 2, Priority.LOW: 1}
@@ -12,14 +12,15 @@
 """
 from datetime import datetime
 import time
-from typing import TYPE_CHECKING, Optional, cast
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple, cast
 
+from movai_core_shared.consts import BATCH_HANDLER_MSG_TYPE, MSG_TYPE_PRIORITIES, Priority
 from movai_core_shared.core.zmq.zmq_manager import ZMQManager, ZMQType, AsyncZMQClient
 from movai_core_shared.envvars import DEVICE_NAME, FLEET_NAME, SERVICE_NAME
 from movai_core_shared.exceptions import ArgumentError, MessageFormatError
 
 if TYPE_CHECKING:
-    from movai_core_shared.core.zmq.zmq_client import ZMQClient
+    from movai_core_shared.core.zmq.zmq_client import ZMQClient, PendingReply
 
 
 class MessageClient:
@@ -29,7 +30,7 @@ class MessageClient:
     the message-server using ZMQClient.
     """
 
-    _zmq_client: "ZMQClient"
+    _zmq_type = ZMQType.CLIENT
 
     def __init__(self, server_addr: str, robot_id: str = "") -> None:
         """
@@ -61,7 +62,25 @@ class MessageClient:
         """
         Initializes the ZMQ attributute.
         """
-        self._zmq_client = ZMQManager.get_client(self._server_addr, ZMQType.CLIENT)
+        ZMQManager.get_client(self._server_addr, self._zmq_type)
+
+    @property
+    def _zmq_client(self) -> "ZMQClient":
+        """The ZMQ client to use, which may be dedicated to the calling thread."""
+        return ZMQManager.get_client(self._server_addr, self._zmq_type)
+
+    def _lane_client(self, msg_type: Optional[str]) -> "ZMQClient":
+        """Returns the ZMQ client of the priority lane of a message type,
+        so commands are not sent behind a flood of logs.
+
+        Args:
+            msg_type (str): The type of the message.
+
+        Returns:
+            ZMQClient: The client to send the message with.
+        """
+        priority = MSG_TYPE_PRIORITIES.get(msg_type, Priority.NORMAL)
+        return ZMQManager.get_client(self._server_addr, self._zmq_type, priority)
 
     def _build_request(
         self,
@@ -82,17 +101,10 @@ class MessageClient:
         Returns:
             {dict}: The message request to send the message-server
         """
-        if creation_time is None:
-            creation_time_ns = time.time_ns()
-        else:
-            creation_time_ns = (
-                creation_time.timestamp() * 1000000000 + creation_time.microsecond * 1000
-            )
-
         request = {
             "request": {
                 "req_type": msg_type,
-                "created": creation_time_ns,
+                "created": self._creation_time_ns(creation_time),
                 "response_required": response_required,
                 "req_data": data,
                 "robot_info": self._robot_info,
@@ -100,6 +112,41 @@ class MessageClient:
         }
         return request
 
+    @staticmethod
+    def _creation_time_ns(creation_time: Optional[datetime] = None) -> int:
+        """Converts the creation time of a request to nanoseconds.
+
+        Args:
+            creation_time (datetime, optional): The time the request was created. Defaults to now.
+
+        Returns:
+            int: The creation time in nanoseconds.
+        """
+        if creation_time is None:
+            return time.time_ns()
+        return creation_time.timestamp() * 1000000000 + creation_time.microsecond * 1000
+
+    def _build_batch(self, entries: Iterable[Tuple]) -> dict:
+        """Packs many requests in one request, the robot_info is sent only once.
+
+        Args:
+            entries (Iterable[Tuple]): (msg_type, data) or (msg_type, data, created_ns) tuples,
+                created_ns defaults to now.
+
+        Returns:
+            {dict}: The batch request to send the message-server
+        """
+        now = time.time_ns()
+        requests = [
+            {
+                "req_type": entry[0],
+                "created": entry[2] if len(entry) > 2 else now,
+                "req_data": entry[1],
+            }
+            for entry in entries
+        ]
+        return self._build_request(BATCH_HANDLER_MSG_TYPE, {"requests": requests})
+
     def _fetch_response(self, msg) -> dict:
         """Extracts the response from the message.
 
@@ -142,14 +189,51 @@ class MessageClient:
         # Add tags to the request data
         request = self._build_request(msg_type, data, creation_time, response_required)
 
-        self._zmq_client.send(request, use_lock=True)
+        zmq_client = self._lane_client(msg_type)
         if response_required:
-            msg = self._zmq_client.receive(use_lock=True)
+            msg = zmq_client.submit(request).result()
             response = self._fetch_response(msg)
             return response
 
+        zmq_client.send(request, use_lock=True)
         return {}
 
+    def send_batch(self, entries: Iterable[Tuple]) -> None:
+        """
+        Packs many requests into a single message to the robot message server,
+        the message server handles each one of them as if it was sent on its own.
+        Won't wait for response.
+
+        Args:
+            entries (Iterable[Tuple]): (msg_type, data) or (msg_type, data, created_ns) tuples,
+                created_ns defaults to now.
+        """
+        request = self._build_batch(entries)
+        if request["request"]["req_data"]["requests"]:
+            self._lane_client(BATCH_HANDLER_MSG_TYPE).send(request, use_lock=True)
+
+    def submit_request(
+        self,
+        msg_type: str,
+        data: dict,
+        creation_time: Optional[datetime] = None,
+    ) -> "PendingReply":
+        """
+        Wrap the data into a message request and sent it to the robot message server
+        without waiting for the response, so many requests can be in flight at once.
+
+        Args:
+            msg_type (str): the type of message.
+            data (dict): The message data to be sent to the robot message server.
+            creation_time (datetime, optional): The time where the request is created.
+                Defaults to now.
+
+        Returns:
+            PendingReply: A handle, its result() returns the response of the server.
+        """
+        request = self._build_request(msg_type, data, creation_time, True)
+        return self._lane_client(msg_type).submit(request)
+
     def forward_request(self, request_msg: dict) -> dict:
         """forwards a request to different message-server (This function does
         not adds the meta-data info as send_request does).
@@ -162,12 +246,19 @@ class MessageClient:
         else:
             request = request_msg
 
-        self._zmq_client.send(request, use_lock=True)
         response_required = request["request"].get("response_required")
+        zmq_client = self._lane_client(request["request"].get("req_type"))
 
         if response_required:
-            response = self._zmq_client.receive(use_lock=True)
+            # keep the id of the original sender, the reply is matched using our own id
+            req_id = request["request"].get("req_id")
+            response = zmq_client.submit(request).result()
+            request["request"]["req_id"] = req_id
+            if response and req_id is not None:
+                response["req_id"] = req_id
             return response
+
+        zmq_client.send(request, use_lock=True)
         return {}
 
     def send_msg(self, data: dict, **kwargs) -> None:
@@ -187,15 +278,16 @@ class MessageClient:
 
 
 class AsyncMessageClient(MessageClient):
-    _zmq_client: AsyncZMQClient
+    _zmq_type = ZMQType.ASYNC_CLIENT
 
-    def _init_zmq_client(self) -> None:
-        """
-        Initializes the ZMQ attributute.
-        """
-        self._zmq_client = cast(
-            AsyncZMQClient, ZMQManager.get_client(self._server_addr, ZMQType.ASYNC_CLIENT)
-        )
+    @property
+    def _zmq_client(self) -> AsyncZMQClient:
+        """The async ZMQ client to use."""
+        return cast(AsyncZMQClient, ZMQManager.get_client(self._server_addr, self._zmq_type))
+
+    def _lane_client(self, msg_type: Optional[str]) -> AsyncZMQClient:
+        """The async ZMQ client of the priority lane of a message type."""
+        return cast(AsyncZMQClient, super()._lane_client(msg_type))
 
     async def send_request(
         self,
@@ -216,14 +308,46 @@ class AsyncMessageClient(MessageClient):
         """
         request = self._build_request(msg_type, data, creation_time, response_required)
 
-        await self._zmq_client.send(request)
+        zmq_client = self._lane_client(msg_type)
         if response_required:
-            msg = await self._zmq_client.receive()
+            msg = await zmq_client.request(request)
             response = self._fetch_response(msg)
             return response
 
+        await zmq_client.send(request)
         return {}
 
+    def enqueue_request(
+        self, msg_type: str, data: dict, creation_time: Optional[datetime] = None
+    ) -> bool:
+        """
+        Wrap the data into a message request and queue it to be sent to the robot message server
+        by a background task, the number of pending messages is bounded by the send queue.
+        Must be called from the event loop, won't wait for response.
+
+        Args:
+            msg_type (str): the type of message.
+            data (dict): The message data to be sent to the robot message server.
+            creation_time (str): The time where the request is created.
+        Returns:
+            (bool): True if the request was queued, False if it was dropped.
+        """
+        request = self._build_request(msg_type, data, creation_time)
+        return self._lane_client(msg_type).enqueue_nowait(request)
+
+    async def send_batch(self, entries: Iterable[Tuple]) -> None:
+        """
+        Packs many requests into a single message and sends it asynchronously
+        to the robot message server. Won't wait for response.
+
+        Args:
+            entries (Iterable[Tuple]): (msg_type, data) or (msg_type, data, created_ns) tuples,
+                created_ns defaults to now.
+        """
+        request = self._build_batch(entries)
+        if request["request"]["req_data"]["requests"]:
+            await self._lane_client(BATCH_HANDLER_MSG_TYPE).send(request)
+
     async def forward_request(self, request_msg: dict) -> dict:
         """
         Send the request asynchronously to different message-server (This function does
@@ -236,17 +360,25 @@ class AsyncMessageClient(MessageClient):
             request = {"request": request_msg}
         else:
             request = request_msg
-        await self._zmq_client.send(request)
 
         response_required = request["request"].get("response_required")
+        zmq_client = self._lane_client(request["request"].get("req_type"))
         if response_required is None:
+            await zmq_client.send(request)
             raise MessageFormatError(
                 f"The field response_required is missing from request message {request}."
             )
 
         if response_required:
-            response = await self._zmq_client.receive()
+            # keep the id of the original sender, the reply is matched using our own id
+            req_id = request["request"].get("req_id")
+            response = await zmq_client.request(request)
+            request["request"]["req_id"] = req_id
+            if response and req_id is not None:
+                response["req_id"] = req_id
             return response
+
+        await zmq_client.send(request)
         return {}
 
     async def send_msg(self, data: dict, **kwargs) -> None:
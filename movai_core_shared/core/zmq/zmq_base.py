@@ -41,6 +41,12 @@ class ZMQBase(ABC):
         if self._socket:
             self._socket.close()
 
+    @classmethod
+    def reset_context(cls) -> None:
+        """Replaces the context shared by the sockets of the class, a forked child process
+        can not use the context of its parent."""
+        cls._context = zmq.Context()
+
     @abstractmethod
     def init_socket(self):
         """
@@ -0,0 +1,113 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Caches the responses of the idempotent requests of a ZMQServer.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import time
+from typing import Any, Dict, Tuple
+
+from pydantic import BaseModel
+
+from movai_core_shared.messages.general_data import Request
+
+# returned by ResponseCache.get() when the response is not cached, None is a valid response
+MISS = object()
+
+
+def make_cache_key(request: Request) -> str:
+    """Hashes the req_type and the req_data of a request, the order of the keys is ignored.
+
+    Args:
+        request (Request): The validated request.
+
+    Returns:
+        str: The key of the response in the cache.
+    """
+    req_data = getattr(request, "req_data", None)
+    if isinstance(req_data, BaseModel):
+        req_data = req_data.model_dump(mode="json")
+    canonical = json.dumps(
+        [request.req_type, req_data], sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha1(canonical.encode("utf8")).hexdigest()
+
+
+class ResponseCache:
+    """A LRU cache of responses which expire after ttl seconds,
+    bounded by the encoded size of the responses."""
+
+    def __init__(self, ttl: float, max_bytes: int) -> None:
+        """Constructor
+
+        Args:
+            ttl (float): The seconds a response is served from the cache.
+            max_bytes (int): The total size of the cached responses.
+        """
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        # key: (expiration time, response, size), the least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Any:
+        """Returns a cached response.
+
+        Args:
+            key (str): The key of the response.
+
+        Returns:
+            Any: The response, MISS if it is not cached or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return MISS
+        expires, response, size = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return MISS
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return response
+
+    def put(self, key: str, response: Any, size: int) -> None:
+        """Caches a response, evicting the least recently used ones to make room.
+
+        Args:
+            key (str): The key of the response.
+            response (Any): The response data.
+            size (int): The size of the encoded response.
+        """
+        if self._ttl <= 0 or size > self._max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        while self._entries and self._bytes + size > self._max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats["evictions"] += 1
+        self._entries[key] = (time.monotonic() + self._ttl, response, size)
+        self._bytes += size
+
+    def clear(self) -> None:
+        """Removes all the cached responses."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the hit, miss, eviction and expiration counters and the cache size."""
+        stats = dict(self._stats)
+        stats["entries"] = len(self._entries)
+        stats["bytes"] = self._bytes
+        return stats
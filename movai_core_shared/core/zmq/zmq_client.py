@@ -14,18 +14,121 @@ import asyncio
 import errno
 import threading
 import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
 import zmq
 import zmq.asyncio
 
+from movai_core_shared.consts import OverflowPolicy
 from movai_core_shared.core.zmq.zmq_base import ZMQBase
-from movai_core_shared.core.zmq.zmq_helpers import create_msg, extract_reponse
-from movai_core_shared.envvars import MOVAI_ZMQ_SEND_TIMEOUT_MS, MOVAI_ZMQ_RECV_TIMEOUT_MS
+from movai_core_shared.core.zmq.zmq_health import get_endpoint_health, get_health_monitor
+from movai_core_shared.core.zmq.zmq_reconnect import ReconnectStrategy
+from movai_core_shared.core.zmq.zmq_helpers import (
+    DEFAULT_CODEC,
+    create_frames,
+    extract_reponse,
+    extract_request_id,
+    stamp_request_id,
+)
+from movai_core_shared.envvars import (
+    MOVAI_ZMQ_SEND_TIMEOUT_MS,
+    MOVAI_ZMQ_RECV_TIMEOUT_MS,
+    MOVAI_ZMQ_PIPELINE_WINDOW,
+    MOVAI_ZMQ_RECONNECT_BASE_MS,
+    MOVAI_ZMQ_RECONNECT_MAX_MS,
+    MOVAI_ZMQ_HEARTBEAT_IVL_MS,
+    MOVAI_ZMQ_HEARTBEAT_TIMEOUT_MS,
+    MOVAI_ZMQ_HEARTBEAT_TTL_MS,
+    MOVAI_ZMQ_DEALER_SNDHWM,
+    MOVAI_ZMQ_DEALER_RCVHWM,
+    MOVAI_ZMQ_PUB_SNDHWM,
+    MOVAI_ZMQ_SUB_RCVHWM,
+    MOVAI_ZMQ_ZERO_COPY,
+    MOVAI_ZMQ_SEND_QUEUE_SIZE,
+    MOVAI_ZMQ_SEND_QUEUE_POLICY,
+)
+
+# (SNDHWM, RCVHWM) by socket type, the receive side of publishers only gets subscriptions
+# and the send side of subscribers is not used.
+HWM_PROFILES: Dict[int, Tuple[int, int]] = {
+    zmq.DEALER: (MOVAI_ZMQ_DEALER_SNDHWM, MOVAI_ZMQ_DEALER_RCVHWM),
+    zmq.ROUTER: (MOVAI_ZMQ_DEALER_SNDHWM, MOVAI_ZMQ_DEALER_RCVHWM),
+    zmq.PUB: (MOVAI_ZMQ_PUB_SNDHWM, MOVAI_ZMQ_PUB_SNDHWM),
+    zmq.XPUB: (MOVAI_ZMQ_PUB_SNDHWM, MOVAI_ZMQ_PUB_SNDHWM),
+    zmq.SUB: (MOVAI_ZMQ_SUB_RCVHWM, MOVAI_ZMQ_SUB_RCVHWM),
+}
+# the socket types bound to the address, the other ones connect to it
+BIND_SOCKET_TYPES = (zmq.ROUTER, zmq.PUB, zmq.XPUB)
+# milliseconds a thread waiting for a reply polls the socket before letting the other
+# threads sharing the client send their requests
+POLL_SLICE_MS = 10
+
+
+class PendingReply:
+    """A future-like handle to the reply of a request sent with ZMQClient.submit()"""
+
+    def __init__(self, client: "ZMQClient", req_id: str) -> None:
+        self._client = client
+        self._response = None
+        self.req_id = req_id
+        self.sent_at = time.monotonic()
+
+    def done(self) -> bool:
+        """Returns True if the reply has arrived (or the request timed out)."""
+        return self._response is not None
+
+    def set_result(self, response: dict) -> None:
+        """Sets the reply of the request."""
+        self._response = response
+
+    def result(self, timeout: Optional[float] = None) -> dict:
+        """Waits for the reply of the request.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the reply.
+                Defaults to MOVAI_ZMQ_RECV_TIMEOUT_MS.
+        Returns:
+            (dict): A response from the server.
+            In case of a timeout, an empty dict is returned.
+        """
+        if not self.done():
+            self._client.wait_for(self, timeout)
+        return self._response
 
 
-class ZMQClient(ZMQBase):
+class ZMQClient(ZMQBase):  # pylint: disable=too-many-instance-attributes
     """A very basic implementation of ZMQ Client"""
 
     zmq_socket_type = zmq.DEALER
+    pipeline_window = MOVAI_ZMQ_PIPELINE_WINDOW
+    codec = DEFAULT_CODEC
+    # receive zmq.Frame objects and decode them from their buffer instead of copying to bytes
+    zero_copy = MOVAI_ZMQ_ZERO_COPY
+
+    def __init__(self, identity: str, addr: str) -> None:
+        """Initializes the object and the connection to the server.
+
+        Args:
+            identity (str): A unique identity which will be used by
+                the server to identify the client.
+            addr (str): The server addr and port in the form:
+                'tcp://server_addr:port'
+        """
+        self._pending: Dict[str, Union[PendingReply, asyncio.Future]] = OrderedDict()
+        self._reconnect = ReconnectStrategy()
+        self._health = get_endpoint_health(addr)
+        self._stats = {"send_timeouts": 0, "dropped": 0}
+        # None when no reset is scheduled, otherwise whether to discard the unsent messages
+        self._scheduled_reset: Optional[bool] = None
+        # set once a request timed out, its reply may still arrive on the socket
+        self._stale = False
+        # the number of sockets built, a rebuilt socket connects with a new identity
+        self._generation = 0
+        # set once a reply echoed its request id, until then the replies of a server
+        # which predates request ids can only be matched to a single request in flight
+        self._echoes_req_id = False
+        super().__init__(identity, addr)
 
     def init_lock(self) -> None:
         """Initializes the lock."""
@@ -44,8 +147,50 @@ class ZMQClient(ZMQBase):
         else:
             self._reset(force)
 
+    def schedule_reset(self, force: bool = False) -> None:
+        """Schedules a reset of the socket, the socket is rebuilt by the next send
+        once the backoff delay of the reconnect strategy has passed.
+        A socket bound to the address is rebuilt right away, its peers can only
+        reconnect once it is bound again.
+
+        Args:
+            force (bool): whether to discard the unsent messages on reset.
+        """
+        if self._scheduled_reset is not None:
+            self._scheduled_reset = self._scheduled_reset or force
+        elif self.zmq_socket_type in BIND_SOCKET_TYPES:
+            self._reset(force)
+        else:
+            self._schedule(force)
+
+    def _schedule(self, force: bool) -> None:
+        """Schedules a reset after the backoff delay of the reconnect strategy."""
+        delay = self._reconnect.schedule()
+        self._scheduled_reset = force
+        self._logger.warning("Resetting ZMQ %s in %.2f seconds.", self._addr, delay)
+
+    def _reset_if_due(self) -> None:
+        """Rebuilds the socket if a scheduled reset is due, or right away if it is closed.
+        A stale socket is rebuilt as soon as no request is in flight, so the late replies
+        of the expired requests are discarded instead of reaching the next request."""
+        if self._scheduled_reset is None:
+            return
+        if self._stale:
+            due = not self._pending
+        else:
+            due = self._reconnect.remaining() == 0
+        if due or self._socket is None or self._socket.closed:
+            self._reset(self._scheduled_reset)
+
+    def _discard_late_replies(self) -> None:
+        """Marks the socket as stale after a request timed out and schedules a forced reset."""
+        self._stale = True
+        self.schedule_reset(force=True)
+
     def _reset(self, force: bool = False) -> None:
         """Resets the socket and reconnects to the server."""
+        self._scheduled_reset = None
+        self._stale = False
         if self._socket and not self._socket.closed:
             if force:
                 # Setting LINGER to 0 means that the socket will not wait at all
@@ -53,27 +198,68 @@ class ZMQClient(ZMQBase):
                 self._socket.setsockopt(zmq.LINGER, 0)
                 self._logger.info("ZMQ resetting %s with force", self._addr)
             self._socket.close()
-            time.sleep(0.1)
 
         self._socket: zmq.Socket = self._context.socket(self.zmq_socket_type)
-        self._socket.setsockopt(zmq.IDENTITY, self._identity)
+        rebuilt = self._generation > 0
+        identity = self._identity
+        if rebuilt:
+            # a ROUTER ignores a connection reusing the identity of one it has not released yet
+            identity += f"-{self._generation}".encode("utf-8")
+        self._generation += 1
+        self._socket.setsockopt(zmq.IDENTITY, identity)
+        # libzmq reconnects the underlying connection with its own backoff
+        self._socket.setsockopt(zmq.RECONNECT_IVL, MOVAI_ZMQ_RECONNECT_BASE_MS)
+        self._socket.setsockopt(zmq.RECONNECT_IVL_MAX, MOVAI_ZMQ_RECONNECT_MAX_MS)
+        if self.zmq_socket_type in HWM_PROFILES:
+            sndhwm, rcvhwm = HWM_PROFILES[self.zmq_socket_type]
+            self._socket.setsockopt(zmq.SNDHWM, sndhwm)
+            self._socket.setsockopt(zmq.RCVHWM, rcvhwm)
         if self.zmq_socket_type in [zmq.DEALER]:
             self._logger.info("ZMQ connecting DEALER to: %s", self._addr)
             self._socket.setsockopt(zmq.RCVTIMEO, int(MOVAI_ZMQ_RECV_TIMEOUT_MS))
             self._socket.setsockopt(zmq.SNDTIMEO, int(MOVAI_ZMQ_SEND_TIMEOUT_MS))
+            if MOVAI_ZMQ_HEARTBEAT_IVL_MS > 0:
+                # drop dead connections without waiting for a request to time out
+                self._socket.setsockopt(zmq.HEARTBEAT_IVL, MOVAI_ZMQ_HEARTBEAT_IVL_MS)
+                self._socket.setsockopt(zmq.HEARTBEAT_TIMEOUT, MOVAI_ZMQ_HEARTBEAT_TIMEOUT_MS)
+                self._socket.setsockopt(zmq.HEARTBEAT_TTL, MOVAI_ZMQ_HEARTBEAT_TTL_MS)
+                # a heartbeat timeout disconnects the socket, which marks the endpoint down
+                get_health_monitor().watch(self._socket, self._health)
             self._socket.connect(self._addr)
         elif self.zmq_socket_type in [zmq.SUB]:
             self._logger.info("ZMQ connecting SUBSCRIBER to: %s", self._addr)
             self._socket.setsockopt_string(zmq.SUBSCRIBE, "")
             self._socket.connect(self._addr)
-        elif self.zmq_socket_type in [zmq.ROUTER, zmq.PUB]:
+        elif self.zmq_socket_type in BIND_SOCKET_TYPES:
             self._logger.info("ZMQ connecting ROUTER/PUBLISHER to: %s", self._addr)
             self._socket.setsockopt(zmq.SNDTIMEO, int(MOVAI_ZMQ_SEND_TIMEOUT_MS))
-            self._socket.bind(self._addr)
-            self._logger.info("%s is bounded to: %s", self.__class__.__name__, self._addr)
+            if self.zmq_socket_type == zmq.XPUB:
+                # wait for slow subscribers instead of silently dropping their messages
+                self._socket.setsockopt(zmq.XPUB_NODROP, 1)
+            self._bind(rebuilt, force)
         else:
             self._logger.critical("ZMQ %s has an unsupported socket type.", self._addr)
 
+    def _bind(self, rebuilt: bool, force: bool) -> None:
+        """Binds the socket to the address. The address of the socket closed by a reset
+        may not be released yet, the reset then stays scheduled and the bind is retried
+        by the next sends with the backoff of the reconnect strategy.
+
+        Args:
+            rebuilt (bool): whether the socket replaces a closed one.
+            force (bool): whether the reset discards the unsent messages.
+        """
+        try:
+            self._socket.bind(self._addr)
+        except zmq.error.ZMQError as exc:
+            if not rebuilt or exc.errno != errno.EADDRINUSE:
+                raise exc
+            self._logger.warning("ZMQ failed to bind %s: %s", self._addr, exc)
+            self._schedule(force)
+            return
+        self._reconnect.succeeded()
+        self._logger.info("%s is bounded to: %s", self.__class__.__name__, self._addr)
+
     def handle_socket_errors(self, exc: zmq.error.ZMQError, reset_socket=True) -> None:
         """Handles the socket errors
         Args:
@@ -88,12 +274,12 @@ class ZMQClient(ZMQBase):
             self._logger.warning("ZMQ socket error: %s got exception: %s.", self._addr, exc)
             if reset_socket:
                 self._logger.warning("Resetting ZMQ %s with potential data loss.", self._addr)
-                self.reset(force=True)
+                self.schedule_reset(force=True)
         elif exc.errno == errno.EAGAIN:
             self._logger.warning("ZMQ socket error: %s got exception: %s.", self._addr, exc)
+            self._health.record_failure()
             if reset_socket:
-                self._logger.warning("Resetting ZMQ %s.", self._addr)
-                self.reset()
+                self.schedule_reset()
         else:
             self._logger.error(
                 "ZMQ socket error: %s got unhandled ZMQ exception: %s ", self._addr, exc
@@ -109,12 +295,17 @@ class ZMQClient(ZMQBase):
             None
         """
         try:
-            data = create_msg(msg)
+            frames = create_frames(msg, self.codec)
             if use_lock and self._lock:
                 with self._lock:
-                    self._socket.send(data)
+                    self._reset_if_due()
+                    self._socket.send_multipart(frames)
             else:
-                self._socket.send(data)
+                self._reset_if_due()
+                self._socket.send_multipart(frames)
+        except zmq.error.Again as exc:
+            self._count_send_timeout()
+            raise exc
         except Exception as exc:
             self._logger.error("ZMQ failed to send message, got exception of type %s", exc)
             raise exc
@@ -122,6 +313,31 @@ class ZMQClient(ZMQBase):
             if use_lock and self._lock.locked():
                 self._lock.release()
 
+    def send_frames(self, frames: List[Union[bytes, memoryview]], use_lock: bool = False) -> None:
+        """
+        Synchronously sends pre-serialized frames to the server without copying them,
+        the buffers must not be modified until they are sent.
+        Args:
+            frames (List[Union[bytes, memoryview]]): the frames to send
+            use_lock (bool): whether to use the lock
+        Returns:
+            None
+        """
+        try:
+            if use_lock and self._lock:
+                with self._lock:
+                    self._reset_if_due()
+                    self._socket.send_multipart(frames, copy=False)
+            else:
+                self._reset_if_due()
+                self._socket.send_multipart(frames, copy=False)
+        except zmq.error.Again as exc:
+            self._count_send_timeout()
+            raise exc
+        except Exception as exc:
+            self._logger.error("ZMQ failed to send frames, got exception of type %s", exc)
+            raise exc
+
     def receive(self, use_lock: bool = False) -> dict:
         """
         Synchronously receives data from the server.
@@ -134,9 +350,10 @@ class ZMQClient(ZMQBase):
         try:
             if use_lock and self._lock:
                 with self._lock:
-                    buffer = self._socket.recv_multipart()
+                    buffer = self._socket.recv_multipart(copy=not self.zero_copy)
             else:
-                buffer = self._socket.recv_multipart()
+                buffer = self._socket.recv_multipart(copy=not self.zero_copy)
+            self._reconnect.succeeded()
             if not buffer:
                 self._logger.debug("ZMQ received empty buffer from %s", self._addr)
                 return response
@@ -144,6 +361,8 @@ class ZMQClient(ZMQBase):
             return response
         except zmq.error.ZMQError as exc:
             self.handle_socket_errors(exc)
+            if exc.errno == errno.EAGAIN:
+                self._discard_late_replies()
         except Exception as exc:
             self._logger.error("ZMQ failed to receive data, got error of type: %s", exc)
             raise exc
@@ -152,12 +371,166 @@ class ZMQClient(ZMQBase):
                 self._lock.release()
         return response
 
+    def submit(self, msg: dict) -> PendingReply:
+        """
+        Sends a request without waiting for its reply, up to pipeline_window requests
+        can be in flight on the socket. The replies are matched by request id, until the
+        server is known to echo it a single request is in flight.
+        Args:
+            msg (dict): The request to send, a "req_id" is stamped on it.
+        Returns:
+            PendingReply: A handle to wait for the reply.
+        """
+        with self._lock:
+            window = self.pipeline_window if self._echoes_req_id else 1
+            while len(self._pending) >= window:
+                if not self._receive_pending(int(MOVAI_ZMQ_RECV_TIMEOUT_MS)):
+                    self._expire(next(iter(self._pending)))
+            req_id = stamp_request_id(msg)
+            reply = PendingReply(self, req_id)
+            try:
+                self._reset_if_due()
+                self._pending[req_id] = reply
+                self._socket.send_multipart(create_frames(msg, self.codec))
+            except Exception as exc:
+                self._pending.pop(req_id, None)
+                if isinstance(exc, zmq.error.Again):
+                    self._count_send_timeout()
+                self._logger.error("ZMQ failed to send message, got exception of type %s", exc)
+                raise exc
+        return reply
+
+    def wait_for(self, reply: PendingReply, timeout: Optional[float] = None) -> None:
+        """
+        Receives replies until the given one arrives, replies of other requests
+        on the way are handed to their own handles. The socket is polled in slices of
+        POLL_SLICE_MS, so the threads sharing the client can send while a reply is awaited.
+        Args:
+            reply (PendingReply): The handle to wait for.
+            timeout (float, optional): Seconds to wait for the reply.
+                Defaults to MOVAI_ZMQ_RECV_TIMEOUT_MS.
+        """
+        if timeout is None:
+            timeout = MOVAI_ZMQ_RECV_TIMEOUT_MS / 1000
+        deadline = time.monotonic() + timeout
+        while not reply.done():
+            with self._lock:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if reply.done():
+                    break
+                if remaining_ms <= 0:
+                    self._expire(reply.req_id)
+                    break
+                self._receive_pending(min(remaining_ms, POLL_SLICE_MS))
+
+    def _receive_pending(self, timeout_ms: int) -> bool:
+        """Receives a single reply and dispatches it, must be called with the lock held.
+        Args:
+            timeout_ms (int): Milliseconds to wait for a reply.
+        Returns:
+            bool: False if no reply arrived in time.
+        """
+        try:
+            if not self._socket.poll(timeout_ms):
+                return False
+            buffer = self._socket.recv_multipart(copy=not self.zero_copy)
+        except zmq.error.ZMQError as exc:
+            self.handle_socket_errors(exc, reset_socket=False)
+            return False
+        self._reconnect.succeeded()
+        self._dispatch_reply(extract_reponse(buffer))
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of sends which timed out and of messages dropped by the client."""
+        return dict(self._stats)
+
+    def _count_send_timeout(self) -> None:
+        """Counts a message which could not be queued on the socket in time and was dropped."""
+        self._logger.warning("ZMQ send to %s timed out, the message is dropped.", self._addr)
+        self._stats["send_timeouts"] += 1
+        self._stats["dropped"] += 1
+
+    def _expire(self, req_id: str) -> None:
+        """Gives up on a request that got no reply in time."""
+        self._logger.warning("ZMQ request %s to %s timed out.", req_id, self._addr)
+        self._health.record_failure()
+        reply = self._pending.pop(req_id, None)
+        if reply is not None and not reply.done():
+            reply.set_result({})
+        self._discard_late_replies()
+
+    def _dispatch_reply(self, response: dict) -> None:
+        """Hands the reply to the request it belongs to.
+
+        Args:
+            response (dict): A response from the server.
+        """
+        req_id = extract_request_id(response)
+        if req_id is not None:
+            self._echoes_req_id = True
+        else:
+            # The server did not echo the request id, the reply can only be matched when
+            # a single request is in flight and no expired request may still get its reply.
+            waiting = [key for key, val in self._pending.items() if not val.done()]
+            if len(waiting) == 1 and not self._stale:
+                req_id = waiting[0]
+        pending = self._pending.pop(req_id, None) if req_id is not None else None
+        if pending is None or pending.done():
+            self._logger.debug("ZMQ dropping unmatched reply %s from %s", req_id, self._addr)
+            return
+        if isinstance(pending, PendingReply):
+            self._health.record_rtt(time.monotonic() - pending.sent_at)
+        pending.set_result(response)
+
 
 class AsyncZMQClient(ZMQClient):
     """An Async implementation of ZMQ Client"""
 
     _socket: zmq.asyncio.Socket
     _context = zmq.asyncio.Context()
+    send_queue_size = MOVAI_ZMQ_SEND_QUEUE_SIZE
+    send_queue_policy = MOVAI_ZMQ_SEND_QUEUE_POLICY
+
+    def __init__(self, identity: str, addr: str) -> None:
+        """Initializes the object and the connection to the server.
+
+        Args:
+            identity (str): A unique identity which will be used by
+                the server to identify the client.
+            addr (str): The server addr and port in the form:
+                'tcp://server_addr:port'
+        """
+        self._receiver: Optional[asyncio.Task] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._queue_stats = {"queued": 0, "sent": 0, "dropped": 0}
+        # the queued messages dropped since the queue was full, the ones dropped by send()
+        # are counted by send() itself
+        self._queue_overflows = 0
+        # serializes the requests until the server echoes the request ids, by event loop
+        self._serial_lock: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Lock]] = None
+        super().__init__(identity, addr)
+
+    @classmethod
+    def reset_context(cls) -> None:
+        """Replaces the context shared by the sockets of the class, a forked child process
+        can not use the context of its parent."""
+        cls._context = zmq.asyncio.Context()
+
+    def _reset(self, force: bool = False) -> None:
+        """Resets the socket and reconnects to the server, the receiver task waiting on the
+        old socket is cancelled since its receive would never complete."""
+        receiver = self._receiver
+        if receiver is not None and not receiver.done():
+            try:
+                current_task = asyncio.current_task()
+            except RuntimeError:
+                current_task = None
+            if receiver is not current_task:
+                receiver.cancel()
+                self._receiver = None
+        super()._reset(force)
 
     def init_lock(self) -> None:
         """Initializes the lock the async way."""
@@ -168,7 +541,7 @@ class AsyncZMQClient(ZMQClient):
             except RuntimeError:
                 pass
 
-    async def send(self, msg: dict, use_lock: bool = False) -> None:
+    async def send(self, msg: dict, use_lock: bool = False) -> bool:
         """
         Asynchrounously send the message to the server.
 
@@ -176,21 +549,26 @@ class AsyncZMQClient(ZMQClient):
             msg (dict): The message to send.
             use_lock (bool): Whether to use the lock.
         Returns:
-            None
+            (bool): True if the message was queued on the socket,
+            False if a socket error dropped it.
         """
         try:
-            data = create_msg(msg)
+            frames = create_frames(msg, self.codec)
             if use_lock and self._lock:
                 async with self._lock:
-                    await self._socket.send(data)
+                    self._reset_if_due()
+                    await self._socket.send_multipart(frames)
             else:
-                await self._socket.send(data)
+                self._reset_if_due()
+                await self._socket.send_multipart(frames)
+            return True
         except asyncio.CancelledError as exc:
             # This is a normal exception that is raised when the task is cancelled
             self._socket.close()
             raise exc
         except zmq.error.ZMQError as exc:
-            self.handle_socket_errors(exc)
+            self._count_send_error(exc)
+            return False
         except Exception as exc:
             self._logger.error(
                 f"{self.__class__.__name__} failed to send message. "
@@ -201,6 +579,44 @@ class AsyncZMQClient(ZMQClient):
             if use_lock:
                 self.release_lock()
 
+    async def send_frames(
+        self, frames: List[Union[bytes, memoryview]], use_lock: bool = False
+    ) -> bool:
+        """
+        Asynchrounously sends pre-serialized frames to the server without copying them,
+        the buffers must not be modified until they are sent.
+
+        Args:
+            frames (List[Union[bytes, memoryview]]): The frames to send.
+            use_lock (bool): Whether to use the lock.
+        Returns:
+            (bool): True if the frames were queued on the socket,
+            False if a socket error dropped them.
+        """
+        try:
+            if use_lock and self._lock:
+                async with self._lock:
+                    self._reset_if_due()
+                    await self._socket.send_multipart(frames, copy=False)
+            else:
+                self._reset_if_due()
+                await self._socket.send_multipart(frames, copy=False)
+            return True
+        except zmq.error.ZMQError as exc:
+            self._count_send_error(exc)
+            return False
+        finally:
+            if use_lock:
+                self.release_lock()
+
+    def _count_send_error(self, exc: zmq.error.ZMQError) -> None:
+        """Counts a message dropped by a socket error and handles the error."""
+        if exc.errno == errno.EAGAIN:
+            self._count_send_timeout()
+        else:
+            self._stats["dropped"] += 1
+        self.handle_socket_errors(exc)
+
     async def receive(self, use_lock: bool = False) -> dict:
         """
         Asyncronously receives data from the server.
@@ -218,9 +634,10 @@ class AsyncZMQClient(ZMQClient):
         try:
             if use_lock and self._lock:
                 async with self._lock:
-                    buffer = await self._socket.recv_multipart()
+                    buffer = await self._socket.recv_multipart(copy=not self.zero_copy)
             else:
-                buffer = await self._socket.recv_multipart()
+                buffer = await self._socket.recv_multipart(copy=not self.zero_copy)
+            self._reconnect.succeeded()
             response = extract_reponse(buffer)
         except asyncio.CancelledError as exc:
             # This is a normal exception that is raised when the task is cancelled
@@ -228,6 +645,8 @@ class AsyncZMQClient(ZMQClient):
             raise exc
         except zmq.error.ZMQError as exc:
             self.handle_socket_errors(exc)
+            if exc.errno == errno.EAGAIN:
+                self._discard_late_replies()
         except Exception as exc:
             self._logger.error("ZMQ failed to receive data, got error of type: %s", exc)
             raise exc
@@ -235,3 +654,166 @@ class AsyncZMQClient(ZMQClient):
             if use_lock:
                 self.release_lock()
         return response
+
+    async def request(self, msg: dict, timeout: Optional[float] = None) -> dict:
+        """
+        Sends a request and waits for the reply carrying the same request id.
+        Many coroutines can wait for their replies on the same socket at the same time,
+        a single background task receives the replies and hands each one to its caller.
+        Until the server is known to echo the request ids, the requests are sent one
+        at a time so the replies of a server which predates them are matched in order.
+
+        Args:
+            msg (dict): The request to send, a "req_id" is stamped on it.
+            timeout (float, optional): Seconds to wait for the reply.
+                Defaults to MOVAI_ZMQ_RECV_TIMEOUT_MS.
+        Returns:
+            (dict): A response from the server.
+            In case of a timeout, an empty dict is returned.
+        """
+        if timeout is None:
+            timeout = MOVAI_ZMQ_RECV_TIMEOUT_MS / 1000
+        loop = asyncio.get_running_loop()
+        if not self._echoes_req_id:
+            if self._serial_lock is None or self._serial_lock[0] is not loop:
+                self._serial_lock = (loop, asyncio.Lock())
+            async with self._serial_lock[1]:
+                # the requests waiting for their turn are sent at once when ids are echoed
+                if not self._echoes_req_id:
+                    return await self._request(msg, timeout, loop)
+        return await self._request(msg, timeout, loop)
+
+    async def _request(self, msg: dict, timeout: float, loop: asyncio.AbstractEventLoop) -> dict:
+        """Sends a request and waits for its reply, see request()."""
+        req_id = stamp_request_id(msg)
+        future = loop.create_future()
+        # a stale socket is rebuilt before the request is registered
+        self._reset_if_due()
+        self._pending[req_id] = future
+        sent_at = time.monotonic()
+        try:
+            await self.send(msg)
+            self._ensure_receiver(loop)
+            response = await asyncio.wait_for(future, timeout)
+            self._health.record_rtt(time.monotonic() - sent_at)
+            return response
+        except asyncio.TimeoutError:
+            self._logger.warning("ZMQ request %s to %s timed out.", req_id, self._addr)
+            self._health.record_failure()
+            self._discard_late_replies()
+            return {}
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def enqueue(self, msg: dict) -> bool:
+        """
+        Queues a message to be sent by the background sender task, won't wait for it to be sent.
+        With the block overflow policy waits for room in the queue.
+
+        Args:
+            msg (dict): The message to send.
+        Returns:
+            (bool): True if the message was queued, False if it was dropped.
+        """
+        if self.send_queue_policy == OverflowPolicy.BLOCK:
+            await self._get_send_queue().put(msg)
+            self._queue_stats["queued"] += 1
+            return True
+        return self.enqueue_nowait(msg)
+
+    def enqueue_nowait(self, msg: dict) -> bool:
+        """
+        Queues a message to be sent by the background sender task, can be called
+        from synchronous code running in the event loop.
+        When the queue is full the drop_oldest policy drops the oldest queued message,
+        any other policy drops the new one since it can not wait.
+
+        Args:
+            msg (dict): The message to send.
+        Returns:
+            (bool): True if the message was queued, False if it was dropped.
+        """
+        queue = self._get_send_queue()
+        if queue.full():
+            self._queue_stats["dropped"] += 1
+            self._queue_overflows += 1
+            if self.send_queue_policy != OverflowPolicy.DROP_OLDEST:
+                return False
+            queue.get_nowait()
+            queue.task_done()
+        queue.put_nowait(msg)
+        self._queue_stats["queued"] += 1
+        return True
+
+    async def flush(self) -> None:
+        """Waits until every queued message was sent."""
+        if self._send_queue is not None:
+            await self._send_queue.join()
+
+    def get_queue_stats(self) -> Dict[str, int]:
+        """Returns the number of queued, sent and dropped messages of the send queue."""
+        stats = dict(self._queue_stats)
+        stats["size"] = self._send_queue.qsize() if self._send_queue is not None else 0
+        return stats
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of sends which timed out and of messages dropped by the client,
+        including the ones dropped by the send queue."""
+        stats = super().get_stats()
+        stats["dropped"] += self._queue_overflows
+        return stats
+
+    def _get_send_queue(self) -> asyncio.Queue:
+        """Returns the send queue, starts the sender task if it is not running on this loop."""
+        loop = asyncio.get_running_loop()
+        if self._sender is None or self._sender.get_loop() is not loop:
+            # asyncio queues are bound to the loop using them
+            self._send_queue = asyncio.Queue(self.send_queue_size)
+            self._sender = loop.create_task(self._send_queued(self._send_queue))
+        elif self._sender.done():
+            self._sender = loop.create_task(self._send_queued(self._send_queue))
+        return self._send_queue
+
+    async def _send_queued(self, queue: asyncio.Queue) -> None:
+        """Sends the queued messages one by one."""
+        while True:
+            msg = await queue.get()
+            try:
+                sent = await self.send(msg)
+            except Exception:
+                # send already logged the error
+                self._stats["dropped"] += 1
+                sent = False
+            finally:
+                queue.task_done()
+            self._queue_stats["sent" if sent else "dropped"] += 1
+
+    def _ensure_receiver(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Starts the background receiver task if it is not running on the given loop."""
+        if self._receiver is None or self._receiver.done() or self._receiver.get_loop() is not loop:
+            self._receiver = loop.create_task(self._receive_replies())
+
+    async def _receive_replies(self) -> None:
+        """Receives replies and dispatches them while there are pending requests."""
+        while self._pending:
+            socket = self._socket
+            try:
+                buffer = await socket.recv_multipart(copy=not self.zero_copy)
+            except zmq.error.Again:
+                # Nothing arrived within RCVTIMEO, every request handles its own timeout.
+                continue
+            except zmq.error.ZMQError as exc:
+                if exc.errno != errno.ENOTSOCK:
+                    self.handle_socket_errors(exc)
+                    return
+                if socket is self._socket:
+                    self.handle_socket_errors(exc)
+                    # wait for the backoff without blocking the loop
+                    await asyncio.sleep(self._reconnect.remaining())
+                    self._reset_if_due()
+                continue
+            self._reconnect.succeeded()
+            try:
+                self._dispatch_reply(extract_reponse(buffer))
+            except Exception as exc:
+                self._logger.error("ZMQ failed to dispatch reply, got error of type: %s", exc)
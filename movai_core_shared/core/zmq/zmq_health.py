@@ -0,0 +1,165 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Health records of the endpoints the ZMQ clients are connected to.
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import zmq
+from zmq.utils.monitor import recv_monitor_message
+
+from movai_core_shared.envvars import MOVAI_ZMQ_RTT_EWMA_ALPHA
+
+# a failed heartbeat disconnects the socket, a failed reconnection is retried
+DOWN_EVENTS = zmq.EVENT_DISCONNECTED | zmq.EVENT_CONNECT_RETRIED
+UP_EVENTS = zmq.EVENT_HANDSHAKE_SUCCEEDED
+# milliseconds the monitor thread waits for events before taking the new sockets
+MONITOR_POLL_MS = 100
+
+
+class EndpointHealth:
+    """Round trip times and availability of a single endpoint,
+    shared by all the clients connected to it."""
+
+    def __init__(self, addr: str, alpha: float = MOVAI_ZMQ_RTT_EWMA_ALPHA) -> None:
+        """Constructor
+
+        Args:
+            addr (str): The address of the endpoint.
+            alpha (float): The weight of the newest sample in the moving average of the RTT.
+        """
+        self.addr = addr
+        self.alpha = alpha
+        self.last_rtt: Optional[float] = None
+        self.ewma_rtt: Optional[float] = None
+        self.last_reply: Optional[float] = None
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_up(self) -> bool:
+        """An endpoint is up until a request to it fails or a monitored socket is disconnected
+        from it, and again once it replies or a monitored socket connects to it."""
+        return self.failures == 0
+
+    def record_rtt(self, rtt: float) -> None:
+        """Records the round trip time of a request which got its reply.
+
+        Args:
+            rtt (float): The round trip time in seconds.
+        """
+        with self._lock:
+            self.last_rtt = rtt
+            if self.ewma_rtt is None:
+                self.ewma_rtt = rtt
+            else:
+                self.ewma_rtt += self.alpha * (rtt - self.ewma_rtt)
+            self.last_reply = time.time()
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Records a request which timed out or could not be sent, or a lost connection."""
+        with self._lock:
+            self.failures += 1
+
+    def record_connected(self) -> None:
+        """Records a connection to the endpoint which completed its handshake."""
+        with self._lock:
+            self.failures = 0
+
+    def to_dict(self) -> dict:
+        """Returns the health record as a dictionary."""
+        return {
+            "addr": self.addr,
+            "up": self.is_up,
+            "last_rtt": self.last_rtt,
+            "ewma_rtt": self.ewma_rtt,
+            "last_reply": self.last_reply,
+            "failures": self.failures,
+        }
+
+
+_endpoints: Dict[str, EndpointHealth] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint_health(addr: str) -> EndpointHealth:
+    """Returns the health record of the endpoint, creates it on first use.
+
+    Args:
+        addr (str): The address of the endpoint.
+
+    Returns:
+        EndpointHealth: The health record.
+    """
+    with _endpoints_lock:
+        if addr not in _endpoints:
+            _endpoints[addr] = EndpointHealth(addr)
+        return _endpoints[addr]
+
+
+class HealthMonitor:
+    """A thread reading the events of the monitored sockets, a socket disconnected by a
+    heartbeat timeout marks its endpoint down without waiting for a request to time out."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._added: List[Tuple[zmq.Socket, EndpointHealth]] = []
+        self._pid: Optional[int] = None
+
+    def watch(self, socket: zmq.Socket, health: EndpointHealth) -> None:
+        """Monitors a socket before it connects, called by the thread using the socket.
+        The monitor is dropped once the socket is closed.
+
+        Args:
+            socket (zmq.Socket): The socket to monitor.
+            health (EndpointHealth): The health record of the endpoint of the socket.
+        """
+        endpoint = f"inproc://zmq_health_{uuid.uuid4().hex}"
+        socket.monitor(endpoint, DOWN_EVENTS | UP_EVENTS | zmq.EVENT_MONITOR_STOPPED)
+        # a synchronous socket of the same context, the socket may be an asyncio one
+        monitor = zmq.Context.shadow(socket.context.underlying).socket(zmq.PAIR)
+        monitor.connect(endpoint)
+        with self._lock:
+            if self._pid != os.getpid():
+                # the thread and the monitors of a parent process are not in a forked child
+                self._pid = os.getpid()
+                self._added = []
+                threading.Thread(target=self._run, name="ZMQHealthMonitor", daemon=True).start()
+            self._added.append((monitor, health))
+
+    def _run(self) -> None:
+        """Updates the health records from the events of the monitored sockets."""
+        poller = zmq.Poller()
+        monitors: Dict[zmq.Socket, EndpointHealth] = {}
+        while True:
+            with self._lock:
+                added, self._added = self._added, []
+            for monitor, health in added:
+                poller.register(monitor, zmq.POLLIN)
+                monitors[monitor] = health
+            for monitor, _ in poller.poll(MONITOR_POLL_MS):
+                event = recv_monitor_message(monitor)["event"]
+                if event & DOWN_EVENTS:
+                    monitors[monitor].record_failure()
+                elif event & UP_EVENTS:
+                    monitors[monitor].record_connected()
+                elif event == zmq.EVENT_MONITOR_STOPPED:
+                    poller.unregister(monitor)
+                    del monitors[monitor]
+                    monitor.close(linger=0)
+
+
+_monitor = HealthMonitor()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Returns the monitor of the sockets of the process."""
+    return _monitor
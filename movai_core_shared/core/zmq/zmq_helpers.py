@@ -11,15 +11,98 @@
 """
 import json
 from logging import getLogger
-import random
-from typing import List
+import uuid
+from typing import Any, Callable, Dict, List, Optional
 
-from movai_core_shared.envvars import DEVICE_NAME, SERVICE_NAME
+import zmq
+
+from movai_core_shared.consts import BATCH_HANDLER_MSG_TYPE
+from movai_core_shared.envvars import DEVICE_NAME, SERVICE_NAME, MOVAI_ZMQ_CODEC
 from movai_core_shared.exceptions import MessageError
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 LOGGER = getLogger(__name__)
 
 
+class WireCodec:
+    """Encodes and decodes messages, the codec is identified on the wire by a one byte tag
+    sent in a header frame right before the message frame.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tag: int,
+        encode: Callable[[dict], bytes],
+        decode: Callable[[bytes], dict],
+    ) -> None:
+        self.name = name
+        self.tag = bytes([tag])
+        self.encode = encode
+        self.decode = decode
+
+
+CODECS_BY_TAG: Dict[bytes, WireCodec] = {}
+CODECS_BY_NAME: Dict[str, WireCodec] = {}
+
+
+def register_codec(codec: WireCodec) -> None:
+    """Registers a codec so messages tagged with it can be decoded.
+
+    Args:
+        codec (WireCodec): The codec to register.
+    """
+    CODECS_BY_TAG[codec.tag] = codec
+    CODECS_BY_NAME[codec.name] = codec
+
+
+def get_codec(name: str) -> WireCodec:
+    """Returns a registered codec, falls back to json if the codec is not available.
+
+    Args:
+        name (str): The name of the codec.
+
+    Returns:
+        WireCodec: The codec.
+    """
+    codec = CODECS_BY_NAME.get(name)
+    if codec is None:
+        LOGGER.warning("ZMQ codec %s is not available, using json.", name)
+        codec = JSON_CODEC
+    return codec
+
+
+def _json_loads(data) -> dict:
+    if isinstance(data, memoryview):
+        # decode straight from the frame buffer, without copying it to bytes first
+        data = str(data, "utf8")
+    return json.loads(data)
+
+
+def _compact_json_dumps(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode("utf8")
+
+
+# json messages are sent without the header frame to stay compatible with older peers.
+JSON_CODEC = WireCodec("json", 0, lambda msg: json.dumps(msg).encode("utf8"), _json_loads)
+register_codec(JSON_CODEC)
+register_codec(WireCodec("compact_json", 2, _compact_json_dumps, _json_loads))
+if msgpack is not None:
+    register_codec(
+        WireCodec(
+            "msgpack",
+            1,
+            lambda msg: msgpack.packb(msg, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False),
+        )
+    )
+DEFAULT_CODEC = get_codec(MOVAI_ZMQ_CODEC)
+
+
 def create_msg(msg: dict):
     """create the msg in json format.
 
@@ -42,11 +125,82 @@ def create_msg(msg: dict):
         return None
 
 
+def create_frames(msg: dict, codec: Optional[WireCodec] = None) -> Optional[List[bytes]]:
+    """create the frames of the msg encoded by the codec.
+
+    Args:
+        msg (dict): A dictionary format of the messge.
+        codec (WireCodec, optional): The codec to encode with. Defaults to MOVAI_ZMQ_CODEC.
+
+    Returns:
+        List[bytes]: The codec tag frame (omitted for json) and the message frame.
+    """
+    if codec is None:
+        codec = DEFAULT_CODEC
+    if codec is JSON_CODEC:
+        data = create_msg(msg)
+        return None if data is None else [data]
+    if not isinstance(msg, dict):
+        return None
+    try:
+        return [codec.tag, codec.encode(msg)]
+    except (ValueError, TypeError) as error:
+        LOGGER.error(
+            "Got error of type %s while trying to encode the message with %s.",
+            error.__class__.__name__,
+            codec.name,
+        )
+        return None
+
+
+def create_reply_frames(
+    response: Any, req_ids: List[Optional[str]], codec: Optional[WireCodec] = None
+) -> Optional[List[List[bytes]]]:
+    """create the frames of the same response sent to many requests, each reply
+    echoes the req_id of its request. With json the response is serialized once.
+
+    Args:
+        response (Any): The response data.
+        req_ids (List[Optional[str]]): The ids of the requests.
+        codec (WireCodec, optional): The codec to encode with. Defaults to MOVAI_ZMQ_CODEC.
+
+    Returns:
+        List[List[bytes]]: The frames of every reply, None if the response can't be encoded.
+    """
+    if codec is None:
+        codec = DEFAULT_CODEC
+    if codec is not JSON_CODEC or len(req_ids) < 2:
+        replies = [
+            create_frames({"req_id": req_id, "response": response}, codec) for req_id in req_ids
+        ]
+        return None if None in replies else replies
+    data = create_msg({"response": response})
+    if data is None:
+        return None
+    # the same bytes json.dumps({"req_id": req_id, "response": response}) returns
+    body = b", " + data[1:]
+    return [[b'{"req_id": ' + json.dumps(req_id).encode("utf8") + body] for req_id in req_ids]
+
+
+def frame_codec(buffer: List[bytes]) -> WireCodec:
+    """Finds the codec the message in the buffer was encoded with.
+
+    Args:
+        buffer: List of memory buffers containing the message.
+
+    Returns:
+        WireCodec: The codec of the message, json if it has no codec tag.
+    """
+    if len(buffer) > 1 and len(buffer[-2]) == 1:
+        return CODECS_BY_TAG.get(bytes(buffer[-2]), JSON_CODEC)
+    return JSON_CODEC
+
+
 def extract_reponse(buffer: List[bytes]) -> dict:
     """Extracts the response from the buffer.
 
     Args:
-        buffer: List of memory buffers containing the message.
+        buffer: List of memory buffers (bytes or zmq.Frame) containing the message.
 
     Returns:
         (dict): A response from server.
@@ -56,11 +210,13 @@ def extract_reponse(buffer: List[bytes]) -> dict:
 
     if msg is None:
         raise MessageError("Got an empty msg!")
+    if isinstance(msg, zmq.Frame):
+        msg = msg.buffer
 
     try:
-        response = json.loads(msg)
+        response = frame_codec(buffer).decode(msg)
         return response
-    except (json.JSONDecodeError, TypeError) as error:
+    except (ValueError, TypeError) as error:
         LOGGER.error(
             "Got error of type %s while trying to receive the message.", error.__class__.__name__
         )
@@ -76,6 +232,77 @@ def generate_zmq_identity(zmq_type: str) -> str:
     Returns:
         str: The unique identity.
     """
-    random.seed()  # setting the seed for the random number generator
-    identity = f"{DEVICE_NAME}_{SERVICE_NAME}_{zmq_type}_{random.getrandbits(24)}"
+    # a ROUTER ignores a peer connecting with the identity of a connected one
+    identity = f"{DEVICE_NAME}_{SERVICE_NAME}_{zmq_type}_{uuid.uuid4().hex}"
     return identity
+
+
+def generate_request_id() -> str:
+    """Generate a unique id for a request, used to match the reply to its request.
+
+    Returns:
+        str: The request id.
+    """
+    return uuid.uuid4().hex
+
+
+def stamp_request_id(msg: dict) -> str:
+    """Stamps a new request id on the message (in place).
+
+    Args:
+        msg (dict): The message, either wrapped with the "request" key or not.
+
+    Returns:
+        str: The request id.
+    """
+    req_id = generate_request_id()
+    request = msg["request"] if isinstance(msg.get("request"), dict) else msg
+    request["req_id"] = req_id
+    return req_id
+
+
+def extract_request_id(response: dict) -> Optional[str]:
+    """Extracts the request id echoed by the server in a reply.
+
+    Args:
+        response (dict): The reply received from the server.
+
+    Returns:
+        Optional[str]: The request id, None if the server did not echo it.
+    """
+    if not isinstance(response, dict):
+        return None
+    return response.get("req_id")
+
+
+def unpack_batch(request: dict) -> List[dict]:
+    """Unpacks a batch request into the requests it carries, each one gets
+    the robot_info of the batch so it can be handled like any other request.
+
+    Args:
+        request (dict): The batch request, either wrapped with the "request" key or not.
+
+    Raises:
+        MessageError: In case the request is not a batch request.
+
+    Returns:
+        List[dict]: The requests wrapped with the "request" key.
+    """
+    batch = request.get("request", request)
+    if batch.get("req_type") != BATCH_HANDLER_MSG_TYPE:
+        raise MessageError(
+            f"Expected a {BATCH_HANDLER_MSG_TYPE} request, got {batch.get('req_type')}"
+        )
+    robot_info = batch.get("robot_info")
+    return [
+        {
+            "request": {
+                "req_type": entry["req_type"],
+                "created": entry["created"],
+                "response_required": False,
+                "req_data": entry["req_data"],
+                "robot_info": robot_info,
+            }
+        }
+        for entry in batch["req_data"]["requests"]
+    ]
@@ -0,0 +1,113 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Priority lanes of the intake queue of a ZMQServer.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import zmq
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from movai_core_shared.consts import Priority
+from movai_core_shared.core.zmq.zmq_helpers import JSON_CODEC, frame_codec
+
+
+class _RequestType(BaseModel):
+    req_type: str
+
+
+class _RequestTypeEnvelope(BaseModel):
+    request: _RequestType
+
+
+# parses only the req_type of a request, the other fields are skipped
+_REQ_TYPE_PEEK = TypeAdapter(_RequestTypeEnvelope)
+
+
+def peek_req_type(buffer: List[bytes]) -> Optional[str]:
+    """Returns the req_type of a received request without validating it.
+
+    Args:
+        buffer (List[bytes]): The identity of the client and the request frames.
+
+    Returns:
+        Optional[str]: The req_type, None if the request has none.
+    """
+    codec = frame_codec(buffer)
+    data = buffer[-1]
+    if isinstance(data, zmq.Frame):
+        data = data.bytes
+    try:
+        if codec is JSON_CODEC:
+            return _REQ_TYPE_PEEK.validate_json(data).request.req_type
+        return _REQ_TYPE_PEEK.validate_python(codec.decode(data)).request.req_type
+    except (ValidationError, ValueError, TypeError):
+        return None
+
+
+class IntakeLanes:
+    """Bounded queues of received requests by priority. The lanes are served by weighted
+    round robin, a lane with requests waiting is never starved by the others."""
+
+    def __init__(self, maxsize: int, weights: Dict[str, int]) -> None:
+        """Constructor
+
+        Args:
+            maxsize (int): The number of requests which can wait in each lane.
+            weights (Dict[str, int]): The requests taken from each lane in every round,
+                the lanes are served in the order of their weights.
+        """
+        self._weights = dict(sorted(weights.items(), key=lambda item: -item[1]))
+        self._credits = dict(self._weights)
+        self._lanes = {priority: asyncio.Queue(maxsize) for priority in self._weights}
+        # the number of requests waiting in all the lanes
+        self._waiting = asyncio.Semaphore(0)
+
+    def lane_of(self, priority: str) -> str:
+        """Returns the lane of a priority, the normal lane if it has none."""
+        return priority if priority in self._lanes else Priority.NORMAL
+
+    async def put(self, priority: str, buffer: List[bytes]) -> None:
+        """Queues a request, waits while its lane is full.
+
+        Args:
+            priority (str): The lane of the request.
+            buffer (List[bytes]): The request.
+        """
+        await self._lanes[priority].put(buffer)
+        self._waiting.release()
+
+    async def get(self) -> Tuple[str, List[bytes]]:
+        """Waits for a request and takes it from the lane whose turn it is.
+
+        Returns:
+            Tuple[str, List[bytes]]: The lane and the request.
+        """
+        await self._waiting.acquire()
+        while True:
+            for priority, lane in self._lanes.items():
+                if self._credits[priority] > 0 and not lane.empty():
+                    self._credits[priority] -= 1
+                    return priority, lane.get_nowait()
+            # the lanes with requests used up their turns, start a new round
+            self._credits = dict(self._weights)
+
+    def task_done(self, priority: str) -> None:
+        """Marks a request taken from a lane as handled."""
+        self._lanes[priority].task_done()
+
+    async def join(self) -> None:
+        """Waits until the requests of all the lanes are handled."""
+        await asyncio.gather(*(lane.join() for lane in self._lanes.values()))
+
+    def qsize(self) -> int:
+        """Returns the number of requests waiting in all the lanes."""
+        return sum(lane.qsize() for lane in self._lanes.values())
+
+    def qsizes(self) -> Dict[str, int]:
+        """Returns the number of requests waiting in each lane."""
+        return {priority: lane.qsize() for priority, lane in self._lanes.items()}
@@ -11,14 +11,20 @@
 """
 from enum import Enum
 from logging import getLogger
+import os
+import threading
 from typing import Dict, Type, TypedDict
+from weakref import WeakSet
 
 from beartype import beartype
 
+from movai_core_shared.consts import Priority
 from movai_core_shared.core.zmq.zmq_client import ZMQClient, AsyncZMQClient
 from movai_core_shared.core.zmq.zmq_subscriber import ZMQSubscriber, AsyncZMQSubscriber
 from movai_core_shared.core.zmq.zmq_publisher import ZMQPublisher, AsyncZMQPublisher
+from movai_core_shared.core.zmq.zmq_health import get_endpoint_health
 from movai_core_shared.core.zmq.zmq_helpers import generate_zmq_identity
+from movai_core_shared.envvars import MOVAI_ZMQ_CLIENT_PER_THREAD, MOVAI_ZMQ_CLIENT_POOL_SIZE
 from movai_core_shared.exceptions import ArgumentError
 
 
@@ -58,6 +64,13 @@ class ZMQManager:
         ZMQType.SUBSCRIBER: {},
         ZMQType.ASYNC_SUBSCRIBER: {},
     }
+    # types which get a dedicated socket for every thread instead of one per process
+    _per_thread_types = {ZMQType.CLIENT} if MOVAI_ZMQ_CLIENT_PER_THREAD else set()
+    # the maximal number of sockets of a per thread type connected to an address
+    _pool_size = MOVAI_ZMQ_CLIENT_POOL_SIZE
+    _thread_local = threading.local()
+    _pools: Dict[ZMQType, Dict[str, WeakSet]] = {zmq_type: {} for zmq_type in ZMQType}
+    _pools_lock = threading.Lock()
 
     @classmethod
     def validate_server_addr(cls, server_addr: str):
@@ -68,20 +81,144 @@ class ZMQManager:
 
     @classmethod
     @beartype
-    def _get_or_create_zmq_object(cls, server_addr: str, zmq_type: ZMQType) -> ZMQClient:
+    def _get_or_create_zmq_object(
+        cls, server_addr: str, zmq_type: ZMQType, priority: str = Priority.NORMAL
+    ) -> ZMQClient:
         if zmq_type not in cls._clients:
             raise TypeError(f"{zmq_type} does not exist!")
 
-        if server_addr in cls._clients[zmq_type]:
-            return cls._clients[zmq_type][server_addr]
-
-        identity_type = ZMQ_TYPES[zmq_type]["identity"]
-        identity = generate_zmq_identity(identity_type)
-        zmq_object = ZMQ_TYPES[zmq_type]["type"](identity, server_addr)
-        cls._clients[zmq_type][server_addr] = zmq_object
+        if zmq_type in cls._per_thread_types:
+            clients = cls._get_thread_clients(zmq_type)
+        else:
+            clients = cls._clients[zmq_type]
+
+        # every priority lane has its own socket, so its messages never queue
+        # behind the messages of the other lanes, the server fair-queues the sockets.
+        key = server_addr if priority == Priority.NORMAL else f"{server_addr}#{priority}"
+        if key in clients:
+            return clients[key]
+
+        with cls._pools_lock:
+            pool = cls._pools[zmq_type].setdefault(server_addr, WeakSet())
+            if zmq_type in cls._per_thread_types and len(pool) >= cls._pool_size:
+                # the threads past the bound share the client of the process, it is thread safe
+                clients = cls._clients[zmq_type]
+                if key in clients:
+                    return clients[key]
+            identity_type = ZMQ_TYPES[zmq_type]["identity"]
+            identity = generate_zmq_identity(identity_type)
+            zmq_object = ZMQ_TYPES[zmq_type]["type"](identity, server_addr)
+            clients[key] = zmq_object
+            pool.add(zmq_object)
         return zmq_object
 
     @classmethod
-    def get_client(cls, server_addr: str, client_type: ZMQType) -> ZMQClient:
-        client = cls._get_or_create_zmq_object(server_addr, client_type)
+    def _get_thread_clients(cls, zmq_type: ZMQType) -> Dict[str, ZMQClient]:
+        """Returns the clients of the calling thread, they are closed when the thread exits
+        and its thread local storage is released.
+
+        Args:
+            zmq_type (ZMQType): The type of the clients.
+
+        Returns:
+            Dict[str, ZMQClient]: The clients of the calling thread by their address and lane.
+        """
+        thread_clients = getattr(cls._thread_local, "clients", None)
+        if thread_clients is None:
+            thread_clients = cls._thread_local.clients = {}
+        return thread_clients.setdefault(zmq_type, {})
+
+    @classmethod
+    def get_pool_size(cls, server_addr: str, zmq_type: ZMQType) -> int:
+        """Returns the number of live sockets connected to the address.
+
+        Args:
+            server_addr (str): The address of the server.
+            zmq_type (ZMQType): The type of the sockets.
+
+        Returns:
+            int: The number of sockets.
+        """
+        return len(cls._pools[zmq_type].get(server_addr, ()))
+
+    @classmethod
+    def get_client(
+        cls, server_addr: str, client_type: ZMQType, priority: str = Priority.NORMAL
+    ) -> ZMQClient:
+        """Returns the client of the address, created on the first call.
+
+        Args:
+            server_addr (str): The address of the server.
+            client_type (ZMQType): The type of the client.
+            priority (str): The priority lane of the messages sent with the client,
+                each lane has its own socket.
+
+        Returns:
+            ZMQClient: The client.
+        """
+        client = cls._get_or_create_zmq_object(server_addr, client_type, priority)
         return client
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Returns the overload counters of the live sockets, summed by type and address.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, int]]]: The counters by socket type name and address,
+                the number of sockets, of sends which timed out and of dropped messages.
+        """
+        stats = {}
+        for zmq_type, pools in cls._pools.items():
+            for server_addr, pool in pools.items():
+                clients = list(pool)
+                if not clients:
+                    continue
+                addr_stats = {"sockets": len(clients), "send_timeouts": 0, "dropped": 0}
+                for client in clients:
+                    for key, value in client.get_stats().items():
+                        addr_stats[key] += value
+                stats.setdefault(zmq_type.name, {})[server_addr] = addr_stats
+        return stats
+
+    @classmethod
+    def get_endpoint_health(cls, server_addr: str) -> dict:
+        """Returns the health record of the server shared by all the clients connected to it.
+
+        Args:
+            server_addr (str): The address of the server.
+
+        Returns:
+            dict: Whether the server is up, the last and the moving average of the round
+                trip time in seconds, the time of the last reply and the number of failures
+                since then.
+        """
+        return get_endpoint_health(server_addr).to_dict()
+
+    @classmethod
+    def is_endpoint_up(cls, server_addr: str) -> bool:
+        """Returns False if the last request to the server failed,
+        so callers can fail fast instead of waiting for a timeout.
+
+        Args:
+            server_addr (str): The address of the server.
+
+        Returns:
+            bool: Whether the server is up.
+        """
+        return get_endpoint_health(server_addr).is_up
+
+    @classmethod
+    def reset_after_fork(cls) -> None:
+        """Forgets the sockets of the parent process and replaces the ZMQ contexts,
+        neither can be used by a forked child process."""
+        ZMQClient.reset_context()
+        AsyncZMQClient.reset_context()
+        for clients in cls._clients.values():
+            clients.clear()
+        cls._thread_local = threading.local()
+        cls._pools = {zmq_type: {} for zmq_type in ZMQType}
+        # the lock may have been held by another thread of the parent process
+        cls._pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=ZMQManager.reset_after_fork)
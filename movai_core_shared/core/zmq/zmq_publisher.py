@@ -13,15 +13,18 @@ import zmq
 import zmq.asyncio
 
 from movai_core_shared.core.zmq.zmq_client import ZMQClient, AsyncZMQClient
+from movai_core_shared.envvars import MOVAI_ZMQ_PUB_NODROP
 
 
 class ZMQPublisher(ZMQClient):
     """A very basic implementation of ZMQ publisher with specific socket type."""
 
-    zmq_socket_type = zmq.PUB
+    # XPUB_NODROP is only supported by XPUB sockets
+    zmq_socket_type = zmq.XPUB if MOVAI_ZMQ_PUB_NODROP else zmq.PUB
 
 
 class AsyncZMQPublisher(AsyncZMQClient):
     """An Async implementation of ZMQ Publisher  with specific socket type."""
 
-    zmq_socket_type = zmq.PUB
+    # XPUB_NODROP is only supported by XPUB sockets
+    zmq_socket_type = zmq.XPUB if MOVAI_ZMQ_PUB_NODROP else zmq.PUB
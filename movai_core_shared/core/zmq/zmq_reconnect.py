@@ -0,0 +1,73 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Backoff policy for rebuilding the sockets of the ZMQ clients.
+"""
+import random
+import time
+
+from movai_core_shared.envvars import (
+    MOVAI_ZMQ_RECONNECT_BASE_MS,
+    MOVAI_ZMQ_RECONNECT_MAX_MS,
+    MOVAI_ZMQ_RECONNECT_JITTER,
+)
+
+
+class ReconnectStrategy:
+    """Exponential backoff with jitter between consecutive socket rebuilds."""
+
+    def __init__(
+        self,
+        base_delay: float = MOVAI_ZMQ_RECONNECT_BASE_MS / 1000,
+        max_delay: float = MOVAI_ZMQ_RECONNECT_MAX_MS / 1000,
+        jitter: float = MOVAI_ZMQ_RECONNECT_JITTER,
+    ) -> None:
+        """Constructor
+
+        Args:
+            base_delay (float): Seconds to wait before the first rebuild.
+            max_delay (float): The maximal number of seconds to wait between rebuilds.
+            jitter (float): The fraction of the delay which is randomized,
+                so clients that failed together do not reconnect together.
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._attempts = 0
+        self._next_attempt = 0.0
+
+    @property
+    def attempts(self) -> int:
+        """The number of rebuilds scheduled since the last success."""
+        return self._attempts
+
+    def next_delay(self) -> float:
+        """Returns the delay before the next rebuild and increases the following one.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = min(self.max_delay, self.base_delay * 2**self._attempts)
+        self._attempts += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def schedule(self) -> float:
+        """Schedules the next rebuild.
+
+        Returns:
+            float: Seconds until the rebuild is due.
+        """
+        delay = self.next_delay()
+        self._next_attempt = time.monotonic() + delay
+        return delay
+
+    def remaining(self) -> float:
+        """Returns the seconds left until the scheduled rebuild is due."""
+        return max(0.0, self._next_attempt - time.monotonic())
+
+    def succeeded(self) -> None:
+        """Resets the backoff once the connection works again."""
+        self._attempts = 0
@@ -0,0 +1,197 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Routing of the requests of a ZMQServer to its handlers by req_type.
+"""
+import inspect
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type, Union
+
+from pydantic import Field, TypeAdapter, create_model
+from typing_extensions import Annotated, Literal
+
+from movai_core_shared.consts import ExecutorType
+from movai_core_shared.core.zmq.zmq_helpers import JSON_CODEC, get_codec
+from movai_core_shared.exceptions import ArgumentError
+from movai_core_shared.messages.general_data import Request
+
+ROUTE_ATTRIBUTE = "__zmq_route__"
+# the validators of the requests handled in a process pool, built once per process
+_ENVELOPES: Dict[type, TypeAdapter] = {}
+
+
+class Route:
+    """A handler of a ZMQServer and the model validating its requests."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        req_type: str,
+        handler_name: str,
+        model: Type[Request],
+        executor: Optional[str] = None,
+        cacheable: bool = False,
+        coalesce: bool = False,
+    ) -> None:
+        self.req_type = req_type
+        self.handler_name = handler_name
+        self.model = model
+        self.executor = executor
+        self.cacheable = cacheable
+        self.coalesce = coalesce
+        # the literal req_type lets the validator pick the model of the request by its tag
+        self.tagged_model = create_model(
+            f"{model.__name__}Route", __base__=model, req_type=(Literal[req_type], ...)
+        )
+
+
+def route(
+    req_type: str,
+    model: Type[Request] = Request,
+    executor: Optional[str] = None,
+    cacheable: bool = False,
+    coalesce: bool = False,
+) -> Callable:
+    """Registers a ZMQServer method as the handler of the requests of req_type.
+    The handler gets the validated request and returns the response data,
+    which is sent back to the client if the request requires a response.
+
+    A blocking handler can run in the thread pool of the server, or in its process
+    pool. A process handler must be a staticmethod (declared above route) of a class the
+    pool processes can import, they are started by a forkserver. It gets the request bytes
+    and validates them itself so the request model is never pickled.
+
+    The responses of a cacheable route are served from the response cache of the server
+    for the requests with the same req_data, until they expire. The requests of a coalesced
+    route received while an identical one is handled get the response of that one.
+
+    Args:
+        req_type (str): The type of the requests handled.
+        model (Type[Request]): The model validating the requests.
+        executor (str, optional): ExecutorType.THREAD or ExecutorType.PROCESS to run the
+            handler out of the event loop. Defaults to the event loop.
+        cacheable (bool): Whether the handler is idempotent and its responses can be cached.
+        coalesce (bool): Whether identical concurrent requests are handled once.
+
+    Raises:
+        ArgumentError: In case the executor is unknown.
+
+    Returns:
+        Callable: The decorator.
+    """
+    if executor not in (None, ExecutorType.THREAD, ExecutorType.PROCESS):
+        raise ArgumentError(f"Unknown executor {executor} for the route of {req_type}")
+
+    def decorator(func: Callable) -> Callable:
+        setattr(
+            func,
+            ROUTE_ATTRIBUTE,
+            {
+                "req_type": req_type,
+                "model": model,
+                "executor": executor,
+                "cacheable": cacheable,
+                "coalesce": coalesce,
+            },
+        )
+        return func
+
+    return decorator
+
+
+def collect_routes(cls: type) -> Dict[str, Route]:
+    """Collects the routes of a class and of its base classes,
+    a subclass can override the handler of a req_type.
+
+    Args:
+        cls (type): The ZMQServer class.
+
+    Raises:
+        ArgumentError: In case a process handler is not a staticmethod,
+            or a thread handler is a coroutine function.
+
+    Returns:
+        Dict[str, Route]: The routes by req_type.
+    """
+    routes = {}
+    for klass in reversed(cls.__mro__):
+        for name, attr in vars(klass).items():
+            # the route of a staticmethod is set on the function it wraps
+            func = getattr(attr, "__func__", attr)
+            route_info = getattr(func, ROUTE_ATTRIBUTE, None)
+            if route_info is None:
+                continue
+            executor = route_info["executor"]
+            if executor == ExecutorType.PROCESS and not isinstance(attr, staticmethod):
+                raise ArgumentError(
+                    f"The process handler {klass.__name__}.{name} must be a staticmethod"
+                )
+            if executor == ExecutorType.THREAD and inspect.iscoroutinefunction(func):
+                raise ArgumentError(
+                    f"The thread handler {klass.__name__}.{name} can not be a coroutine function"
+                )
+            routes[route_info["req_type"]] = Route(handler_name=name, **route_info)
+    return routes
+
+
+def build_validator(routes: Dict[str, Route]) -> Optional[TypeAdapter]:
+    """Compiles a single validator for the requests of all the routes,
+    the req_type of the request selects the model validating it.
+
+    Args:
+        routes (Dict[str, Route]): The routes by req_type.
+
+    Returns:
+        Optional[TypeAdapter]: The validator, None if there are no routes.
+    """
+    if not routes:
+        return None
+    models = tuple(r.tagged_model for r in routes.values())
+    request_type = models[0]
+    if len(models) > 1:
+        request_type = Annotated[Union[models], Field(discriminator="req_type")]
+    # the requests are sent wrapped with the "request" key
+    return TypeAdapter(create_model("RouteEnvelope", request=(request_type, ...)))
+
+
+def timed_call(submitted: float, func: Callable, *args) -> Tuple[Any, float, float]:
+    """Calls a handler in an executor and measures how long it waited and ran.
+
+    Args:
+        submitted (float): The time.monotonic() the call was submitted at, the clock is
+            shared by the processes.
+        func (Callable): The handler.
+
+    Returns:
+        Tuple[Any, float, float]: The result, the queue time and the run time in seconds.
+    """
+    start_time = time.monotonic()
+    result = func(*args)
+    return result, start_time - submitted, time.monotonic() - start_time
+
+
+def validate_and_call(handler: Callable, model: Type[Request], data: bytes, codec_name: str):
+    """Validates the request bytes and calls the handler, runs in the process pool.
+
+    Args:
+        handler (Callable): The staticmethod handling the request.
+        model (Type[Request]): The model validating the request.
+        data (bytes): The request as received.
+        codec_name (str): The name of the codec the request is encoded with.
+
+    Returns:
+        Any: The response data.
+    """
+    validator = _ENVELOPES.get(model)
+    if validator is None:
+        validator = _ENVELOPES[model] = TypeAdapter(
+            create_model(f"{model.__name__}Envelope", request=(model, ...))
+        )
+    if codec_name == JSON_CODEC.name:
+        msg = validator.validate_json(data)
+    else:
+        msg = validator.validate_python(get_codec(codec_name).decode(data))
+    return handler(msg.request)
@@ -10,28 +10,151 @@
    - Erez Zomer (erez@mov.ai) - 2023
 """
 import asyncio
+import inspect
 import logging
-from abc import ABC, abstractmethod
-from typing import List
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from abc import ABC
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple, Union
 
 import zmq
 import zmq.asyncio
 from beartype import beartype
-from movai_core_shared.consts import LOG_FORMATTER
-from movai_core_shared.envvars import MOVAI_ZMQ_SEND_TIMEOUT_MS
+from pydantic import TypeAdapter, ValidationError
+from movai_core_shared.common.utils import run_blocking_code
+from movai_core_shared.consts import (
+    ExecutorType,
+    LOG_FORMATTER,
+    METRICS_HANDLER_MSG_TYPE,
+    MSG_TYPE_PRIORITIES,
+    PLATFORM_METRICS_INFLUX_DB,
+    PRIORITY_WEIGHTS,
+    Priority,
+    SERVER_STATS_MSG_TYPE,
+    ZMQ_SERVER_STATS_MEASUREMENT,
+)
+from movai_core_shared.core.message_client import AsyncMessageClient
+from movai_core_shared.core.zmq.zmq_cache import MISS, ResponseCache, make_cache_key
+from movai_core_shared.core.zmq.zmq_client import HWM_PROFILES
+from movai_core_shared.core.zmq.zmq_helpers import create_reply_frames, frame_codec, JSON_CODEC
+from movai_core_shared.core.zmq.zmq_lanes import IntakeLanes, peek_req_type
+from movai_core_shared.core.zmq.zmq_routes import (
+    Route,
+    build_validator,
+    collect_routes,
+    route,
+    timed_call,
+    validate_and_call,
+)
+from movai_core_shared.core.zmq.zmq_stats import ServerStats
+from movai_core_shared.envvars import (
+    MOVAI_ZMQ_SEND_TIMEOUT_MS,
+    MOVAI_ZMQ_SERVER_MAX_IN_FLIGHT,
+    MOVAI_ZMQ_SERVER_INTAKE_QUEUE_SIZE,
+    MOVAI_ZMQ_SERVER_WORKERS,
+    MOVAI_ZMQ_SERVER_BATCH_SIZE,
+    MOVAI_ZMQ_SERVER_STATS_INTERVAL,
+    MOVAI_ZMQ_SERVER_STATS_ADDR,
+    MOVAI_ZMQ_SERVER_DRAIN_TIMEOUT,
+    MOVAI_ZMQ_SERVER_THREAD_POOL_SIZE,
+    MOVAI_ZMQ_SERVER_PROCESS_POOL_SIZE,
+    MOVAI_ZMQ_SERVER_CACHE_TTL,
+    MOVAI_ZMQ_SERVER_CACHE_MAX_BYTES,
+)
+from movai_core_shared.messages.general_data import Request
 
+# the req_type the stats of the requests which failed the validation are kept under
+INVALID_REQ_TYPE = "invalid"
 
-# pylint: disable=too-many-instance-attributes
+
+# pylint: disable=too-many-instance-attributes, too-many-arguments
 class ZMQServer(ABC):
     """
     This class is a base class for any ZMQ server.
+    The requests are either handled by overriding handle() or by the methods
+    registered with the route() decorator.
     """
 
+    _routes: Dict[str, Route] = {}
+    _validator: Optional[TypeAdapter] = None
+    # the lanes of the intake queue by req_type and the share of the handlers each one gets,
+    # they take effect only when the server has an intake queue
+    priorities: Dict[str, str] = MSG_TYPE_PRIORITIES
+    priority_weights: Dict[str, int] = PRIORITY_WEIGHTS
+    # the message server the stats are sent to
+    stats_addr = MOVAI_ZMQ_SERVER_STATS_ADDR
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._routes = collect_routes(cls)
+        cls._validator = build_validator(cls._routes)
+
     @beartype
-    def __init__(self, server_name: str, bind_addr: str, debug: bool = False) -> None:
-        """Constructor"""
+    def __init__(
+        self,
+        server_name: str,
+        bind_addr: str,
+        debug: bool = False,
+        zero_copy: bool = False,
+        max_in_flight: int = MOVAI_ZMQ_SERVER_MAX_IN_FLIGHT,
+        intake_queue_size: int = MOVAI_ZMQ_SERVER_INTAKE_QUEUE_SIZE,
+        workers: int = MOVAI_ZMQ_SERVER_WORKERS,
+        batch_size: int = MOVAI_ZMQ_SERVER_BATCH_SIZE,
+        stats_interval: Union[int, float] = MOVAI_ZMQ_SERVER_STATS_INTERVAL,
+    ) -> None:
+        """Constructor
+
+        Args:
+            server_name (str): The name of the server.
+            bind_addr (str): The address to bind the ROUTER socket to.
+            debug (bool): Whether to log in debug level.
+            zero_copy (bool): Whether handle() gets zmq.Frame objects instead of bytes,
+                so large requests are not copied on receive.
+            max_in_flight (int): The maximal number of requests handled concurrently,
+                0 means no limit.
+            intake_queue_size (int): The number of received requests of each priority which
+                can wait for a handler, 0 disables the queue and the priority lanes.
+            workers (int): The number of processes running handle(), a ROUTER socket bound
+                to bind_addr proxies the requests to them. 0 or 1 handles the requests
+                in the calling process.
+            batch_size (int): The maximal number of requests taken from the socket on every
+                wakeup and passed together to handle_batch().
+            stats_interval (Union[int, float]): The seconds between the per req_type stats sent as
+                metrics to stats_addr, 0 disables them.
+        """
         self._name = server_name
         self._addr = bind_addr
+        self._zero_copy = zero_copy
+        self._max_in_flight = max_in_flight
+        self._intake_queue_size = intake_queue_size
+        self._in_flight_sem: Optional[asyncio.Semaphore] = None
+        self._intake_queue: Optional[IntakeLanes] = None
+        self._stats = {"received": 0, "in_flight": 0}
+        self._workers = workers
+        self._batch_size = batch_size
+        self._stats_interval = stats_interval
+        self._req_stats = ServerStats()
+        # the pools of the routes run out of the event loop, created on their first request
+        self._executors: Dict[str, Executor] = {}
+        self._cache = ResponseCache(MOVAI_ZMQ_SERVER_CACHE_TTL, MOVAI_ZMQ_SERVER_CACHE_MAX_BYTES)
+        # the clients waiting for the response of a coalesced request in flight, by request key
+        self._flights: Dict[str, List[Tuple[bytes, Optional[str]]]] = {}
+        self._processes: List[multiprocessing.Process] = []
+        self._drain_timeout = MOVAI_ZMQ_SERVER_DRAIN_TIMEOUT
+        # the handlers of the received requests, awaited by stop()
+        self._tasks: Set[asyncio.Task] = set()
+        self._spin_task: Optional[asyncio.Task] = None
+        # whether spin() waits for a slot of max_in_flight, so stop() can interrupt it
+        self._idle = False
+        # the receive spin() waits for, stop() cancels it unless a request was received
+        self._recv_future: Optional[asyncio.Future] = None
+        # set in the worker processes, the address of the DEALER socket of the proxy
+        self._backend_addr: Optional[str] = None
         self.loop = None
         self._initialized = False
         self._running = False
@@ -48,45 +171,286 @@ class ZMQServer(ABC):
         """Initializes the zmq context."""
         try:
             self._ctx = zmq.asyncio.Context()
+            if self._backend_addr is not None:
+                # A worker gets [identity, payload] from the proxy just like a ROUTER socket
+                # and the proxy routes the replies back to the identity.
+                self._socket = self._ctx.socket(zmq.DEALER)
+                self._init_socket_options(self._socket)
+                self._socket.connect(self._backend_addr)
+                self._logger.info("%s worker %s is connected", self._name, os.getpid())
+                return
             self._socket = self._ctx.socket(zmq.ROUTER)
-            self._socket.setsockopt(zmq.IDENTITY, self._name.encode("ascii"))
-            self._socket.setsockopt(zmq.SNDTIMEO, int(MOVAI_ZMQ_SEND_TIMEOUT_MS))
+            self._init_socket_options(self._socket)
             self._socket.bind(self._addr)
             self._logger.info("%s is listening on %s", self._name, self._addr)
         except OSError:
             self._logger.error("failed to bind socket on address %s", self._addr)
             raise
 
+    def _init_socket_options(self, socket: zmq.Socket) -> None:
+        """Sets the identity, the send timeout and the high-water marks of the socket."""
+        socket.setsockopt(zmq.IDENTITY, self._name.encode("ascii"))
+        socket.setsockopt(zmq.SNDTIMEO, int(MOVAI_ZMQ_SEND_TIMEOUT_MS))
+        sndhwm, rcvhwm = HWM_PROFILES[zmq.ROUTER]
+        socket.setsockopt(zmq.SNDHWM, sndhwm)
+        socket.setsockopt(zmq.RCVHWM, rcvhwm)
+
     async def spin(self) -> None:
         """accepts new connections requests to zmq."""
-        try:
-            self.init_server()
-            assert self._socket
-            if self._running:
-                self._logger.warning("%s is already running", self._name)
-            self._running = True
-        except Exception as exc:
-            self._logger.error("Failed to start %s: %s", self._name, exc)
+        if not self._start_spin():
             return
 
         await self.at_startup()
+        handlers = self._start_handlers()
+        if self._stats_interval > 0:
+            handlers.append(asyncio.create_task(self._report_stats()))
         while self._running:
             try:
-                self._logger.debug("Waiting for new requests...")
-                buffer = await self._socket.recv_multipart()
-                self._logger.debug("Received new request: %s", buffer)
-                asyncio.create_task(self.handle(buffer))
+                await self._dispatch_received(await self._receive())
                 await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                if self._running:
+                    raise
             except Exception as error:
                 self._logger.error("ZMQServer Error: %s", str(error))
                 continue
+        await self._drain()
+        self._stop_handlers(handlers)
         await self.at_shutdown()
         self.close()
 
+    def _start_spin(self) -> bool:
+        """Initializes the server for spin() in the running event loop.
+
+        Returns:
+            bool: True on success, False otherwise.
+        """
+        try:
+            self.init_server()
+            assert self._socket
+            if self._running:
+                self._logger.warning("%s is already running", self._name)
+            self._running = True
+        except Exception as exc:
+            self._logger.error("Failed to start %s: %s", self._name, exc)
+            return False
+        self.loop = asyncio.get_running_loop()
+        self._spin_task = asyncio.current_task()
+        return True
+
+    async def _dispatch_received(self, buffers: List[List[bytes]]) -> None:
+        """Puts the received requests in the lanes of the intake queue,
+        or starts their handlers when there is no intake queue.
+
+        Args:
+            buffers (List[List[bytes]]): The requests received on the same wakeup.
+        """
+        self._stats["received"] += len(buffers)
+        if self._intake_queue is not None:
+            for buffer in buffers:
+                await self._intake_queue.put(self._priority_of(buffer), buffer)
+        elif len(buffers) == 1:
+            self._track(self._run_handler(buffers[0]))
+        else:
+            self._track(self._run_batch(buffers))
+
+    def _track(self, coro: Coroutine) -> None:
+        """Runs a handler in a task which stop() waits for."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self) -> None:
+        """Waits up to drain_timeout seconds for the handlers of the received requests."""
+        pending = set(self._tasks)
+        if self._intake_queue is not None:
+            pending.add(asyncio.create_task(self._intake_queue.join()))
+        if not pending:
+            return
+        self._logger.info("%s is waiting for %s handlers", self._name, self._stats["in_flight"])
+        _, not_done = await asyncio.wait(pending, timeout=self._drain_timeout)
+        if not_done:
+            self._logger.warning(
+                "%s stopped with %s requests in flight after %ss",
+                self._name,
+                self._stats["in_flight"] + self.get_stats()["queue_depth"],
+                self._drain_timeout,
+            )
+            for task in not_done:
+                task.cancel()
+
+    def _stop_handlers(self, handlers: List[asyncio.Task]) -> None:
+        """Cancels the background tasks and shuts down the pools of the server."""
+        for handler in handlers:
+            handler.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors = {}
+
+    def _interrupt_receive(self) -> None:
+        """Wakes up spin() if it waits for a request, a received request is never dropped.
+        The receive is cancelled instead of spin() itself, a receive which completed
+        before spin() resumed keeps its request."""
+        if self._recv_future is not None:
+            if not self._recv_future.done():
+                self._recv_future.cancel()
+        elif self._idle and self._spin_task is not None:
+            # no request is received while waiting for a slot
+            self._spin_task.cancel()
+
+    async def _receive(self) -> List[List[bytes]]:
+        """Waits for a request, then takes up to batch_size - 1 more requests which
+        are already waiting on the socket. Every request takes a slot of max_in_flight.
+
+        Returns:
+            List[List[bytes]]: The received requests.
+        """
+        self._idle = True
+        try:
+            if self._in_flight_sem is not None:
+                # when all the handlers are busy stop receiving,
+                # the socket high-water mark pushes back on the clients.
+                await self._in_flight_sem.acquire()
+            self._logger.debug("Waiting for new requests...")
+            self._idle = False
+            self._recv_future = self._socket.recv_multipart(copy=not self._zero_copy)
+            try:
+                buffers = [await self._recv_future]
+            except BaseException:
+                self._release_slot()
+                raise
+            finally:
+                self._recv_future = None
+        finally:
+            self._idle = False
+        while len(buffers) < self._batch_size:
+            buffer = await self._receive_waiting()
+            if buffer is None:
+                break
+            buffers.append(buffer)
+        self._logger.debug("Received %s new requests", len(buffers))
+        return buffers
+
+    async def _receive_waiting(self) -> Optional[List[bytes]]:
+        """Takes a request which is already waiting on the socket if a slot is free.
+
+        Returns:
+            Optional[List[bytes]]: The request, None if no slot is free or no request waits.
+        """
+        if self._in_flight_sem is not None:
+            if self._in_flight_sem.locked():
+                return None
+            await self._in_flight_sem.acquire()
+        try:
+            return await self._socket.recv_multipart(zmq.NOBLOCK, copy=not self._zero_copy)
+        except zmq.error.Again:
+            self._release_slot()
+            return None
+
+    def _start_handlers(self) -> List[asyncio.Task]:
+        """Creates the concurrency limit and the intake queue of the server.
+
+        Returns:
+            List[asyncio.Task]: The tasks handling the queued requests.
+        """
+        self._in_flight_sem = None
+        self._intake_queue = None
+        if self._intake_queue_size > 0:
+            self._intake_queue = IntakeLanes(self._intake_queue_size, self.priority_weights)
+            nb_handlers = self._max_in_flight if self._max_in_flight > 0 else 1
+            return [asyncio.create_task(self._handle_queued()) for _ in range(nb_handlers)]
+        if self._max_in_flight > 0:
+            self._in_flight_sem = asyncio.Semaphore(self._max_in_flight)
+        return []
+
+    async def _run_handler(self, buffer: List[bytes]) -> None:
+        """Handles a single request and frees its slot."""
+        self._stats["in_flight"] += 1
+        try:
+            await self.handle(buffer)
+        except Exception as error:
+            self._logger.error("ZMQServer handler error: %s", str(error))
+        finally:
+            self._stats["in_flight"] -= 1
+            self._release_slot()
+
+    async def _run_batch(self, buffers: List[List[bytes]]) -> None:
+        """Handles the requests received together and frees their slots."""
+        self._stats["in_flight"] += len(buffers)
+        try:
+            await self.handle_batch(buffers)
+        except Exception as error:
+            self._logger.error("ZMQServer handler error: %s", str(error))
+        finally:
+            self._stats["in_flight"] -= len(buffers)
+            for _ in buffers:
+                self._release_slot()
+
+    def _priority_of(self, buffer: List[bytes]) -> str:
+        """Returns the intake lane of a received request by its req_type.
+
+        Args:
+            buffer (List[bytes]): The identity of the client and the request frames.
+
+        Returns:
+            str: The priority of the request, an invalid one is of normal priority.
+        """
+        if not self.priorities:
+            return Priority.NORMAL
+        priority = self.priorities.get(peek_req_type(buffer), Priority.NORMAL)
+        return self._intake_queue.lane_of(priority)
+
+    async def _handle_queued(self) -> None:
+        """Handles the requests of the intake queue one after the other,
+        taking turns between the priority lanes."""
+        while True:
+            priority, buffer = await self._intake_queue.get()
+            await self._run_handler(buffer)
+            self._intake_queue.task_done(priority)
+
+    def _release_slot(self) -> None:
+        """Allows receiving one more request."""
+        if self._in_flight_sem is not None:
+            self._in_flight_sem.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of received requests, of requests being handled
+        and of requests waiting in the intake queue, in total and by priority."""
+        stats = dict(self._stats)
+        stats["queue_depth"] = 0
+        if self._intake_queue is not None:
+            stats["queue_depth"] = self._intake_queue.qsize()
+            for priority, depth in self._intake_queue.qsizes().items():
+                stats[f"queue_depth_{priority}"] = depth
+        return stats
+
+    def get_request_stats(self) -> Dict[str, dict]:
+        """Returns the counters and the latency histogram of every routed req_type."""
+        return self._req_stats.to_dict()
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Returns the hit, miss and eviction counters and the size of the response cache."""
+        return self._cache.get_stats()
+
+    async def _report_stats(self) -> None:
+        """Sends the per req_type stats as metrics every stats_interval seconds."""
+        client = AsyncMessageClient(self.stats_addr)
+        while True:
+            await asyncio.sleep(self._stats_interval)
+            for req_type, fields in self._req_stats.to_dict().items():
+                data = {
+                    "measurement": ZMQ_SERVER_STATS_MEASUREMENT,
+                    "db_name": PLATFORM_METRICS_INFLUX_DB,
+                    "metric_fields": fields,
+                    "metric_tags": {"server": self._name, "req_type": req_type},
+                }
+                client.enqueue_request(METRICS_HANDLER_MSG_TYPE, data)
+
     def close(self) -> None:
         """close the zmq socket."""
         if self._initialized:
-            self._socket.close()
+            # give the pending replies drain_timeout seconds to be sent
+            self._socket.close(linger=int(self._drain_timeout * 1000))
             self._ctx.destroy()
             self._socket = None
             self._ctx = None
@@ -109,10 +473,13 @@ class ZMQServer(ABC):
 
     def start(self) -> bool:
         """The main message dispatch loop.
+        With more than one worker, blocks while proxying the requests to the worker processes.
 
         Returns:
             bool: True on success, False otherwise.
         """
+        if self._workers > 1:
+            return self._run_workers()
         try:
             self.loop = asyncio.get_running_loop()
             asyncio.create_task(self.spin())
@@ -125,13 +492,369 @@ class ZMQServer(ABC):
             self._logger.error("Failed to start %s", self._name)
             return False
 
-    def stop(self):
-        """Stops the server from running."""
+    def stop(self, drain_timeout: Optional[float] = None):
+        """Stops receiving requests, the server closes once the received requests
+        were handled and their replies sent. Can be called from any thread.
+
+        Args:
+            drain_timeout (float, optional): The seconds to wait for the handlers of the
+                received requests. Defaults to MOVAI_ZMQ_SERVER_DRAIN_TIMEOUT.
+        """
+        if drain_timeout is not None:
+            self._drain_timeout = drain_timeout
         self._running = False
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._interrupt_receive)
+
+    def _run_workers(self) -> bool:
+        """Forks the worker processes and proxies the requests between them and the clients.
+
+        Returns:
+            bool: True once the proxy has stopped, False if it failed to start.
+        """
+        backend_path = os.path.join(
+            tempfile.gettempdir(), f"{self._name}-workers-{os.getpid()}.sock"
+        )
+        backend_addr = f"ipc://{backend_path}"
+        ctx = zmq.Context()
+        frontend = ctx.socket(zmq.ROUTER)
+        backend = ctx.socket(zmq.DEALER)
+        control = ctx.socket(zmq.PAIR)
+        control_sender = ctx.socket(zmq.PAIR)
+        try:
+            self._init_socket_options(frontend)
+            frontend.bind(self._addr)
+            backend.bind(backend_addr)
+            control.bind(f"inproc://{self._name}-control")
+            # a PAIR socket drops the messages of a closed peer, so the sender stays connected
+            control_sender.connect(f"inproc://{self._name}-control")
+            fork_ctx = multiprocessing.get_context("fork")
+            for index in range(self._workers):
+                process = fork_ctx.Process(
+                    target=self._run_worker,
+                    args=(backend_addr,),
+                    name=f"{self._name}-worker-{index}",
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+            self._running = True
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGTERM, lambda *_: self.stop())
+            self._logger.info(
+                "%s is listening on %s with %s workers", self._name, self._addr, self._workers
+            )
+            proxy = threading.Thread(
+                target=zmq.proxy_steerable,  # pylint: disable=no-member
+                args=(frontend, backend, None, control),
+                name=f"{self._name}-proxy",
+                daemon=True,
+            )
+            proxy.start()
+            while proxy.is_alive():
+                try:
+                    # wake up regularly, signal handlers only run between the waits
+                    proxy.join(0.5)
+                except KeyboardInterrupt:
+                    self.stop()
+                if not self._running:
+                    # the proxy forwards the replies of the draining workers until they exit
+                    self._logger.info("%s is stopping its workers", self._name)
+                    self._stop_workers()
+                    control_sender.send(b"TERMINATE")
+                    proxy.join()
+        except (OSError, zmq.error.ZMQError) as exc:
+            self._logger.error("Failed to start %s workers: %s", self._name, exc)
+            return False
+        finally:
+            self._stop_workers()
+            for socket in (frontend, backend, control, control_sender):
+                socket.close(linger=0)
+            ctx.term()
+            if os.path.exists(backend_path):
+                os.remove(backend_path)
+        return True
+
+    def _stop_workers(self) -> None:
+        """Stops the worker processes, killing the ones still draining after drain_timeout."""
+        for process in self._processes:
+            process.terminate()
+        deadline = time.monotonic() + self._drain_timeout + 1
+        for process in self._processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                self._logger.warning("%s killed worker %s", self._name, process.pid)
+                process.kill()
+                process.join()
+        self._processes = []
+
+    def _run_worker(self, backend_addr: str) -> None:
+        """The main function of a worker process, handles the requests of the proxy."""
+        # the parent process stops the workers with SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self._backend_addr = backend_addr
+        self._workers = 0
+        asyncio.run(self._spin_worker(os.getppid()))
+
+    async def _spin_worker(self, parent_pid: int) -> None:
+        """Handles the requests of the proxy until the server or its parent process stops."""
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.stop)
+        watchdog = asyncio.create_task(self._watch_parent(parent_pid))
+        await self.spin()
+        watchdog.cancel()
+
+    async def _watch_parent(self, parent_pid: int) -> None:
+        """Stops the worker if its parent process was killed without stopping it."""
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(1)
+        self._logger.warning("%s worker %s lost its parent, stopping", self._name, os.getpid())
+        self.stop()
 
-    @abstractmethod
     async def handle(self, buffer: List[bytes]) -> None:
-        pass
+        """Handles a request, by default dispatches it to the route of its req_type.
+        An override should reply with send_response(), which echoes the req_id of the request,
+        otherwise the clients can only send it one request at a time.
+
+        Args:
+            buffer (List[bytes]): The identity of the client and the request frames.
+        """
+        await self.dispatch(buffer)
+
+    async def dispatch(self, buffer: List[bytes]) -> None:
+        """Validates the request with the model of its route, calls the handler
+        and sends back the response if the request requires one.
+
+        Args:
+            buffer (List[bytes]): The identity of the client and the request frames.
+        """
+        if self._validator is None:
+            self._logger.error("%s has no routes, override handle()", self._name)
+            return
+        codec = frame_codec(buffer)
+        data = buffer[-1]
+        if isinstance(data, zmq.Frame):
+            # decoded straight from the frame buffer, without copying it to bytes first
+            data = data.buffer
+        request = self._validate(data, codec)
+        if request is None:
+            return
+        replies = [(buffer[0], request.req_id)] if request.response_required else []
+        await self._respond(
+            self._routes[request.req_type], request, data, codec, replies, len(data)
+        )
+
+    async def _respond(
+        self,
+        req_route: Route,
+        request: Request,
+        data: bytes,
+        codec,
+        replies: List[Tuple[bytes, Optional[str]]],
+        bytes_in: int,
+    ) -> None:
+        """Sends the cached response of a request, or the response of the identical
+        request in flight, or calls the handler of its route.
+
+        Args:
+            req_route (Route): The route of the request.
+            request (Request): The validated request.
+            data (bytes): The request as received.
+            codec (WireCodec): The codec the request is encoded with.
+            replies (List[Tuple[bytes, Optional[str]]]): The identity and the req_id
+                of the clients waiting for the response.
+            bytes_in (int): The size of the request.
+        """
+        stats = self._req_stats.get(request.req_type)
+        key = None
+        if req_route.cacheable or req_route.coalesce:
+            key = make_cache_key(request)
+        response = self._cache.get(key) if req_route.cacheable else MISS
+        coalesced = response is MISS and req_route.coalesce
+        nb_replies = len(replies)
+        if coalesced:
+            if key in self._flights:
+                # the response of the identical request in flight is sent to this client too
+                self._flights[key].extend(replies)
+                stats.coalesced += 1
+                stats.bytes_in += bytes_in
+                return
+            self._flights[key] = replies
+        cache_key = key if req_route.cacheable and response is MISS else None
+        stats.in_flight += 1
+        start_time = time.perf_counter()
+        error = True
+        try:
+            if response is MISS:
+                response = await self._call_route(req_route, request, data, codec.name)
+            error = False
+        except Exception:
+            if coalesced and len(replies) > nb_replies:
+                # the requests which joined the failed one are handled again, as a new flight
+                self._track(self._retry(req_route, request, data, codec, replies[nb_replies:]))
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.record(time.perf_counter() - start_time, bytes_in, error)
+            if coalesced:
+                del self._flights[key]
+        if replies:
+            # a cached or coalesced response is sent with the req_id of each request
+            stats.bytes_out += await self._send_replies(replies, response, codec, cache_key)
+
+    async def _retry(
+        self,
+        req_route: Route,
+        request: Request,
+        data: bytes,
+        codec,
+        replies: List[Tuple[bytes, Optional[str]]],
+    ) -> None:
+        """Handles again the requests which waited for a coalesced request that failed."""
+        try:
+            await self._respond(req_route, request, data, codec, replies, 0)
+        except Exception as error:
+            self._logger.error("ZMQServer handler error: %s", str(error))
+
+    def _validate(self, data: bytes, codec) -> Optional[Request]:
+        """Validates a request with the model of the route of its req_type.
+
+        Args:
+            data (bytes): The request as received, or the buffer of its frame.
+            codec (WireCodec): The codec the request is encoded with.
+
+        Returns:
+            Optional[Request]: The request, None if it is invalid.
+        """
+        try:
+            if codec is JSON_CODEC:
+                # validated straight from the bytes, without building a dict first,
+                # pydantic does not read json from a frame buffer
+                return self._validator.validate_json(bytes(data)).request
+            return self._validator.validate_python(codec.decode(data)).request
+        except (ValidationError, ValueError, TypeError) as error:
+            # an unknown req_type fails the validation as well
+            self._req_stats.get(INVALID_REQ_TYPE).record(0.0, len(data), True)
+            self._logger.error("%s got an invalid request: %s", self._name, error)
+            return None
+
+    async def _call_route(
+        self, req_route: Route, request: Request, data: bytes, codec_name: str
+    ) -> Any:
+        """Calls the handler of a route in the event loop or in its executor.
+
+        Returns:
+            Any: The response data.
+        """
+        if req_route.executor is not None:
+            return await self._run_in_executor(req_route, request, data, codec_name)
+        response = getattr(self, req_route.handler_name)(request)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+    async def _run_in_executor(
+        self, req_route: Route, request: Request, data: bytes, codec_name: str
+    ) -> Any:
+        """Runs the handler of a route in the thread pool or in the process pool,
+        the process pool gets the request bytes instead of the validated request.
+
+        Returns:
+            Any: The response data.
+        """
+        executor = self._executors.get(req_route.executor)
+        if executor is None:
+            if req_route.executor == ExecutorType.PROCESS:
+                # forking the threaded server could copy a lock held by another thread
+                executor = ProcessPoolExecutor(
+                    MOVAI_ZMQ_SERVER_PROCESS_POOL_SIZE,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            else:
+                executor = ThreadPoolExecutor(
+                    MOVAI_ZMQ_SERVER_THREAD_POOL_SIZE, thread_name_prefix=self._name
+                )
+            self._executors[req_route.executor] = executor
+        if req_route.executor == ExecutorType.PROCESS:
+            handler = getattr(type(self), req_route.handler_name)
+            args = (validate_and_call, handler, req_route.model, bytes(data), codec_name)
+        else:
+            args = (getattr(self, req_route.handler_name), request)
+        response, queue_time, run_time = await run_blocking_code(
+            executor, timed_call, time.monotonic(), *args
+        )
+        self._req_stats.get(request.req_type).record_offload(queue_time, run_time)
+        return response
+
+    async def send_response(
+        self,
+        identity: bytes,
+        req_id: Optional[str],
+        response: Any,
+        codec=JSON_CODEC,
+        cache_key: Optional[str] = None,
+    ) -> int:
+        """Sends the response of a request, echoing its req_id.
+
+        Args:
+            identity (bytes): The identity of the client.
+            req_id (Optional[str]): The id of the request.
+            response (Any): The response data.
+            codec (WireCodec): The codec to encode the response with.
+            cache_key (str, optional): Caches the response under this key before sending it.
+
+        Returns:
+            int: The size of the response, 0 if it could not be encoded.
+        """
+        return await self._send_replies([(identity, req_id)], response, codec, cache_key)
+
+    async def _send_replies(
+        self,
+        replies: List[Tuple[bytes, Optional[str]]],
+        response: Any,
+        codec=JSON_CODEC,
+        cache_key: Optional[str] = None,
+    ) -> int:
+        """Sends the same response to many clients, each reply echoes the req_id
+        of its request.
+
+        Returns:
+            int: The size of the replies, 0 if the response could not be encoded.
+        """
+        frames = create_reply_frames(response, [req_id for _, req_id in replies], codec)
+        if frames is None:
+            self._logger.error("%s failed to encode the response of %s", self._name, replies)
+            return 0
+        if cache_key is not None:
+            self._cache.put(cache_key, response, len(frames[0][-1]))
+        size = 0
+        for (identity, _), reply in zip(replies, frames):
+            await self._socket.send_multipart([identity] + reply)
+            size += len(reply[-1])
+        return size
+
+    @route(SERVER_STATS_MSG_TYPE)
+    def handle_server_stats(self, _request: Request) -> dict:
+        """Replies with the stats of the server and of every routed req_type."""
+        stats = self.get_stats()
+        stats["req_types"] = self.get_request_stats()
+        stats["cache"] = self.get_cache_stats()
+        return stats
+
+    async def handle_batch(self, buffers: List[List[bytes]]) -> None:
+        """Handles the requests received on the same wakeup when batch_size > 1.
+        Override it to process them at once, by default they are passed to handle()
+        concurrently, so a slow request does not delay the others.
+
+        Args:
+            buffers (List[List[bytes]]): The received requests.
+        """
+        results = await asyncio.gather(
+            *(self.handle(buffer) for buffer in buffers), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                self._logger.error("ZMQServer handler error: %s", str(result))
 
     async def at_startup(self):
         """A funtion which is called once at server startup and can be used for initializing
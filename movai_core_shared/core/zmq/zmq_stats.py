@@ -0,0 +1,115 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Per req_type counters and latency histograms of a ZMQServer.
+"""
+from bisect import bisect_left
+from typing import Dict, List
+
+# the upper bounds of the latency buckets in milliseconds, slower requests fall in the last one
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# pylint: disable=too-many-instance-attributes
+class RequestTypeStats:
+    """The counters of the requests of one req_type, updated in place."""
+
+    __slots__ = (
+        "requests",
+        "errors",
+        "in_flight",
+        "bytes_in",
+        "bytes_out",
+        "latency",
+        "buckets",
+        "offloaded",
+        "queue_time",
+        "run_time",
+        "coalesced",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = 0.0
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.offloaded = 0
+        self.queue_time = 0.0
+        self.run_time = 0.0
+        # requests answered with the response of an identical request in flight
+        self.coalesced = 0
+
+    def record(self, latency: float, bytes_in: int, error: bool) -> None:
+        """Records a handled request, the size of its response is added once it is sent.
+
+        Args:
+            latency (float): The time the handler took in seconds.
+            bytes_in (int): The size of the request.
+            error (bool): Whether the handler failed.
+        """
+        self.requests += 1
+        self.errors += error
+        self.bytes_in += bytes_in
+        self.latency += latency
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+
+    def record_offload(self, queue_time: float, run_time: float) -> None:
+        """Records a request handled in an executor.
+
+        Args:
+            queue_time (float): The seconds the handler waited for a worker of the pool.
+            run_time (float): The seconds the handler ran.
+        """
+        self.offloaded += 1
+        self.queue_time += queue_time
+        self.run_time += run_time
+
+    def to_dict(self) -> dict:
+        """Returns the counters, the histogram buckets are keyed by their upper bound."""
+        stats = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "coalesced": self.coalesced,
+            "latency_avg_ms": self.latency * 1000 / self.requests if self.requests else 0.0,
+        }
+        if self.offloaded:
+            stats["queue_avg_ms"] = self.queue_time * 1000 / self.offloaded
+            stats["run_avg_ms"] = self.run_time * 1000 / self.offloaded
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            stats[f"latency_le_{bound}ms"] = count
+        stats["latency_le_inf"] = self.buckets[-1]
+        return stats
+
+
+class ServerStats:
+    """The stats of a ZMQServer by req_type."""
+
+    def __init__(self) -> None:
+        self._req_types: Dict[str, RequestTypeStats] = {}
+
+    def get(self, req_type: str) -> RequestTypeStats:
+        """Returns the stats of a req_type, created on its first request.
+
+        Args:
+            req_type (str): The type of the requests.
+
+        Returns:
+            RequestTypeStats: The stats.
+        """
+        stats = self._req_types.get(req_type)
+        if stats is None:
+            stats = self._req_types[req_type] = RequestTypeStats()
+        return stats
+
+    def to_dict(self) -> Dict[str, dict]:
+        """Returns the stats of every req_type."""
+        return {req_type: stats.to_dict() for req_type, stats in self._req_types.items()}
@@ -22,6 +22,15 @@ MOVAI_STDOUT_VERBOSITY_LEVEL = DEBUG  # Minimum log supported by handlers
 MOVAI_FLEET_LOGS_VERBOSITY_LEVEL = getLevelName(
     os.getenv("MOVAI_FLEET_LOGS_VERBOSITY_LEVEL", "DEBUG").upper()
 )  # Verbosity level for influxdb logs
+# records per second and burst each call site can send to influxdb, 0 disables the limit
+MOVAI_FLEET_LOGS_RATE_LIMIT = float(os.getenv("MOVAI_FLEET_LOGS_RATE_LIMIT", "0"))
+MOVAI_FLEET_LOGS_BURST = int(os.getenv("MOVAI_FLEET_LOGS_BURST", "20"))
+# the fraction of the DEBUG and INFO records sent to influxdb
+MOVAI_FLEET_LOGS_SAMPLE_RATE = float(os.getenv("MOVAI_FLEET_LOGS_SAMPLE_RATE", "1.0"))
+# seconds between the records summarizing the suppressed records
+MOVAI_FLEET_LOGS_SUPPRESSION_INTERVAL = float(
+    os.getenv("MOVAI_FLEET_LOGS_SUPPRESSION_INTERVAL", "60")
+)
 MOVAI_LOG_FILE = os.getenv("MOVAI_LOG_FILE", "/opt/mov.ai/app/movai.log")
 # default as NOTSET that will turn off the output for the addition log file
 MOVAI_LOGFILE_VERBOSITY_LEVEL = getLevelName(
@@ -33,6 +42,23 @@ MOVAI_GENERAL_VERBOSITY_LEVEL = getLevelName(
 MOVAI_CALLBACK_VERBOSITY_LEVEL = getLevelName(
     os.getenv("MOVAI_CALLBACK_VERBOSITY_LEVEL", "DEBUG").upper()
 )  # Verbosity level for callback logs
+# the console handlers write the records in chunks, flushed every MOVAI_STDOUT_FLUSH_INTERVAL
+# seconds and on every warning or error, instead of writing and flushing each one
+MOVAI_STDOUT_BUFFERED = os.getenv("MOVAI_STDOUT_BUFFERED", "False").lower() in ("true", "1", "t")
+MOVAI_STDOUT_FLUSH_INTERVAL = float(os.getenv("MOVAI_STDOUT_FLUSH_INTERVAL", "0.5"))
+# Log.get_logger queues the records, a listener thread hands them to the console,
+# file and remote handlers so the logging threads never wait for them
+MOVAI_LOGS_ASYNC = os.getenv("MOVAI_LOGS_ASYNC", "False").lower() in ("true", "1", "t")
+MOVAI_LOGS_QUEUE_SIZE = int(os.getenv("MOVAI_LOGS_QUEUE_SIZE", "10000"))
+# drop_oldest, drop_newest or block
+MOVAI_LOGS_QUEUE_POLICY = os.getenv("MOVAI_LOGS_QUEUE_POLICY", "drop_oldest")
+# RemoteHandler buffers the records and a background thread sends them in batches
+MOVAI_LOGS_BATCHING = os.getenv("MOVAI_LOGS_BATCHING", "False").lower() in ("true", "1", "t")
+MOVAI_LOGS_BATCH_SIZE = int(os.getenv("MOVAI_LOGS_BATCH_SIZE", "200"))
+# records waiting to be sent, the oldest ones are dropped when the message server lags behind
+MOVAI_LOGS_BUFFER_SIZE = int(os.getenv("MOVAI_LOGS_BUFFER_SIZE", "10000"))
+# seconds the repeats of a record are collapsed by the file and remote handlers, 0 disables it
+MOVAI_LOGS_DEDUP_WINDOW = float(os.getenv("MOVAI_LOGS_DEDUP_WINDOW", "0"))
 LOG_HTTP_HOST = os.environ.get("LOG_HTTP_HOST", "http://health-node:8081")
 MOVAI_IPC_PATH = os.getenv("MOVAI_IPC_PATH", "/opt/mov.ai/comm")
 DETACHED_PROCESS_OUTPUT = os.getenv("DETACHED_PROCESS_OUTPUT")
@@ -79,6 +105,55 @@ MASTER_MESSAGE_SERVER_PORT = os.getenv("MANAGER_MESSAGE_SERVER_PORT", "9009")
 MASTER_MESSAGE_SERVER = f"tcp://{MASTER_MESSAGE_SERVER_HOST}:{MASTER_MESSAGE_SERVER_PORT}"
 MOVAI_ZMQ_RECV_TIMEOUT_MS = int(os.getenv("MOVAI_ZMQ_RECV_TIMEOUT_MS", "2500"))
 MOVAI_ZMQ_SEND_TIMEOUT_MS = int(os.getenv("MOVAI_ZMQ_SEND_TIMEOUT_MS", "1000"))
+MOVAI_ZMQ_CODEC = os.getenv("MOVAI_ZMQ_CODEC", "json")  # json, compact_json or msgpack
+MOVAI_ZMQ_ZERO_COPY = os.getenv("MOVAI_ZMQ_ZERO_COPY", "False").lower() in ("true", "1", "t")
+MOVAI_ZMQ_PIPELINE_WINDOW = int(os.getenv("MOVAI_ZMQ_PIPELINE_WINDOW", "64"))
+MOVAI_ZMQ_RECONNECT_BASE_MS = int(os.getenv("MOVAI_ZMQ_RECONNECT_BASE_MS", "100"))
+MOVAI_ZMQ_RECONNECT_MAX_MS = int(os.getenv("MOVAI_ZMQ_RECONNECT_MAX_MS", "5000"))
+MOVAI_ZMQ_RECONNECT_JITTER = float(os.getenv("MOVAI_ZMQ_RECONNECT_JITTER", "0.5"))
+# ZMTP heartbeats of the DEALER sockets, an interval of 0 disables them
+MOVAI_ZMQ_HEARTBEAT_IVL_MS = int(os.getenv("MOVAI_ZMQ_HEARTBEAT_IVL_MS", "1000"))
+MOVAI_ZMQ_HEARTBEAT_TIMEOUT_MS = int(os.getenv("MOVAI_ZMQ_HEARTBEAT_TIMEOUT_MS", "3000"))
+MOVAI_ZMQ_HEARTBEAT_TTL_MS = int(os.getenv("MOVAI_ZMQ_HEARTBEAT_TTL_MS", "3000"))
+MOVAI_ZMQ_RTT_EWMA_ALPHA = float(os.getenv("MOVAI_ZMQ_RTT_EWMA_ALPHA", "0.2"))
+# high-water marks (max queued messages) of the client sockets, 0 means no limit
+MOVAI_ZMQ_DEALER_SNDHWM = int(os.getenv("MOVAI_ZMQ_DEALER_SNDHWM", "1000"))
+MOVAI_ZMQ_DEALER_RCVHWM = int(os.getenv("MOVAI_ZMQ_DEALER_RCVHWM", "1000"))
+MOVAI_ZMQ_PUB_SNDHWM = int(os.getenv("MOVAI_ZMQ_PUB_SNDHWM", "1000"))
+MOVAI_ZMQ_SUB_RCVHWM = int(os.getenv("MOVAI_ZMQ_SUB_RCVHWM", "1000"))
+# publishers block up to MOVAI_ZMQ_SEND_TIMEOUT_MS instead of dropping messages
+MOVAI_ZMQ_PUB_NODROP = os.getenv("MOVAI_ZMQ_PUB_NODROP", "False").lower() in ("true", "1", "t")
+# concurrent handlers of a ZMQServer, the server stops receiving once they are all busy
+MOVAI_ZMQ_SERVER_MAX_IN_FLIGHT = int(os.getenv("MOVAI_ZMQ_SERVER_MAX_IN_FLIGHT", "1000"))
+# received requests waiting for a handler, 0 disables the intake queue
+# and with it the priority lanes, the requests are then started in the order received
+MOVAI_ZMQ_SERVER_INTAKE_QUEUE_SIZE = int(os.getenv("MOVAI_ZMQ_SERVER_INTAKE_QUEUE_SIZE", "0"))
+# requests a ZMQServer takes from its socket on every wakeup, 1 handles them one by one
+MOVAI_ZMQ_SERVER_BATCH_SIZE = int(os.getenv("MOVAI_ZMQ_SERVER_BATCH_SIZE", "1"))
+# processes handling the requests of a ZMQServer behind a ROUTER frontend, 0 or 1 disables it
+MOVAI_ZMQ_SERVER_WORKERS = int(os.getenv("MOVAI_ZMQ_SERVER_WORKERS", "0"))
+# workers of the pools running the ZMQServer routes which are not run in the event loop
+MOVAI_ZMQ_SERVER_THREAD_POOL_SIZE = int(os.getenv("MOVAI_ZMQ_SERVER_THREAD_POOL_SIZE", "4"))
+MOVAI_ZMQ_SERVER_PROCESS_POOL_SIZE = int(os.getenv("MOVAI_ZMQ_SERVER_PROCESS_POOL_SIZE", "2"))
+# seconds the responses of the cacheable ZMQServer routes are served from the cache, 0 disables it
+MOVAI_ZMQ_SERVER_CACHE_TTL = float(os.getenv("MOVAI_ZMQ_SERVER_CACHE_TTL", "2"))
+MOVAI_ZMQ_SERVER_CACHE_MAX_BYTES = int(os.getenv("MOVAI_ZMQ_SERVER_CACHE_MAX_BYTES", "16777216"))
+# seconds ZMQServer.stop() waits for the handlers of the received requests
+MOVAI_ZMQ_SERVER_DRAIN_TIMEOUT = float(os.getenv("MOVAI_ZMQ_SERVER_DRAIN_TIMEOUT", "5"))
+# seconds between the per req_type stats a ZMQServer sends as metrics, 0 disables them
+MOVAI_ZMQ_SERVER_STATS_INTERVAL = float(os.getenv("MOVAI_ZMQ_SERVER_STATS_INTERVAL", "0"))
+MOVAI_ZMQ_SERVER_STATS_ADDR = os.getenv("MOVAI_ZMQ_SERVER_STATS_ADDR", LOCAL_MESSAGE_SERVER)
+MOVAI_ZMQ_SEND_QUEUE_SIZE = int(os.getenv("MOVAI_ZMQ_SEND_QUEUE_SIZE", "10000"))
+# drop_oldest, drop_newest or block
+MOVAI_ZMQ_SEND_QUEUE_POLICY = os.getenv("MOVAI_ZMQ_SEND_QUEUE_POLICY", "drop_oldest")
+# every thread gets its own ZMQ client socket, up to MOVAI_ZMQ_CLIENT_POOL_SIZE sockets
+# per server address, the threads past the bound share the socket of the process
+MOVAI_ZMQ_CLIENT_PER_THREAD = os.getenv("MOVAI_ZMQ_CLIENT_PER_THREAD", "True").lower() in (
+    "true",
+    "1",
+    "t",
+)
+MOVAI_ZMQ_CLIENT_POOL_SIZE = int(os.getenv("MOVAI_ZMQ_CLIENT_POOL_SIZE", "16"))
 MESSAGE_SERVER_DEBUG_MODE = os.getenv("MESSAGE_SERVER_DEBUG_MODE", "False").lower() in (
     "true",
     "1",
@@ -0,0 +1,118 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        A console handler which can buffer its writes.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import List, Optional
+from weakref import WeakSet
+
+from movai_core_shared.envvars import MOVAI_STDOUT_BUFFERED, MOVAI_STDOUT_FLUSH_INTERVAL
+
+# the records of this level or above are written right away, with the ones buffered before them
+FLUSH_LEVEL = logging.WARNING
+# the buffer is written once it holds this many records, whatever the time since the last flush
+MAX_BUFFERED_RECORDS = 1000
+
+_flushed_handlers: "WeakSet[logging.Handler]" = WeakSet()
+_flusher_lock = threading.Lock()
+_flusher_pid: Optional[int] = None
+
+
+def _run_flusher() -> None:
+    """Flushes the registered handlers every MOVAI_STDOUT_FLUSH_INTERVAL seconds,
+    the error of a handler is printed and does not stop the flushes of the others."""
+    while True:
+        time.sleep(MOVAI_STDOUT_FLUSH_INTERVAL)
+        for handler in list(_flushed_handlers):
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                # the stream was closed, ignored like logging.shutdown() does
+                pass
+            except Exception:  # pylint: disable=broad-except
+                # reported like the errors of Handler.emit(), logging it could fail again
+                if logging.raiseExceptions:
+                    traceback.print_exc(file=sys.stderr)
+
+
+def register_flush(handler: logging.Handler) -> None:
+    """Adds a handler to the ones flushed periodically, the flusher thread is started
+    by the first one, again in a forked process which has no thread."""
+    global _flusher_pid  # pylint: disable=global-statement
+    _flushed_handlers.add(handler)
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_run_flusher, name="StdOutFlusher", daemon=True).start()
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """A StreamHandler which writes and flushes every record, or when buffered,
+    writes the records together on a timer, on a warning or above and at exit.
+    logging.shutdown() flushes the handlers at exit."""
+
+    def __init__(self, stream=None, buffered: bool = MOVAI_STDOUT_BUFFERED):
+        """Constructor
+
+        Args:
+            stream: The stream to write to, defaults to sys.stderr.
+            buffered (bool): Whether the records are buffered.
+        """
+        super().__init__(stream)
+        self._buffer: Optional[List[str]] = None
+        if buffered:
+            self._buffer = []
+            register_flush(self)
+
+    def write_record(self, text: str, levelno: int) -> None:
+        """Writes a formatted record, called by emit() which holds the handler lock.
+
+        Args:
+            text (str): The formatted record with its terminator.
+            levelno (int): The level of the record.
+        """
+        if self._buffer is None:
+            self._write(text)
+            return
+        self._buffer.append(text)
+        if levelno >= FLUSH_LEVEL or len(self._buffer) >= MAX_BUFFERED_RECORDS:
+            self._write_buffer()
+
+    def _write_buffer(self) -> None:
+        """Writes the buffered records at once."""
+        if self._buffer:
+            text = "".join(self._buffer)
+            self._buffer.clear()
+            self._write(text)
+
+    def _write(self, text: str) -> None:
+        """Writes to the stream and flushes it, reopens the console if it was closed."""
+        stream = self.stream
+        if stream.closed:
+            if stream == sys.stderr:
+                stream = open("/dev/stderr", "w")
+            else:
+                stream = open("/dev/stdout", "w")
+        stream.write(text)
+        if hasattr(stream, "flush"):
+            stream.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered records and flushes the stream."""
+        self.acquire()
+        try:
+            if self._buffer:
+                self._write_buffer()
+            else:
+                super().flush()
+        finally:
+            self.release()
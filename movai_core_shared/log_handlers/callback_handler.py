@@ -9,12 +9,13 @@
    - Andre Pereira (andre.pereira@mov.ai) - 2025
 """
 
-import sys
 import logging
+from movai_core_shared.log_handlers.buffered_stream import BufferedStreamHandler
 from movai_core_shared.log_handlers.generic_handler import LogAdapter
 from movai_core_shared.consts import (
     CALLBACK_STDOUT_COLORS,
 )
+from movai_core_shared.envvars import MOVAI_STDOUT_BUFFERED
 
 # pylint: disable=invalid-name,dangerous-default-value
 
@@ -24,12 +25,12 @@ CALLBACK_LOG_FORMAT = (
 )
 
 
-class CallbackStdOutHandler(logging.StreamHandler):
+class CallbackStdOutHandler(BufferedStreamHandler):
     _COLORS = CALLBACK_STDOUT_COLORS
     _COLOR_RESET = "\u001b[0m"
 
-    def __init__(self, color=CALLBACK_STDOUT_COLORS, stream=None):
-        super().__init__(stream)
+    def __init__(self, color=CALLBACK_STDOUT_COLORS, stream=None, buffered=MOVAI_STDOUT_BUFFERED):
+        super().__init__(stream, buffered)
         self._COLORS = color
         self.setFormatter(
             logging.Formatter(fmt=CALLBACK_LOG_FORMAT, datefmt=LOG_FORMATTER_DATETIME)
@@ -55,18 +56,10 @@ class CallbackStdOutHandler(logging.StreamHandler):
                 record.tags = "|".join([f"{k}:{v}" for k, v in tags.items()])
 
             msg = self.format(record)
-
-            stream = self.stream
-            if stream.closed:
-                if stream == sys.stderr:
-                    stream = open("/dev/stderr", "w")
-                else:
-                    stream = open("/dev/stdout", "w")
-            stream.write(
-                self._COLORS.get(record.levelno, "") + msg + self._COLOR_RESET + self.terminator
+            self.write_record(
+                self._COLORS.get(record.levelno, "") + msg + self._COLOR_RESET + self.terminator,
+                record.levelno,
             )
-            # stream.write()
-            self.flush()
         except Exception:
             self.handleError(record)
 
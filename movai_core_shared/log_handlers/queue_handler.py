@@ -0,0 +1,165 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Hands the log records to their handlers from a single listener thread.
+"""
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import os
+import queue
+import threading
+from typing import Dict, List, Optional
+
+from movai_core_shared.consts import OverflowPolicy
+from movai_core_shared.envvars import MOVAI_LOGS_QUEUE_SIZE, MOVAI_LOGS_QUEUE_POLICY
+
+
+class LogQueueListener(QueueListener):
+    """A listener thread handling the records of all the LogQueueHandler of the process,
+    every record is handed to the handlers of the queue handler which queued it."""
+
+    def __init__(self, maxsize: int, policy: str) -> None:
+        """Constructor
+
+        Args:
+            maxsize (int): The number of records waiting to be handled.
+            policy (str): The OverflowPolicy of the queue once it is full.
+        """
+        super().__init__(queue.Queue(maxsize))
+        self._policy = policy
+        self._stats = {"queued": 0, "dropped": 0}
+        self._lock = threading.Lock()
+        # set while stop() waits for the queued records, no record is queued after the end
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        """Whether the listener thread handles the queued records."""
+        return self._thread is not None and not self._stopping
+
+    def put(self, item: tuple) -> bool:
+        """Queues a (queue handler, record) item, applying the overflow policy.
+
+        Args:
+            item (tuple): The queue handler and the record.
+
+        Returns:
+            bool: True if the record was queued, False if it was dropped.
+        """
+        if self._policy == OverflowPolicy.BLOCK:
+            self.queue.put(item)
+            self._stats["queued"] += 1
+            return True
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                self._stats["queued"] += 1
+                return True
+            except queue.Full:
+                self._stats["dropped"] += 1
+                if self._policy != OverflowPolicy.DROP_OLDEST:
+                    return False
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def handle(self, record) -> None:
+        """Hands a queued record to the handlers of its queue handler, by their level."""
+        queue_handler, record = record
+        queue_handler.handle_now(record)
+
+    def enqueue_sentinel(self) -> None:
+        """Queues the end of the records, after the ones waiting in a full queue."""
+        self.queue.put(self._sentinel)
+
+    def start(self) -> None:
+        """Starts the listener thread, unless it is already running."""
+        with self._lock:
+            if not self.running:
+                super().start()
+
+    def stop(self) -> None:
+        """Handles the queued records and stops the listener thread."""
+        with self._lock:
+            if self.running:
+                self._stopping = True
+                try:
+                    super().stop()
+                finally:
+                    self._stopping = False
+
+    def reset(self) -> None:
+        """Forgets the thread and the queued records, used by a forked process."""
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of queued and dropped records and of records waiting."""
+        stats = dict(self._stats)
+        stats["size"] = self.queue.qsize()
+        return stats
+
+
+_listener: Optional[LogQueueListener] = None
+
+
+def get_queue_listener() -> LogQueueListener:
+    """Returns the listener of the process, started on the first call
+    and stopped at exit once the queued records are handled."""
+    global _listener  # pylint: disable=global-statement
+    if _listener is None:
+        _listener = LogQueueListener(MOVAI_LOGS_QUEUE_SIZE, MOVAI_LOGS_QUEUE_POLICY)
+        atexit.register(_listener.stop)
+    _listener.start()
+    return _listener
+
+
+def _reset_after_fork() -> None:
+    """Restarts the listener in a forked process, the thread of the parent does not exist
+    in the child and the records queued by the parent are handled by the parent."""
+    if _listener is not None:
+        _listener.reset()
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class LogQueueHandler(QueueHandler):
+    """Queues the records for the listener thread, which hands them to the real handlers.
+    Once the listener is stopped at exit, the records are handled by the calling thread."""
+
+    def __init__(self, handlers: List[logging.Handler]) -> None:
+        """Constructor
+
+        Args:
+            handlers (List[logging.Handler]): The handlers of the queued records.
+        """
+        super().__init__(None)
+        self.handlers = handlers
+        get_queue_listener()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Queues the record as is, the handlers format it in the same process."""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queues a record, or handles it right away if the listener is stopped."""
+        listener = get_queue_listener() if _listener is None else _listener
+        if listener.running:
+            listener.put((self, record))
+        else:
+            self.handle_now(record)
+
+    def handle_now(self, record: logging.LogRecord) -> None:
+        """Hands a record to the handlers whose level it reaches."""
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
@@ -0,0 +1,113 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Limits the log records a call site sends to the message server.
+"""
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+# the call sites named in a summary, the most suppressed first
+SUMMARY_CALL_SITES = 10
+
+CallSite = Tuple[str, int, int]
+
+
+class LogRateLimiter:
+    """A token bucket for every (module, lineno, level) call site, refilled at rate tokens
+    per second up to burst, and a random sample of the DEBUG and INFO records.
+    The suppressed records are counted and summarized every interval seconds."""
+
+    def __init__(self, rate: float, burst: int, sample_rate: float, interval: float) -> None:
+        """Constructor
+
+        Args:
+            rate (float): The records per second a call site can send, 0 means no limit.
+            burst (int): The records a call site can send at once.
+            sample_rate (float): The fraction of the DEBUG and INFO records sent.
+            interval (float): The seconds between the summaries.
+        """
+        self._rate = rate
+        self._burst = burst
+        self._sample_rate = sample_rate
+        self._interval = interval
+        # call site: [tokens, last refill time]
+        self._buckets: Dict[CallSite, List[float]] = {}
+        self._suppressed: Dict[CallSite, int] = {}
+        self._next_summary = time.monotonic() + interval
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any record can be suppressed."""
+        return self._rate > 0 or self._sample_rate < 1
+
+    def allow(self, record: logging.LogRecord) -> bool:
+        """Takes a token from the bucket of the call site of the record.
+
+        Args:
+            record (logging.LogRecord): The record to send.
+
+        Returns:
+            bool: Whether the record is sent, otherwise it is counted as suppressed.
+        """
+        if (
+            self._sample_rate < 1
+            and record.levelno <= logging.INFO
+            and random.random() >= self._sample_rate
+        ):
+            self._suppress(record)
+            return False
+        if self._rate <= 0:
+            return True
+        now = time.monotonic()
+        call_site = (record.module, record.lineno, record.levelno)
+        bucket = self._buckets.get(call_site)
+        if bucket is None:
+            self._buckets[call_site] = [self._burst - 1, now]
+            return True
+        tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True
+        bucket[0] = tokens
+        self._suppress(record)
+        return False
+
+    def _suppress(self, record: logging.LogRecord) -> None:
+        """Counts a suppressed record."""
+        call_site = (record.module, record.lineno, record.levelno)
+        self._suppressed[call_site] = self._suppressed.get(call_site, 0) + 1
+
+    def take_summary(self) -> Optional[logging.LogRecord]:
+        """Returns a WARNING record summarizing the records suppressed since the last one,
+        once every interval seconds. Checked on every record, so a summary is sent with
+        the first record after the interval.
+
+        Returns:
+            Optional[logging.LogRecord]: The summary, None if it is not due or nothing
+                was suppressed.
+        """
+        if not self._suppressed or time.monotonic() < self._next_summary:
+            return None
+        self._next_summary = time.monotonic() + self._interval
+        suppressed, self._suppressed = self._suppressed, {}
+        call_sites = sorted(suppressed.items(), key=lambda item: -item[1])
+        details = ", ".join(
+            f"{module}:{lineno} {logging.getLevelName(level)} x{count}"
+            for (module, lineno, level), count in call_sites[:SUMMARY_CALL_SITES]
+        )
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": logging.getLevelName(logging.WARNING),
+                "module": "rate_limit",
+                "funcName": "take_summary",
+                "msg": f"Suppressed {sum(suppressed.values())} log records: {details}",
+            }
+        )
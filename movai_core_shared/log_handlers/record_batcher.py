@@ -0,0 +1,129 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Buffers log records and sends them to the message server in batches.
+"""
+import atexit
+from collections import deque
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from movai_core_shared.core.message_client import MessageClient
+
+# seconds stop() waits for the flusher thread before sending the remaining records itself
+STOP_TIMEOUT = 2
+
+
+# pylint: disable=too-many-instance-attributes
+class RecordBatcher:
+    """Appending a record only puts it in a bounded buffer, a background thread turns the
+    records into requests and sends them with MessageClient.send_batch() once batch_size
+    records are waiting or every period seconds. The remaining records are sent at exit.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        build_entries: Callable[[logging.LogRecord], Iterable[Tuple]],
+        server_addr: str,
+        batch_size: int,
+        period: float,
+        max_records: int,
+    ) -> None:
+        """Constructor
+
+        Args:
+            build_entries (Callable): Returns the (msg_type, data, created_ns) requests of a
+                record, called from the flusher thread.
+            server_addr (str): The address of the message server.
+            batch_size (int): The number of records sent in a single request.
+            period (float): The seconds between the flushes of a partial batch.
+            max_records (int): The number of records waiting to be sent, the oldest ones
+                are dropped when the buffer is full.
+        """
+        self._build_entries = build_entries
+        self._server_addr = server_addr
+        self._batch_size = batch_size
+        self._period = period
+        self._records: deque = deque(maxlen=max_records)
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._message_client: Optional[MessageClient] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stopped = False
+        self._stats = {"sent": 0, "dropped": 0, "errors": 0}
+        atexit.register(self.stop)
+
+    def append(self, record: logging.LogRecord) -> None:
+        """Buffers a record, never blocks on the message server.
+
+        Args:
+            record (logging.LogRecord): The record to send.
+        """
+        if self._pid != os.getpid():
+            self._start()
+        if len(self._records) == self._records.maxlen:
+            self._stats["dropped"] += 1
+        self._records.append(record)
+        if len(self._records) >= self._batch_size and not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        """Starts the flusher thread, again in a forked process which has no thread."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # the records of the parent process are sent by the parent
+                self._records.clear()
+            self._pid = os.getpid()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="RecordBatcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Flushes the buffer when a batch is ready or every period seconds."""
+        while not self._stopped:
+            self._wakeup.wait(self._period)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Sends the buffered records in batches of batch_size."""
+        with self._flush_lock:
+            if self._message_client is None:
+                self._message_client = MessageClient(self._server_addr)
+            while self._records:
+                records = []
+                while self._records and len(records) < self._batch_size:
+                    records.append(self._records.popleft())
+                try:
+                    entries = [entry for record in records for entry in self._build_entries(record)]
+                    self._message_client.send_batch(entries)
+                    self._stats["sent"] += len(records)
+                except Exception:
+                    # the records are lost, logging the failure could loop back here
+                    self._stats["errors"] += len(records)
+
+    def stop(self) -> None:
+        """Stops the flusher thread and sends the remaining records."""
+        if self._pid != os.getpid():
+            return
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(STOP_TIMEOUT)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of records buffered, sent, dropped and which failed to send."""
+        stats = dict(self._stats)
+        stats["buffered"] = len(self._records)
+        return stats
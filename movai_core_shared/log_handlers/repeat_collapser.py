@@ -0,0 +1,104 @@
+"""
+   Copyright (C) Mov.ai  - All Rights Reserved
+   Unauthorized copying of this file, via any medium is strictly prohibited
+   Proprietary and confidential
+
+   Usage:
+        Collapses the repeats of a log record into a single record with a repeat count.
+"""
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from movai_core_shared.consts import LOG_DATE_FORMAT
+
+# the records followed at once, the records of other messages are not collapsed
+MAX_TRACKED_RECORDS = 1000
+
+RecordKey = Tuple[str, int, str, int, str]
+
+
+class RepeatCollapser:
+    """Lets the first record of a (logger, level, module, lineno, message) through and counts
+    the identical records which follow it for window seconds. Once the window ends, the
+    repeats become a single record carrying repeat_count, first_seen and last_seen."""
+
+    def __init__(self, window: float) -> None:
+        """Constructor
+
+        Args:
+            window (float): The seconds the repeats of a record are collapsed.
+        """
+        self._window = window
+        # key: [window end, repeats, first repeat time, last repeat], in the order of the windows
+        self._tracked: Dict[RecordKey, list] = {}
+
+    def add(self, record: logging.LogRecord) -> bool:
+        """Counts a record if it repeats one whose window is open, take_expired() should be
+        called first so the records of an ended window start a new one.
+
+        Args:
+            record (logging.LogRecord): The record to handle.
+
+        Returns:
+            bool: Whether the record is handled now, otherwise it is collapsed.
+        """
+        key = (record.name, record.levelno, record.module, record.lineno, record.getMessage())
+        repeats = self._tracked.get(key)
+        if repeats is None:
+            if len(self._tracked) < MAX_TRACKED_RECORDS:
+                self._tracked[key] = [time.monotonic() + self._window, 0, None, None]
+            return True
+        if repeats[1] == 0:
+            repeats[2] = record.created
+        repeats[1] += 1
+        repeats[3] = record
+        return False
+
+    def take_expired(self, everything: bool = False) -> List[logging.LogRecord]:
+        """Ends the windows which are over.
+
+        Args:
+            everything (bool): Whether all the windows are ended, when the handler is closed.
+
+        Returns:
+            List[logging.LogRecord]: A record for every ended window which had repeats.
+        """
+        now = time.monotonic()
+        collapsed = []
+        while self._tracked:
+            key = next(iter(self._tracked))
+            window_end, count, first_seen, last = self._tracked[key]
+            if window_end > now and not everything:
+                break
+            del self._tracked[key]
+            if count:
+                collapsed.append(self._collapse(count, first_seen, last))
+        return collapsed
+
+    @staticmethod
+    def _collapse(count: int, first_seen: float, last: logging.LogRecord) -> logging.LogRecord:
+        """Returns a copy of the last repeat with the repeat count and timestamps."""
+        record = logging.makeLogRecord(last.__dict__)
+        record.msg = last.getMessage()
+        record.args = None
+        record.repeat_count = count
+        record.first_seen = first_seen
+        record.last_seen = last.created
+        return record
+
+
+def describe_repeats(record: logging.LogRecord) -> str:
+    """Returns the repeat count and timestamps of a collapsed record, for the text logs.
+
+    Args:
+        record (logging.LogRecord): A record returned by RepeatCollapser.take_expired().
+
+    Returns:
+        str: The description, empty if the record is not a collapsed one.
+    """
+    if not hasattr(record, "repeat_count"):
+        return ""
+    first_seen = time.strftime(LOG_DATE_FORMAT, time.localtime(record.first_seen))
+    last_seen = time.strftime(LOG_DATE_FORMAT, time.localtime(record.last_seen))
+    return f" [repeated {record.repeat_count} times from {first_seen} to {last_seen}]"
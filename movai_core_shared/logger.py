@@ -12,8 +12,7 @@ import logging
 from logging.handlers import TimedRotatingFileHandler
 import syslog
 import json
-
-from movai_core_shared.common.time import current_timestamp_int
+from typing import List, Optional, Tuple
 
 from movai_core_shared.consts import (
     DEFAULT_LOG_LIMIT,
@@ -37,9 +36,20 @@ from movai_core_shared.envvars import (
     MOVAI_LOGFILE_VERBOSITY_LEVEL,
     MOVAI_LOG_FILE,
     MOVAI_FLEET_LOGS_VERBOSITY_LEVEL,
+    MOVAI_FLEET_LOGS_RATE_LIMIT,
+    MOVAI_FLEET_LOGS_BURST,
+    MOVAI_FLEET_LOGS_SAMPLE_RATE,
+    MOVAI_FLEET_LOGS_SUPPRESSION_INTERVAL,
     MOVAI_STDOUT_VERBOSITY_LEVEL,
+    MOVAI_STDOUT_BUFFERED,
     MOVAI_GENERAL_VERBOSITY_LEVEL,
     MOVAI_CALLBACK_VERBOSITY_LEVEL,
+    MOVAI_LOGS_ASYNC,
+    MOVAI_LOGS_BATCHING,
+    MOVAI_LOGS_BATCH_SIZE,
+    MOVAI_LOGS_BUFFER_SIZE,
+    MOVAI_LOGS_DEDUP_WINDOW,
+    MESSAGE_SERVER_PERIODIC_WRITE,
     LOCAL_MESSAGE_SERVER,
     MASTER_MESSAGE_SERVER,
     SERVICE_NAME,
@@ -54,7 +64,12 @@ from movai_core_shared.log_handlers.callback_handler import (
     CallbackStdOutHandler,
     CallbackLogAdapter,
 )
+from movai_core_shared.log_handlers.buffered_stream import BufferedStreamHandler, register_flush
 from movai_core_shared.log_handlers.generic_handler import LogAdapter
+from movai_core_shared.log_handlers.queue_handler import LogQueueHandler
+from movai_core_shared.log_handlers.rate_limit import LogRateLimiter
+from movai_core_shared.log_handlers.record_batcher import RecordBatcher
+from movai_core_shared.log_handlers.repeat_collapser import RepeatCollapser, describe_repeats
 from .base_query import BaseQuery
 
 
@@ -75,12 +90,17 @@ SEVERETY_CODES_MAPPING = {
 logging.getLogger("rosout").setLevel(MOVAI_CALLBACK_VERBOSITY_LEVEL)
 
 
-class StdOutHandler(logging.StreamHandler):
+class StdOutHandler(BufferedStreamHandler):
     _COLORS = SPAWNER_STDOUT_COLORS
     _COLOR_RESET = "\u001b[0m"
-
-    def __init__(self, color=SPAWNER_STDOUT_COLORS, stream=None):
-        super().__init__(stream)
+    # built once, the tags are only shown by the records which have some
+    _TAGS_FORMATTER = logging.Formatter(fmt=S_FORMATTER, datefmt=LOG_DATE_FORMAT)
+    _NO_TAGS_FORMATTER = logging.Formatter(
+        fmt=S_FORMATTER.replace("[%(tags)s]", ""), datefmt=LOG_DATE_FORMAT
+    )
+
+    def __init__(self, color=SPAWNER_STDOUT_COLORS, stream=None, buffered=MOVAI_STDOUT_BUFFERED):
+        super().__init__(stream, buffered)
         self._COLORS = color
 
     def emit(self, record):
@@ -96,33 +116,83 @@ class StdOutHandler(logging.StreamHandler):
                 record.lineno = record.args.get("lineno")
 
             # Add/Remove Tags from log formatter
-            _formatter = S_FORMATTER
+            formatter = self._NO_TAGS_FORMATTER
 
             if isinstance(record.args, dict) and record.args.get("tags"):
                 tags = record.args.get("tags")
                 record.tags = "|".join([f"{k}:{v}" for k, v in tags.items()])
-            else:
-                _formatter = _formatter.replace("[%(tags)s]", "")
-            log_format = logging.Formatter(fmt=_formatter, datefmt=LOG_DATE_FORMAT)
-            self.setFormatter(fmt=log_format)
-
-            msg = self.format(record)
-            stream = self.stream
-            if stream.closed:
-                if stream == sys.stderr:
-                    stream = open("/dev/stderr", "w")
-                else:
-                    stream = open("/dev/stdout", "w")
-            stream.write(
-                self._COLORS.get(record.levelno, "") + msg + self._COLOR_RESET + self.terminator
+                formatter = self._TAGS_FORMATTER
+
+            msg = formatter.format(record)
+            self.write_record(
+                self._COLORS.get(record.levelno, "") + msg + self._COLOR_RESET + self.terminator,
+                record.levelno,
             )
-            # stream.write()
-            self.flush()
         except Exception:
             logger = logging.getLogger(__name__)
             logger.exception("An error occurred while emitting a log record.")
 
 
+class LogFileHandler(TimedRotatingFileHandler):
+    """
+    A file handler rotated at midnight, which can collapse the repeats of a record.
+    """
+
+    def __init__(self, filename: str, dedup_window: float = MOVAI_LOGS_DEDUP_WINDOW):
+        """
+        Constructor
+
+        Args:
+            filename (str): The log file.
+            dedup_window (float): The seconds the repeats of a record are collapsed
+                into one record, 0 writes every record.
+        """
+        super().__init__(filename, when="midnight")
+        self._collapser = RepeatCollapser(dedup_window) if dedup_window > 0 else None
+        if self._collapser is not None:
+            register_flush(self)
+
+    def emit(self, record):
+        if self._collapser is not None:
+            self._write_collapsed()
+            if not self._collapser.add(record):
+                return
+        super().emit(record)
+
+    def format(self, record):
+        return super().format(record) + describe_repeats(record)
+
+    def _write_collapsed(self, everything: bool = False) -> None:
+        """Writes the collapsed records of the ended windows, called with the lock held.
+        The errors are reported by handleError(), flush() and close() never raise them."""
+        for collapsed in self._collapser.take_expired(everything):
+            try:
+                super().emit(collapsed)
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(collapsed)
+
+    def flush(self):
+        """Writes the collapsed records whose window ended and flushes the file."""
+        if self._collapser is not None:
+            self.acquire()
+            try:
+                # emit() flushes again, the windows taken here are already removed
+                self._write_collapsed()
+            finally:
+                self.release()
+        super().flush()
+
+    def close(self):
+        """Writes the collapsed records of the open windows and closes the file."""
+        if self._collapser is not None:
+            self.acquire()
+            try:
+                self._write_collapsed(everything=True)
+            finally:
+                self.release()
+        super().close()
+
+
 logging.getLogger("rosout").addHandler(
     StdOutHandler(color=CALLBACK_STDOUT_COLORS, stream=sys.stdout)
 )
@@ -135,28 +205,76 @@ class RemoteHandler(logging.StreamHandler):
     sends the data to message server for logging in influxdb.
     """
 
-    def __init__(self):
+    def __init__(
+        self, batching: bool = MOVAI_LOGS_BATCHING, dedup_window: float = MOVAI_LOGS_DEDUP_WINDOW
+    ):
         """
         Constructor
+
+        Args:
+            batching (bool): Whether the records are buffered and sent in batches
+                by a background thread instead of being sent by emit().
+            dedup_window (float): The seconds the repeats of a record are collapsed
+                into one record, 0 sends every record.
         """
         logging.StreamHandler.__init__(self, None)
         self._message_client = MessageClient(LOCAL_MESSAGE_SERVER)
         self._async_message_client = AsyncMessageClient(LOCAL_MESSAGE_SERVER)
+        self._batcher = _get_record_batcher() if batching else None
+        rate_limiter = LogRateLimiter(
+            MOVAI_FLEET_LOGS_RATE_LIMIT,
+            MOVAI_FLEET_LOGS_BURST,
+            MOVAI_FLEET_LOGS_SAMPLE_RATE,
+            MOVAI_FLEET_LOGS_SUPPRESSION_INTERVAL,
+        )
+        self._rate_limiter = rate_limiter if rate_limiter.enabled else None
+        self._collapser = RepeatCollapser(dedup_window) if dedup_window > 0 else None
+        if self._collapser is not None:
+            register_flush(self)
 
-    def emit(self, record):
+    @staticmethod
+    def build_requests(record: logging.LogRecord) -> List[Tuple[str, dict]]:
         """
-        Builds a valid log message request from the python log record
-        and send it to the local message server
+        Builds the log message requests of a python log record
 
         Args:
             record: The Python log message data record
 
+        Returns:
+            List[Tuple[str, dict]]: The (msg_type, data) requests, the syslog one
+                only if SYSLOG_ENABLED.
         """
         if isinstance(record.msg, Exception):
             record.msg = str(record.msg)
 
         log_tags = {"robot": DEVICE_NAME, "level": record.levelname, "service": SERVICE_NAME}
 
+        log_fields = {
+            "module": record.module,
+            "funcName": record.funcName,
+            "lineno": record.lineno,
+            "message": record.msg,
+        }
+        if record.args:
+            # if not serializable, convert to string
+            log_fields["args"] = json.dumps(record.args, default=str)
+
+        if hasattr(record, "repeat_count"):
+            log_fields["repeat_count"] = record.repeat_count
+            log_fields["first_seen"] = record.first_seen
+            log_fields["last_seen"] = record.last_seen
+
+        if hasattr(record, "tags"):
+            log_tags.update(record.tags)
+
+        log_data = {
+            "measurement": LOGS_MEASUREMENT,
+            "log_tags": log_tags,
+            "log_fields": log_fields,
+        }
+        if not SYSLOG_ENABLED:
+            return [(LOGS_HANDLER_MSG_TYPE, log_data)]
+
         syslog_tags = {
             "appname": SERVICE_NAME,
             "facility": "console",
@@ -166,19 +284,8 @@ class RemoteHandler(logging.StreamHandler):
         }
 
         if hasattr(record, "tags"):
-            log_tags.update(record.tags)
             syslog_tags.update(record.tags)
 
-        log_fields = {
-            "module": record.module,
-            "funcName": record.funcName,
-            "lineno": record.lineno,
-            "message": record.msg,
-        }
-        if record.args:
-            # if not serializable, convert to string
-            log_fields["args"] = json.dumps(record.args, default=str)
-
         syslog_fields = {
             "module": record.module,
             "funcName": record.funcName,
@@ -187,35 +294,111 @@ class RemoteHandler(logging.StreamHandler):
             "message": record.msg,
             "procid": PID,
             "severity_code": SEVERETY_CODES_MAPPING[record.levelname],
-            "timestamp": current_timestamp_int(),
+            "timestamp": int(record.created),
             "version": "",
         }
 
-        log_data = {
-            "measurement": LOGS_MEASUREMENT,
-            "log_tags": log_tags,
-            "log_fields": log_fields,
-        }
-
         syslog_data = {
             "measurement": SYSLOG_MEASUREMENT,
             "log_tags": syslog_tags,
             "log_fields": syslog_fields,
         }
+        return [(LOGS_HANDLER_MSG_TYPE, log_data), (SYSLOGS_HANDLER_MSG_TYPE, syslog_data)]
+
+    @classmethod
+    def build_batch_entries(cls, record: logging.LogRecord) -> List[Tuple[str, dict, int]]:
+        """Builds the requests of a record for MessageClient.send_batch(),
+        they keep the time the record was created at."""
+        created_ns = int(record.created * 1000000000)
+        return [(msg_type, data, created_ns) for msg_type, data in cls.build_requests(record)]
 
+    def emit(self, record):
+        """
+        Builds a valid log message request from the python log record
+        and send it to the local message server
+
+        Args:
+            record: The Python log message data record
+
+        """
+        if self._collapser is not None:
+            self._send_collapsed()
+            if not self._collapser.add(record):
+                return
+        if self._rate_limiter is not None:
+            summary = self._rate_limiter.take_summary()
+            if summary is not None:
+                self._send(summary)
+            if not self._rate_limiter.allow(record):
+                return
+        self._send(record)
+
+    def _send(self, record: logging.LogRecord) -> None:
+        """Sends the requests of a record, or buffers the record when batching."""
+        if self._batcher is not None:
+            # the requests are built and sent by the flusher thread
+            self._batcher.append(record)
+            return
+
+        requests = self.build_requests(record)
         if asyncio._get_running_loop() is not None:
-            asyncio.create_task(
-                self._async_message_client.send_request(LOGS_HANDLER_MSG_TYPE, log_data)
-            )
-            if SYSLOG_ENABLED:
-                asyncio.create_task(
-                    self._async_message_client.send_request(SYSLOGS_HANDLER_MSG_TYPE, syslog_data)
-                )
+            # a bounded queue drained by one sender task, keeps memory flat under log storms
+            for msg_type, data in requests:
+                self._async_message_client.enqueue_request(msg_type, data)
             return
 
-        self._message_client.send_request(LOGS_HANDLER_MSG_TYPE, log_data)
-        if SYSLOG_ENABLED:
-            self._message_client.send_request(SYSLOGS_HANDLER_MSG_TYPE, syslog_data)
+        for msg_type, data in requests:
+            self._message_client.send_request(msg_type, data)
+
+    def _send_collapsed(self, everything: bool = False) -> None:
+        """Sends the collapsed records of the ended windows, called with the lock held.
+        The errors are reported by handleError(), flush() runs on the shared flusher
+        thread and close() at shutdown, neither may raise them."""
+        for collapsed in self._collapser.take_expired(everything):
+            try:
+                self._send(collapsed)
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(collapsed)
+
+    def flush(self):
+        """Sends the collapsed records whose window ended."""
+        if self._collapser is not None:
+            self.acquire()
+            try:
+                self._send_collapsed()
+            finally:
+                self.release()
+        super().flush()
+
+    def close(self):
+        """Sends the collapsed records of the open windows."""
+        if self._collapser is not None:
+            self.acquire()
+            try:
+                self._send_collapsed(everything=True)
+                if self._batcher is not None:
+                    # the batcher may already be stopped at exit
+                    self._batcher.flush()
+            finally:
+                self.release()
+        super().close()
+
+
+_record_batcher: Optional[RecordBatcher] = None
+
+
+def _get_record_batcher() -> RecordBatcher:
+    """Returns the batcher shared by the remote handlers of the process."""
+    global _record_batcher  # pylint: disable=global-statement
+    if _record_batcher is None:
+        _record_batcher = RecordBatcher(
+            RemoteHandler.build_batch_entries,
+            LOCAL_MESSAGE_SERVER,
+            MOVAI_LOGS_BATCH_SIZE,
+            MESSAGE_SERVER_PERIODIC_WRITE,
+            MOVAI_LOGS_BUFFER_SIZE,
+        )
+    return _record_batcher
 
 
 def _get_console_handler(stream_config=None):
@@ -237,7 +420,7 @@ def _get_file_handler():
     """
     Set up the file handler
     """
-    file_handler = TimedRotatingFileHandler(Log.LOG_FILE, when="midnight")
+    file_handler = LogFileHandler(Log.LOG_FILE)
     file_handler.setFormatter(LOG_FORMATTER)
     file_handler.setLevel(MOVAI_LOGFILE_VERBOSITY_LEVEL)
     return file_handler
@@ -300,12 +483,18 @@ class Log:
         logger = logging.getLogger(logger_name)
         if logger.hasHandlers():
             logger.handlers = []
+        handlers = []
         if MOVAI_STDOUT_VERBOSITY_LEVEL != logging.NOTSET:
-            logger.addHandler(_get_console_handler(stream_config))
+            handlers.append(_get_console_handler(stream_config))
         if MOVAI_LOGFILE_VERBOSITY_LEVEL != logging.NOTSET:
-            logger.addHandler(_get_file_handler())
+            handlers.append(_get_file_handler())
         if is_enterprise() and MOVAI_FLEET_LOGS_VERBOSITY_LEVEL != logging.NOTSET:
-            logger.addHandler(get_remote_handler())
+            handlers.append(get_remote_handler())
+        if MOVAI_LOGS_ASYNC and handlers:
+            # the handlers run in the listener thread, the log calls only queue the records
+            handlers = [LogQueueHandler(handlers)]
+        for handler in handlers:
+            logger.addHandler(handler)
         logger.setLevel(MOVAI_GENERAL_VERBOSITY_LEVEL)
         return logger
 
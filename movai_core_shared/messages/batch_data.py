@@ -0,0 +1,19 @@
+"""Batch data message definition."""
+
+from typing import List
+from pydantic import BaseModel
+from movai_core_shared.messages.general_data import Request
+
+
+class BatchEntry(BaseModel):
+    req_type: str
+    created: int
+    req_data: dict
+
+
+class BatchData(BaseModel):
+    requests: List[BatchEntry]
+
+
+class BatchRequest(Request):
+    req_data: BatchData
@@ -28,6 +28,10 @@ class LogFields(BaseModel):
     lineno: int
     message: str
     args: Optional[str] = None  # json string
+    # set when the record stands for repeats of the same message, collapsed by the handler
+    repeat_count: Optional[int] = None
+    first_seen: Optional[float] = None
+    last_seen: Optional[float] = None
 
     def format(self) -> str:
         """Format log message.
@@ -98,6 +102,10 @@ class LogRequest(Request):
             "level": self.req_data.log_tags.level,
             "message": self.req_data.log_fields.message,
         }
+        if self.req_data.log_fields.repeat_count is not None:
+            log_msg["repeat_count"] = self.req_data.log_fields.repeat_count
+            log_msg["first_seen"] = self.req_data.log_fields.first_seen
+            log_msg["last_seen"] = self.req_data.log_fields.last_seen
         return log_msg
 
 
@@ -9,6 +9,8 @@ from movai_core_shared.messages.general_data import Request
 
 TEST_SERVER_ADDR = "ipc:///tmp/test_zmq_server"
 # TEST_SERVER_ADDR = "tcp://localhost:5555"
+ECHO_SERVER_ADDR = "ipc:///tmp/test_zmq_echo_server"
+LEGACY_ECHO_SERVER_ADDR = "ipc:///tmp/test_zmq_legacy_echo_server"
 
 
 class SimpleData(BaseModel):
@@ -86,6 +88,29 @@ class TestServer(ZMQServer):
         self._socket.close()
 
 
+class EchoServer(ZMQServer):
+    """Replies with the request data, echoing the request id.
+    A "delay" key in the request data postpones the reply, so replies
+    can be sent in a different order than the requests arrived.
+    Without echo_req_id it replies like the message servers which predate request ids.
+    """
+
+    def __init__(self, addr=ECHO_SERVER_ADDR, echo_req_id=True, **kwargs) -> None:
+        super().__init__("ECHO_SERVER", addr, **kwargs)
+        self.echo_req_id = echo_req_id
+
+    async def handle(self, buffer: bytes) -> None:
+        request = json.loads(buffer[-1])["request"]
+        req_data = request.get("req_data", {})
+        await asyncio.sleep(req_data.get("delay", 0))
+        if not request.get("response_required"):
+            return
+        resp = {"response": req_data}
+        if self.echo_req_id:
+            resp["req_id"] = request.get("req_id")
+        await self._socket.send_multipart([buffer[0], json.dumps(resp).encode("utf8")])
+
+
 def create_test_server():
     server = TestServer()
     server.run()
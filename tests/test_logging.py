@@ -1,9 +1,29 @@
+import io
+import logging
+import os
+import tempfile
+import threading
 import unittest
 import mock
 import sys
 from pathlib import Path
+from time import perf_counter, sleep
 
-from movai_core_shared.logger import Log
+import pytest
+import zmq
+
+from movai_core_shared.consts import LOG_FORMATTER, LOGS_HANDLER_MSG_TYPE, OverflowPolicy
+from movai_core_shared.log_handlers import buffered_stream, queue_handler
+from movai_core_shared.log_handlers.callback_handler import CallbackStdOutHandler
+from movai_core_shared.log_handlers.queue_handler import LogQueueHandler, LogQueueListener
+from movai_core_shared.log_handlers.rate_limit import LogRateLimiter
+from movai_core_shared.log_handlers.record_batcher import RecordBatcher
+from movai_core_shared.log_handlers.repeat_collapser import RepeatCollapser
+from movai_core_shared.logger import Log, LogFileHandler, RemoteHandler, StdOutHandler
+from movai_core_shared.messages.log_data import LogData
+
+PERF_TEST_RESULTS_DIR = "perf_results"
+SINK_SERVER_ADDR = "ipc:///tmp/test_logging_sink"
 
 
 def validate_loglevel(log_level, mock_call):
@@ -126,3 +146,491 @@ class TestLogging(unittest.TestCase):
 
         call = stdout.mock_calls[0]
         self.assertIn("[ui:True] Log with non-serializable /place/holder", call[1][0])
+
+
+def make_record(msg: str, level: int = logging.INFO, args=None) -> logging.LogRecord:
+    record = logging.LogRecord("test_logger", level, __file__, 10, msg, args, None)
+    # set by CallbackLogAdapter
+    record.node = "test_node"
+    record.callback = "test_callback"
+    return record
+
+
+def wait_for(condition, timeout: float = 2) -> bool:
+    end_time = perf_counter() + timeout
+    while not condition():
+        if perf_counter() > end_time:
+            return False
+        sleep(0.01)
+    return True
+
+
+class TestBufferedStdOut(unittest.TestCase):
+    def make_handler(self, handler_type=StdOutHandler):
+        stream = io.StringIO()
+        handler = handler_type(stream=stream, buffered=True)
+        stream.write = mock.Mock(side_effect=stream.write)
+        return handler, stream
+
+    def test_records_are_written_together(self):
+        handler, stream = self.make_handler()
+        handler.handle(make_record("first"))
+        handler.handle(make_record("second"))
+        stream.write.assert_not_called()
+        handler.flush()
+        stream.write.assert_called_once()
+        self.assertIn("[INFO]", stream.getvalue())
+        self.assertLess(stream.getvalue().index("first"), stream.getvalue().index("second"))
+
+    def test_warnings_are_written_right_away(self):
+        handler, stream = self.make_handler(CallbackStdOutHandler)
+        handler.handle(make_record("info"))
+        handler.handle(make_record("warning", logging.WARNING))
+        stream.write.assert_called_once()
+        self.assertIn("info", stream.getvalue())
+        self.assertIn("warning", stream.getvalue())
+
+    def test_buffer_is_flushed_periodically(self):
+        with mock.patch.object(buffered_stream, "MOVAI_STDOUT_FLUSH_INTERVAL", 0.05):
+            with mock.patch.object(buffered_stream, "_flusher_pid", None):
+                handler, stream = self.make_handler()
+                handler.handle(make_record("info"))
+                self.assertTrue(wait_for(lambda: "info" in stream.getvalue()))
+
+    def test_flusher_survives_a_failing_handler(self):
+        failing = mock.Mock(spec=logging.Handler)
+        failing.flush.side_effect = RuntimeError("failed")
+        with mock.patch.object(buffered_stream, "MOVAI_STDOUT_FLUSH_INTERVAL", 0.05):
+            with mock.patch.object(buffered_stream, "_flusher_pid", None):
+                with mock.patch("traceback.print_exc"):
+                    buffered_stream.register_flush(failing)
+                    handler, stream = self.make_handler()
+                    self.assertTrue(wait_for(lambda: failing.flush.call_count >= 2))
+                    handler.handle(make_record("info"))
+                    self.assertTrue(wait_for(lambda: "info" in stream.getvalue()))
+                    buffered_stream._flushed_handlers.discard(failing)
+
+    def test_formatter_without_tags(self):
+        handler, stream = self.make_handler()
+        handler.handle(make_record("no tags"))
+        handler.handle(make_record("%s", args=({"tags": {"a": 1}},)))
+        handler.flush()
+        first, second = stream.getvalue().splitlines()
+        self.assertNotIn("[a:1]", first)
+        self.assertIn("[a:1]", second)
+
+
+class ListHandler(logging.Handler):
+    """Keeps the records it handled and the threads which handled them"""
+
+    def __init__(self, level=logging.NOTSET, delay=0):
+        super().__init__(level)
+        self.delay = delay
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        sleep(self.delay)
+        self.records.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+class TestQueueHandler(unittest.TestCase):
+    def make_listener(self, maxsize=100, policy=OverflowPolicy.DROP_OLDEST):
+        listener = LogQueueListener(maxsize, policy)
+        patcher = mock.patch.object(queue_handler, "_listener", listener)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(listener.stop)
+        return listener
+
+    def test_records_are_handled_by_the_listener(self):
+        listener = self.make_listener()
+        handlers = [ListHandler(), ListHandler(logging.WARNING)]
+        logger = logging.getLogger("test_records_are_handled_by_the_listener")
+        logger.addHandler(LogQueueHandler(handlers))
+        logger.warning("warning %s", 1)
+        logger.error("error")
+        logger.info("info")
+        listener.stop()
+        self.assertEqual(handlers[0].records, ["warning 1", "error"])
+        self.assertEqual(handlers[1].records, ["warning 1", "error"])
+        self.assertNotIn(threading.current_thread().name, handlers[0].threads)
+
+    def test_records_are_handled_in_place_once_stopped(self):
+        listener = self.make_listener()
+        handler = ListHandler()
+        queue_handler = LogQueueHandler([handler])
+        listener.stop()
+        queue_handler.handle(make_record("after stop", logging.WARNING))
+        self.assertEqual(handler.records, ["after stop"])
+        self.assertEqual(handler.threads, {threading.current_thread().name})
+
+    def test_overflow_policies(self):
+        for policy, expected, nb_queued in (
+            (OverflowPolicy.DROP_OLDEST, ["msg_3", "msg_4"], 5),
+            (OverflowPolicy.DROP_NEWEST, ["msg_0", "msg_1"], 2),
+        ):
+            listener = LogQueueListener(2, policy)
+            handler = ListHandler()
+            owner = mock.Mock(handle_now=handler.handle)
+            for i in range(5):
+                listener.put((owner, make_record(f"msg_{i}")))
+            stats = {"queued": nb_queued, "dropped": 3, "size": 2}
+            self.assertEqual(listener.get_stats(), stats)
+            listener.start()
+            listener.stop()
+            self.assertEqual(handler.records, expected)
+
+    def test_async_logger(self):
+        self.make_listener()
+        with mock.patch("movai_core_shared.logger.MOVAI_LOGS_ASYNC", True):
+            logger = Log.get_logger("test_async_logger")
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], LogQueueHandler)
+        self.assertIsInstance(logger.handlers[0].handlers[0], StdOutHandler)
+
+
+class TestRecordBatcher(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("movai_core_shared.log_handlers.record_batcher.MessageClient")
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def make_batcher(self, batch_size=3, period=10, max_records=100):
+        batcher = RecordBatcher(
+            RemoteHandler.build_batch_entries, SINK_SERVER_ADDR, batch_size, period, max_records
+        )
+        self.addCleanup(batcher.stop)
+        return batcher
+
+    def sent_messages(self):
+        return [
+            entry[1]["log_fields"]["message"]
+            for call in self.client.send_batch.call_args_list
+            for entry in call[0][0]
+        ]
+
+    def test_full_batch_is_sent(self):
+        batcher = self.make_batcher()
+        records = [make_record(f"msg_{i}") for i in range(3)]
+        for record in records:
+            batcher.append(record)
+        self.assertTrue(wait_for(lambda: self.client.send_batch.called))
+        self.assertEqual(self.sent_messages(), ["msg_0", "msg_1", "msg_2"])
+        entry = self.client.send_batch.call_args[0][0][0]
+        self.assertEqual(entry[0], LOGS_HANDLER_MSG_TYPE)
+        self.assertEqual(entry[2], int(records[0].created * 1000000000))
+        self.assertEqual(batcher.get_stats()["sent"], 3)
+
+    def test_partial_batch_is_sent_periodically(self):
+        batcher = self.make_batcher(period=0.05)
+        batcher.append(make_record("msg_0"))
+        self.assertTrue(wait_for(lambda: self.client.send_batch.called))
+        self.assertEqual(self.sent_messages(), ["msg_0"])
+
+    def test_stop_sends_the_remaining_records(self):
+        batcher = self.make_batcher()
+        batcher.append(make_record("msg_0"))
+        batcher.append(make_record("msg_1"))
+        batcher.stop()
+        self.assertEqual(self.sent_messages(), ["msg_0", "msg_1"])
+        self.assertEqual(batcher.get_stats()["buffered"], 0)
+
+    def test_oldest_records_are_dropped(self):
+        batcher = self.make_batcher(batch_size=100, max_records=2)
+        for i in range(5):
+            batcher.append(make_record(f"msg_{i}"))
+        batcher.stop()
+        self.assertEqual(self.sent_messages(), ["msg_3", "msg_4"])
+        self.assertEqual(batcher.get_stats()["dropped"], 3)
+
+    def test_batching_remote_handler(self):
+        batcher = self.make_batcher()
+        with mock.patch("movai_core_shared.logger._get_record_batcher", return_value=batcher):
+            handler = RemoteHandler(batching=True)
+        logger = logging.getLogger("test_batching_remote_handler")
+        logger.addHandler(handler)
+        with mock.patch.object(handler._message_client, "send_request") as send_request:
+            logger.warning("im logging warning")
+        logger.removeHandler(handler)
+        send_request.assert_not_called()
+        batcher.stop()
+        self.assertEqual(self.sent_messages(), ["im logging warning"])
+
+
+class TestLogRateLimiter(unittest.TestCase):
+    def test_burst_then_rate(self):
+        limiter = LogRateLimiter(rate=10, burst=3, sample_rate=1, interval=60)
+        record = make_record("hot loop")
+        self.assertEqual([limiter.allow(record) for _ in range(5)], [True] * 3 + [False] * 2)
+        sleep(0.15)
+        self.assertTrue(limiter.allow(record))
+
+    def test_call_sites_have_their_own_bucket(self):
+        limiter = LogRateLimiter(rate=1, burst=1, sample_rate=1, interval=60)
+        record = make_record("hot loop")
+        self.assertTrue(limiter.allow(record))
+        self.assertFalse(limiter.allow(record))
+        self.assertTrue(limiter.allow(make_record("hot loop", logging.ERROR)))
+        other = make_record("other line")
+        other.lineno = 20
+        self.assertTrue(limiter.allow(other))
+
+    def test_sampling_keeps_warnings(self):
+        limiter = LogRateLimiter(rate=0, burst=1, sample_rate=0, interval=60)
+        self.assertFalse(limiter.allow(make_record("debug", logging.DEBUG)))
+        self.assertFalse(limiter.allow(make_record("info", logging.INFO)))
+        self.assertTrue(limiter.allow(make_record("warning", logging.WARNING)))
+
+    def test_disabled(self):
+        self.assertFalse(LogRateLimiter(rate=0, burst=1, sample_rate=1, interval=60).enabled)
+
+    def test_summary(self):
+        limiter = LogRateLimiter(rate=0.001, burst=1, sample_rate=1, interval=0)
+        self.assertIsNone(limiter.take_summary())
+        for _ in range(4):
+            limiter.allow(make_record("hot loop"))
+        summary = limiter.take_summary()
+        self.assertEqual(summary.levelno, logging.WARNING)
+        self.assertEqual(summary.getMessage(), "Suppressed 3 log records: test_logging:10 INFO x3")
+        self.assertIsNone(limiter.take_summary())
+
+    def test_rate_limited_remote_handler(self):
+        handler = RemoteHandler()
+        handler._rate_limiter = LogRateLimiter(rate=0.001, burst=2, sample_rate=1, interval=60)
+        with mock.patch.object(handler._message_client, "send_request") as send_request:
+            for i in range(5):
+                handler.handle(make_record(f"msg_{i}", logging.WARNING))
+            # the interval elapsed
+            handler._rate_limiter._next_summary = 0
+            handler.handle(make_record("after the interval", logging.ERROR))
+        messages = [
+            call[0][1]["log_fields"]["message"]
+            for call in send_request.call_args_list
+            if call[0][0] == LOGS_HANDLER_MSG_TYPE
+        ]
+        self.assertEqual(
+            messages,
+            [
+                "msg_0",
+                "msg_1",
+                "Suppressed 3 log records: test_logging:10 WARNING x3",
+                "after the interval",
+            ],
+        )
+
+
+class TestRepeatCollapser(unittest.TestCase):
+    def test_repeats_are_collapsed(self):
+        collapser = RepeatCollapser(60)
+        records = [make_record("sensor %s timeout", logging.ERROR, ("lidar",)) for _ in range(5)]
+        self.assertEqual([collapser.add(record) for record in records], [True] + [False] * 4)
+        self.assertEqual(collapser.take_expired(), [])
+        [collapsed] = collapser.take_expired(everything=True)
+        self.assertEqual(collapsed.getMessage(), "sensor lidar timeout")
+        self.assertEqual(collapsed.levelno, logging.ERROR)
+        self.assertEqual(collapsed.repeat_count, 4)
+        self.assertEqual(collapsed.first_seen, records[1].created)
+        self.assertEqual(collapsed.last_seen, records[4].created)
+
+    def test_different_records_are_not_collapsed(self):
+        collapser = RepeatCollapser(60)
+        other_line = make_record("sensor timeout")
+        other_line.lineno = 20
+        for record in (
+            make_record("sensor timeout"),
+            make_record("sensor timeout", logging.ERROR),
+            make_record("sensor %s timeout", args=("lidar",)),
+            other_line,
+        ):
+            self.assertTrue(collapser.add(record))
+        self.assertEqual(collapser.take_expired(everything=True), [])
+
+    def test_window_ends(self):
+        collapser = RepeatCollapser(0.05)
+        self.assertTrue(collapser.add(make_record("sensor timeout")))
+        self.assertFalse(collapser.add(make_record("sensor timeout")))
+        sleep(0.1)
+        [collapsed] = collapser.take_expired()
+        self.assertEqual(collapsed.repeat_count, 1)
+        self.assertTrue(collapser.add(make_record("sensor timeout")))
+
+    def test_file_handler(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            handler = LogFileHandler(os.path.join(log_dir, "movai.log"), dedup_window=60)
+            handler.setFormatter(LOG_FORMATTER)
+            for _ in range(4):
+                handler.handle(make_record("sensor timeout", logging.ERROR))
+            handler.close()
+            with open(os.path.join(log_dir, "movai.log")) as log_file:
+                lines = log_file.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("sensor timeout"))
+        self.assertRegex(lines[1], r"sensor timeout \[repeated 3 times from .+ to .+\]$")
+
+    def test_remote_handler(self):
+        handler = RemoteHandler(dedup_window=60)
+        with mock.patch.object(handler._message_client, "send_request") as send_request:
+            for _ in range(3):
+                record = make_record("sensor timeout", logging.ERROR)
+                record.funcName = "read_sensor"
+                handler.handle(record)
+            handler.close()
+        requests = [call[0] for call in send_request.call_args_list]
+        log_data = [
+            LogData(**data) for msg_type, data in requests if msg_type == LOGS_HANDLER_MSG_TYPE
+        ]
+        self.assertEqual([data.log_fields.message for data in log_data], ["sensor timeout"] * 2)
+        self.assertIsNone(log_data[0].log_fields.repeat_count)
+        self.assertEqual(log_data[1].log_fields.repeat_count, 2)
+        self.assertLessEqual(log_data[1].log_fields.first_seen, log_data[1].log_fields.last_seen)
+
+    def test_remote_handler_send_errors_are_handled(self):
+        handler = RemoteHandler(dedup_window=60)
+        with mock.patch.object(handler._message_client, "send_request") as send_request:
+            for _ in range(2):
+                handler.handle(make_record("sensor timeout", logging.ERROR))
+            send_request.side_effect = zmq.Again
+            with mock.patch.object(handler, "handleError") as handle_error:
+                handler.close()
+        handle_error.assert_called_once()
+        self.assertEqual(handle_error.call_args[0][0].repeat_count, 1)
+
+
+def run_sink_server(addr: str, stop: threading.Event) -> None:
+    """Receives and discards the messages sent to addr"""
+    socket = zmq.Context.instance().socket(zmq.ROUTER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.bind(addr)
+    while not stop.is_set():
+        if socket.poll(100):
+            socket.recv_multipart()
+    socket.close()
+
+
+@pytest.mark.test_zmq_perf
+def test_perf_remote_handler_latency(nb_records=5000):
+    """Compares the time a log call spends in RemoteHandler with and without batching"""
+    stop = threading.Event()
+    sink = threading.Thread(target=run_sink_server, args=(SINK_SERVER_ADDR, stop), daemon=True)
+    sink.start()
+    if not os.path.exists(PERF_TEST_RESULTS_DIR):
+        os.makedirs(PERF_TEST_RESULTS_DIR)
+
+    with open(os.path.join(PERF_TEST_RESULTS_DIR, "remote_handler_perf.txt"), "a") as f:
+        f.write("batching,records,emit_us\n")
+        for batching in (False, True):
+            batcher = RecordBatcher(
+                RemoteHandler.build_batch_entries, SINK_SERVER_ADDR, 200, 1, 10000
+            )
+            with mock.patch("movai_core_shared.logger.LOCAL_MESSAGE_SERVER", SINK_SERVER_ADDR):
+                with mock.patch(
+                    "movai_core_shared.logger._get_record_batcher", return_value=batcher
+                ):
+                    handler = RemoteHandler(batching=batching)
+            record = make_record("perf message")
+            start_time = perf_counter()
+            for _ in range(nb_records):
+                handler.emit(record)
+            duration = perf_counter() - start_time
+            batcher.stop()
+            f.write(f"{batching},{nb_records},{duration * 1000000 / nb_records:.1f}\n")
+    stop.set()
+    sink.join()
+
+
+@pytest.mark.test_logging_perf
+def test_perf_console_handlers(nb_records=50000):
+    """Compares the records per second of the console handlers with and without buffering"""
+    record = make_record("[tag:value] perf message %s", args=(1,))
+    if not os.path.exists(PERF_TEST_RESULTS_DIR):
+        os.makedirs(PERF_TEST_RESULTS_DIR)
+
+    with open(os.path.join(PERF_TEST_RESULTS_DIR, "console_handler_perf.txt"), "a") as f:
+        f.write("handler,buffered,records_per_sec\n")
+        for handler_type in (StdOutHandler, CallbackStdOutHandler):
+            for buffered in (False, True):
+                with open(os.devnull, "w") as stream:
+                    handler = handler_type(stream=stream, buffered=buffered)
+                    start_time = perf_counter()
+                    for _ in range(nb_records):
+                        handler.handle(record)
+                    handler.flush()
+                    duration = perf_counter() - start_time
+                f.write(f"{handler_type.__name__},{buffered},{nb_records / duration:.0f}\n")
+
+
+@pytest.mark.test_logging_perf
+def test_perf_async_logging(nb_records=2000):
+    """Compares the time a log call takes with a slow handler, in place and queued"""
+    if not os.path.exists(PERF_TEST_RESULTS_DIR):
+        os.makedirs(PERF_TEST_RESULTS_DIR)
+
+    with open(os.path.join(PERF_TEST_RESULTS_DIR, "async_logging_perf.txt"), "a") as f:
+        f.write("mode,records,log_call_us,total_ms\n")
+        for mode in ("sync", "async"):
+            listener = LogQueueListener(nb_records, OverflowPolicy.BLOCK)
+            with mock.patch.object(queue_handler, "_listener", listener):
+                # stands for the disk and socket writes of the file and remote handlers
+                handler = ListHandler(delay=0.0001)
+                logger = logging.getLogger(f"test_perf_async_logging_{mode}")
+                logger.propagate = False
+                logger.addHandler(handler if mode == "sync" else LogQueueHandler([handler]))
+                start_time = perf_counter()
+                for i in range(nb_records):
+                    logger.warning("perf message %s", i)
+                log_duration = perf_counter() - start_time
+                listener.stop()
+                total = perf_counter() - start_time
+            assert len(handler.records) == nb_records
+            f.write(
+                f"{mode},{nb_records},{log_duration * 1000000 / nb_records:.1f},{total * 1000:.0f}\n"
+            )
+
+
+@pytest.mark.test_logging_perf
+def test_perf_rate_limited_remote_handler(nb_records=20000):
+    """Measures the records a hot loop sends and the time a log call spends in RemoteHandler,
+    without and with a rate limit"""
+    if not os.path.exists(PERF_TEST_RESULTS_DIR):
+        os.makedirs(PERF_TEST_RESULTS_DIR)
+
+    with open(os.path.join(PERF_TEST_RESULTS_DIR, "rate_limit_perf.txt"), "a") as f:
+        f.write("rate,records,sent,emit_us\n")
+        for rate in (0, 100):
+            handler = RemoteHandler()
+            limiter = LogRateLimiter(rate=rate, burst=20, sample_rate=1, interval=60)
+            handler._rate_limiter = limiter if limiter.enabled else None
+            record = make_record("hot loop", logging.WARNING)
+            with mock.patch.object(handler._message_client, "send_request") as send_request:
+                start_time = perf_counter()
+                for _ in range(nb_records):
+                    handler.handle(record)
+                duration = perf_counter() - start_time
+            sent = send_request.call_count // len(RemoteHandler.build_requests(record))
+            assert sent == nb_records if rate == 0 else sent < nb_records
+            f.write(f"{rate},{nb_records},{sent},{duration * 1000000 / nb_records:.2f}\n")
+
+
+@pytest.mark.test_logging_perf
+def test_perf_repeat_collapsing(nb_records=20000):
+    """Measures the records a repeated message sends and the time a log call spends in
+    RemoteHandler, without and with collapsing"""
+    if not os.path.exists(PERF_TEST_RESULTS_DIR):
+        os.makedirs(PERF_TEST_RESULTS_DIR)
+
+    with open(os.path.join(PERF_TEST_RESULTS_DIR, "repeat_collapsing_perf.txt"), "a") as f:
+        f.write("window,records,sent,emit_us\n")
+        for window in (0, 60):
+            handler = RemoteHandler(dedup_window=window)
+            with mock.patch.object(handler._message_client, "send_request") as send_request:
+                start_time = perf_counter()
+                for _ in range(nb_records):
+                    handler.handle(make_record("sensor timeout", logging.ERROR))
+                duration = perf_counter() - start_time
+                handler.close()
+            nb_requests = len(RemoteHandler.build_requests(make_record("sensor timeout")))
+            sent = send_request.call_count // nb_requests
+            assert sent == nb_records if window == 0 else sent == 2
+            f.write(f"{window},{nb_records},{sent},{duration * 1000000 / nb_records:.2f}\n")
@@ -6,7 +6,9 @@ from movai_core_shared.core.zmq.zmq_manager import ZMQManager, ZMQType
 from unittest.mock import patch, MagicMock
 from movai_core_shared.core.message_client import MessageClient, AsyncMessageClient
 from movai_core_shared.envvars import FLEET_NAME, DEVICE_NAME, SERVICE_NAME
-from movai_core_shared.exceptions import ArgumentError, MessageFormatError
+from movai_core_shared.exceptions import ArgumentError, MessageError, MessageFormatError
+from movai_core_shared.core.zmq.zmq_helpers import unpack_batch
+from movai_core_shared.messages.batch_data import BatchRequest
 
 
 @pytest.mark.test_zmq
@@ -145,6 +147,32 @@ class TestZMQMessageClient:
         message_client = MessageClient(server_addr=server_addr)
         message_client.send_msg(msg, extra_data=extra_data)
 
+    def test_message_client_build_batch(self):
+        server_addr = "tcp://localhost:5555"
+        message_client = MessageClient(server_addr=server_addr)
+        batch = message_client._build_batch([("logs", {"key": "value"}), ("metrics", {}, 123)])
+        request = BatchRequest(**batch["request"])
+        assert request.req_type == "batch"
+        assert len(request.req_data.requests) == 2
+        assert request.req_data.requests[1].created == 123
+
+        requests = unpack_batch(batch)
+        assert [r["request"]["req_type"] for r in requests] == ["logs", "metrics"]
+        assert requests[0]["request"]["req_data"] == {"key": "value"}
+        assert requests[0]["request"]["robot_info"] == batch["request"]["robot_info"]
+        assert requests[1]["request"]["created"] == 123
+
+    def test_unpack_batch_with_invalid_request(self):
+        server_addr = "tcp://localhost:5555"
+        message_client = MessageClient(server_addr=server_addr)
+        with pytest.raises(MessageError):
+            unpack_batch(message_client._build_request("logs", {}))
+
+    def test_message_client_send_batch(self):
+        server_addr = "tcp://localhost:5555"
+        message_client = MessageClient(server_addr=server_addr)
+        message_client.send_batch([("logs", {"key": "value"}), ("logs", {"key": "value"})])
+
 
 @pytest.mark.test_zmq
 @pytest.mark.test_zmq_message_client
@@ -241,3 +269,9 @@ class TestZMQAsyncMessageClient:
         extra_data = {"data": "extra_data"}
         message_client = AsyncMessageClient(server_addr=server_addr)
         await message_client.send_msg(msg, extra_data=extra_data)
+
+    @pytest.mark.asyncio
+    async def test_async_message_client_send_batch(self):
+        server_addr = "tcp://localhost:5555"
+        message_client = AsyncMessageClient(server_addr=server_addr)
+        await message_client.send_batch([("logs", {"key": "value"}), ("logs", {"key": "value"})])
@@ -12,6 +12,8 @@ from time import sleep
 from tests.common.zmq_server import TestServer, TEST_SERVER_ADDR, SimpleRequest
 
 from movai_core_shared.core.zmq.zmq_client import ZMQClient, AsyncZMQClient
+from movai_core_shared.core.zmq.zmq_publisher import ZMQPublisher
+from movai_core_shared.core.zmq.zmq_reconnect import ReconnectStrategy
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
@@ -467,3 +469,84 @@ class TestZMQClients:
             )
 
         del async_client
+
+
+@pytest.mark.test_zmq
+class TestReconnect:
+    def test_backoff(self):
+        strategy = ReconnectStrategy(base_delay=0.1, max_delay=1, jitter=0)
+        assert [strategy.next_delay() for _ in range(6)] == [0.1, 0.2, 0.4, 0.8, 1, 1]
+        strategy.succeeded()
+        assert strategy.attempts == 0
+        assert strategy.next_delay() == 0.1
+
+    def test_jitter(self):
+        strategy = ReconnectStrategy(base_delay=1, max_delay=1, jitter=0.5)
+        delays = [strategy.next_delay() for _ in range(100)]
+        assert all(0.5 <= delay <= 1 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_reset_is_lazy(self):
+        client = ZMQClient("reconnect_dealer_0", TEST_SERVER_ADDR)
+        client._reconnect = ReconnectStrategy(base_delay=0.2, jitter=0)
+        socket = client._socket
+        start_time = time.perf_counter()
+        client.handle_socket_errors(zmq.error.Again())
+        assert time.perf_counter() - start_time < 0.05
+        # the socket is kept until the backoff has passed
+        client.send({"data": "before"})
+        assert client._socket is socket
+        sleep(0.2)
+        client.send({"data": "after"})
+        assert client._socket is not socket
+        assert socket.closed
+
+    def test_closed_socket_is_rebuilt_on_send(self):
+        client = ZMQClient("reconnect_dealer_1", TEST_SERVER_ADDR)
+        client._reconnect = ReconnectStrategy(base_delay=10, jitter=0)
+        client._socket.close()
+        client.handle_socket_errors(zmq.error.ZMQError(errno=zmq.ENOTSOCK))
+        client.send({"data": "msg"})
+        assert not client._socket.closed
+
+    @pytest.mark.asyncio
+    async def test_async_reset_does_not_block_the_loop(self):
+        client = AsyncZMQClient("reconnect_dealer_2", TEST_SERVER_ADDR)
+        client._reconnect = ReconnectStrategy(base_delay=0.2, jitter=0)
+        socket = client._socket
+        start_time = time.perf_counter()
+        client.handle_socket_errors(zmq.error.Again())
+        await client.send({"data": "before"})
+        assert time.perf_counter() - start_time < 0.05
+        assert client._socket is socket
+        await asyncio.sleep(0.2)
+        await client.send({"data": "after"})
+        assert client._socket is not socket
+
+    def test_publisher_bind_is_retried(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            addr = f"tcp://127.0.0.1:{sock.getsockname()[1]}"
+        publisher = ZMQPublisher("reconnect_publisher", addr)
+        publisher._reconnect = ReconnectStrategy(base_delay=0.2, jitter=0)
+        publisher._socket.close()
+        # another socket takes the address while the publisher is rebuilt
+        blocker = zmq.Context.instance().socket(zmq.PUB)
+        for _ in range(20):
+            try:
+                # the closed socket releases the address in the background
+                blocker.bind(addr)
+                break
+            except zmq.error.ZMQError:
+                sleep(0.05)
+        publisher.handle_socket_errors(zmq.error.Again())
+        assert publisher._scheduled_reset is not None
+        sleep(0.2)
+        # the bind fails again, the message is dropped and the reset stays scheduled
+        publisher.send({"data": "msg"})
+        assert publisher._scheduled_reset is not None
+        blocker.close(linger=0)
+        sleep(0.4)
+        publisher.send({"data": "msg"})
+        assert publisher._scheduled_reset is None
+        assert publisher._socket.getsockopt(zmq.LAST_ENDPOINT).decode() == addr
@@ -0,0 +1,235 @@
+""" Test the wire codecs of zmq_helpers """
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pytest
+import zmq
+
+from movai_core_shared.consts import (
+    LOGS_HANDLER_MSG_TYPE,
+    LOGS_MEASUREMENT,
+    METRICS_HANDLER_MSG_TYPE,
+    PLATFORM_METRICS_INFLUX_DB,
+)
+from movai_core_shared.core.zmq.zmq_client import ZMQClient
+from movai_core_shared.core.zmq.zmq_helpers import (
+    CODECS_BY_NAME,
+    JSON_CODEC,
+    WireCodec,
+    create_frames,
+    create_reply_frames,
+    extract_reponse,
+    get_codec,
+    register_codec,
+)
+from movai_core_shared.messages.log_data import LogRequest
+from movai_core_shared.messages.metric_data import MetricRequest
+
+PERF_TEST_ITERATIONS = 10000
+PERF_TEST_RESULTS_DIR = "perf_results"
+ZERO_COPY_SERVER_ADDR = "ipc:///tmp/test_zmq_zero_copy_server"
+
+ROBOT_INFO = {"fleet": "movai", "robot": "robot_1", "service": "spawner", "id": ""}
+
+LOG_REQUEST = {
+    "request": {
+        "req_type": LOGS_HANDLER_MSG_TYPE,
+        "created": 1700000000123456789,
+        "response_required": False,
+        "req_data": {
+            "measurement": LOGS_MEASUREMENT,
+            "log_tags": {"robot": "robot_1", "level": "INFO", "service": "spawner", "ui": True},
+            "log_fields": {
+                "module": "spawner_server",
+                "funcName": "handle_request",
+                "lineno": 142,
+                "message": "Node %s transitioned to state %s",
+                "args": json.dumps(["nav_controller", "RUNNING"]),
+            },
+        },
+        "robot_info": ROBOT_INFO,
+    }
+}
+
+METRIC_REQUEST = {
+    "request": {
+        "req_type": METRICS_HANDLER_MSG_TYPE,
+        "created": 1700000000123456789,
+        "response_required": False,
+        "req_data": {
+            "measurement": "robot_health",
+            "db_name": PLATFORM_METRICS_INFLUX_DB,
+            "metric_fields": {"cpu": 12.5, "memory": 1048576, "battery": 87.25, "temp": 41.0},
+            "metric_tags": {"robot": "robot_1", "fleet": "movai"},
+        },
+        "robot_info": ROBOT_INFO,
+    }
+}
+
+
+@pytest.mark.test_zmq
+class TestWireCodecs:
+    @pytest.mark.parametrize("codec_name", list(CODECS_BY_NAME))
+    @pytest.mark.parametrize("msg", [LOG_REQUEST, METRIC_REQUEST])
+    def test_round_trip(self, codec_name, msg):
+        frames = create_frames(msg, get_codec(codec_name))
+        # the ROUTER socket prepends the identity of the client
+        assert extract_reponse([b"dealer_identity"] + frames) == msg
+        assert extract_reponse(frames) == msg
+
+    def test_json_has_no_header_frame(self):
+        frames = create_frames(LOG_REQUEST, JSON_CODEC)
+        assert len(frames) == 1
+        assert json.loads(frames[0]) == LOG_REQUEST
+
+    def test_unknown_codec_falls_back_to_json(self):
+        assert get_codec("unknown") is JSON_CODEC
+
+    def test_register_codec(self):
+        codec = WireCodec(
+            "reversed_json",
+            200,
+            lambda m: json.dumps(m).encode()[::-1],
+            lambda d: json.loads(bytes(d)[::-1]),
+        )
+        register_codec(codec)
+        frames = create_frames(METRIC_REQUEST, codec)
+        assert frames[0] == bytes([200])
+        assert extract_reponse(frames) == METRIC_REQUEST
+        CODECS_BY_NAME.pop("reversed_json")
+
+    def test_models_validate_decoded_messages(self):
+        for codec_name in CODECS_BY_NAME:
+            codec = get_codec(codec_name)
+            log = extract_reponse(create_frames(LOG_REQUEST, codec))
+            metric = extract_reponse(create_frames(METRIC_REQUEST, codec))
+            assert LogRequest(**log["request"]).req_data.log_fields.lineno == 142
+            assert MetricRequest(**metric["request"]).req_data.metric_fields["cpu"] == 12.5
+
+    @pytest.mark.parametrize("codec_name", list(CODECS_BY_NAME))
+    def test_decode_frames(self, codec_name):
+        frames = [zmq.Frame(frame) for frame in create_frames(LOG_REQUEST, get_codec(codec_name))]
+        assert extract_reponse(frames) == LOG_REQUEST
+
+    @pytest.mark.parametrize("codec_name", list(CODECS_BY_NAME))
+    def test_reply_frames(self, codec_name):
+        codec = get_codec(codec_name)
+        response = {"rows": [LOG_REQUEST, None, 1.5, "é"]}
+        replies = create_reply_frames(response, ["a", None, "c"], codec)
+        for req_id, frames in zip(["a", None, "c"], replies):
+            assert frames == create_frames({"req_id": req_id, "response": response}, codec)
+        assert create_reply_frames(object(), ["a", "b"], JSON_CODEC) is None
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.parametrize("msg_name", ["log", "metric"])
+    def test_perf_codecs(self, msg_name, nb_iterations=PERF_TEST_ITERATIONS):
+        """Compares the encode and decode throughput of the registered codecs"""
+        msg = LOG_REQUEST if msg_name == "log" else METRIC_REQUEST
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "codec_perf.txt"), "a") as f:
+            f.write("codec,msg,size,encode_msgs_per_sec,decode_msgs_per_sec\n")
+            for codec_name, codec in CODECS_BY_NAME.items():
+                start_time = time.perf_counter()
+                for _ in range(nb_iterations):
+                    frames = create_frames(msg, codec)
+                encode_time = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                for _ in range(nb_iterations):
+                    extract_reponse(frames)
+                decode_time = time.perf_counter() - start_time
+
+                f.write(
+                    f"{codec_name},{msg_name},{len(frames[-1])},"
+                    f"{nb_iterations / encode_time:.0f},{nb_iterations / decode_time:.0f}\n"
+                )
+                assert extract_reponse(frames) == msg
+
+
+def run_large_reply_server(stop: threading.Event, ready: threading.Event):
+    """Replies to every request with a pre-serialized payload of the requested size"""
+    payloads = {}
+    socket = zmq.Context.instance().socket(zmq.ROUTER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.bind(ZERO_COPY_SERVER_ADDR)
+    ready.set()
+    while not stop.is_set():
+        if not socket.poll(100):
+            continue
+        identity, data = socket.recv_multipart()
+        request = json.loads(data)["request"]
+        size = request["req_data"]["size"]
+        if size not in payloads:
+            payloads[size] = json.dumps({"response": {"rows": "x" * size}}).encode()
+        socket.send_multipart([identity, payloads[size]], copy=False)
+    socket.close()
+
+
+@pytest.mark.test_zmq
+class TestZeroCopy:
+    @pytest.fixture(scope="class", autouse=True)
+    def large_reply_server(self):
+        stop = threading.Event()
+        ready = threading.Event()
+        thread = threading.Thread(target=run_large_reply_server, args=(stop, ready), daemon=True)
+        thread.start()
+        ready.wait()
+        yield
+        stop.set()
+        thread.join()
+
+    @staticmethod
+    def build_request(size: int) -> dict:
+        return {
+            "request": {
+                "req_type": "query",
+                "created": 0,
+                "response_required": True,
+                "req_data": {"size": size},
+                "robot_info": ROBOT_INFO,
+            }
+        }
+
+    @pytest.mark.parametrize("zero_copy", [False, True])
+    def test_large_reply(self, zero_copy):
+        client = ZMQClient(f"zero_copy_dealer_{zero_copy}", ZERO_COPY_SERVER_ADDR)
+        client.zero_copy = zero_copy
+        response = client.submit(self.build_request(1 << 20)).result()
+        assert len(response["response"]["rows"]) == 1 << 20
+
+    def test_send_frames(self):
+        client = ZMQClient("zero_copy_dealer_frames", ZERO_COPY_SERVER_ADDR)
+        client.send_frames([memoryview(json.dumps(self.build_request(16)).encode())])
+        assert len(client.receive()["response"]["rows"]) == 16
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.parametrize("size_mb", [1, 50])
+    def test_perf_zero_copy(self, size_mb):
+        """Compares the latency and the peak python memory of large replies"""
+        nb_iterations = 20 if size_mb == 1 else 3
+        request = self.build_request(size_mb << 20)
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "zero_copy_perf.txt"), "a") as f:
+            f.write("zero_copy,size_mb,avg_latency_ms,peak_memory_mb\n")
+            for zero_copy in (False, True):
+                client = ZMQClient(f"zero_copy_perf_{size_mb}_{zero_copy}", ZERO_COPY_SERVER_ADDR)
+                client.zero_copy = zero_copy
+                # warm up the server payload cache
+                client.submit(request).result()
+                tracemalloc.start()
+                start_time = time.perf_counter()
+                for _ in range(nb_iterations):
+                    response = client.submit(request).result()
+                latency = (time.perf_counter() - start_time) / nb_iterations
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                f.write(f"{zero_copy},{size_mb},{latency * 1000:.2f},{peak / (1 << 20):.1f}\n")
+                assert len(response["response"]["rows"]) == size_mb << 20
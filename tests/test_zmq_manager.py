@@ -0,0 +1,155 @@
+""" Test ZMQManager class """
+
+import gc
+import threading
+
+import pytest
+import zmq
+
+from movai_core_shared.consts import COMMAND_HANDLER_MSG_TYPE, LOGS_HANDLER_MSG_TYPE, Priority
+from movai_core_shared.core.message_client import MessageClient
+from movai_core_shared.core.zmq import zmq_client
+from movai_core_shared.core.zmq.zmq_health import EndpointHealth
+from movai_core_shared.core.zmq.zmq_helpers import generate_zmq_identity
+from movai_core_shared.core.zmq.zmq_manager import ZMQManager, ZMQType
+
+SERVER_ADDR = "ipc:///tmp/test_zmq_manager"
+
+
+@pytest.mark.test_zmq
+class TestZMQManager:
+    def test_same_thread_same_client(self):
+        client = ZMQManager.get_client(SERVER_ADDR, ZMQType.CLIENT)
+        assert ZMQManager.get_client(SERVER_ADDR, ZMQType.CLIENT) is client
+
+    def test_client_per_thread(self):
+        main_client = ZMQManager.get_client(SERVER_ADDR, ZMQType.CLIENT)
+        clients = []
+        barrier = threading.Barrier(4)
+
+        def worker():
+            clients.append(ZMQManager.get_client(SERVER_ADDR, ZMQType.CLIENT))
+            # keep the threads alive until all of them got a client
+            barrier.wait()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        identities = {client._identity for client in clients}
+        assert len(identities) == 4
+        assert main_client._identity not in identities
+        assert ZMQManager.get_pool_size(SERVER_ADDR, ZMQType.CLIENT) >= 1
+
+    def test_client_pool_is_bounded(self, monkeypatch):
+        server_addr = "ipc:///tmp/test_zmq_manager_bounded"
+        monkeypatch.setattr(ZMQManager, "_pool_size", 2)
+        clients = []
+        barrier = threading.Barrier(4)
+
+        def worker():
+            clients.append(ZMQManager.get_client(server_addr, ZMQType.CLIENT))
+            barrier.wait()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # two threads got their own client and the other two share the one of the process
+        assert len({id(client) for client in clients}) == 3
+        assert ZMQManager.get_pool_size(server_addr, ZMQType.CLIENT) == 3
+        clients.clear()
+        gc.collect()
+        # the clients of the exited threads were closed, the shared one is kept
+        assert ZMQManager.get_pool_size(server_addr, ZMQType.CLIENT) == 1
+
+    def test_identities_are_unique(self):
+        assert len({generate_zmq_identity("dealer") for _ in range(10000)}) == 10000
+
+    def test_async_client_is_shared(self):
+        client = ZMQManager.get_client(SERVER_ADDR, ZMQType.ASYNC_CLIENT)
+        clients = []
+        thread = threading.Thread(
+            target=lambda: clients.append(ZMQManager.get_client(SERVER_ADDR, ZMQType.ASYNC_CLIENT))
+        )
+        thread.start()
+        thread.join()
+        assert clients[0] is client
+
+    def test_client_per_priority(self):
+        server_addr = "ipc:///tmp/test_zmq_manager_lanes"
+        client = ZMQManager.get_client(server_addr, ZMQType.CLIENT)
+        high = ZMQManager.get_client(server_addr, ZMQType.CLIENT, Priority.HIGH)
+        assert high is not client
+        assert high._identity != client._identity
+        assert ZMQManager.get_client(server_addr, ZMQType.CLIENT, Priority.HIGH) is high
+        assert ZMQManager.get_pool_size(server_addr, ZMQType.CLIENT) == 2
+
+        message_client = MessageClient(server_addr)
+        assert message_client._lane_client(COMMAND_HANDLER_MSG_TYPE) is high
+        assert message_client._lane_client("metrics") is client
+        low = message_client._lane_client(LOGS_HANDLER_MSG_TYPE)
+        assert low not in (client, high)
+
+    def test_unknown_endpoint_is_up(self):
+        assert ZMQManager.is_endpoint_up("ipc:///tmp/test_zmq_manager_unknown")
+        assert (
+            ZMQManager.get_endpoint_health("ipc:///tmp/test_zmq_manager_unknown")["failures"] == 0
+        )
+
+
+@pytest.mark.test_zmq
+class TestEndpointHealth:
+    def test_ewma_rtt(self):
+        health = EndpointHealth("addr", alpha=0.5)
+        health.record_rtt(1.0)
+        assert health.ewma_rtt == 1.0
+        health.record_rtt(2.0)
+        assert health.last_rtt == 2.0
+        assert health.ewma_rtt == 1.5
+
+    def test_up_and_down(self):
+        health = EndpointHealth("addr")
+        assert health.is_up
+        health.record_failure()
+        assert not health.is_up
+        assert health.to_dict()["failures"] == 1
+        health.record_rtt(0.001)
+        assert health.is_up
+
+
+@pytest.mark.test_zmq
+class TestOverloadStats:
+    def test_hwm_profile(self, monkeypatch):
+        monkeypatch.setitem(zmq_client.HWM_PROFILES, zmq.DEALER, (10, 20))
+        client = zmq_client.ZMQClient("hwm_dealer", "ipc:///tmp/test_zmq_manager_hwm")
+        assert client._socket.getsockopt(zmq.SNDHWM) == 10
+        assert client._socket.getsockopt(zmq.RCVHWM) == 20
+
+    def test_nodrop_publisher(self):
+        class NoDropPublisher(zmq_client.ZMQClient):
+            zmq_socket_type = zmq.XPUB
+
+        publisher = NoDropPublisher("nodrop_pub", "ipc:///tmp/test_zmq_manager_xpub")
+        assert publisher._socket.getsockopt(zmq.TYPE) == zmq.XPUB
+
+    def test_send_timeouts_are_counted(self, monkeypatch):
+        # nobody listens on the address, the messages pile up until the high-water mark
+        server_addr = "ipc:///tmp/test_zmq_manager_overload"
+        monkeypatch.setitem(zmq_client.HWM_PROFILES, zmq.DEALER, (1, 1))
+        client = ZMQManager.get_client(server_addr, ZMQType.CLIENT)
+        client._socket.setsockopt(zmq.SNDTIMEO, 10)
+        timeouts = 0
+        for i in range(10):
+            try:
+                client.send({"data": i})
+            except zmq.error.Again:
+                timeouts += 1
+        assert timeouts > 0
+        assert client.get_stats() == {"send_timeouts": timeouts, "dropped": timeouts}
+        stats = ZMQManager.get_stats()["CLIENT"][server_addr]
+        assert stats == {"sockets": 1, "send_timeouts": timeouts, "dropped": timeouts}
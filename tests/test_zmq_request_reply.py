@@ -0,0 +1,354 @@
+""" Test request/reply matching of the ZMQ clients """
+
+import asyncio
+import threading
+import time
+from time import sleep
+
+import mock
+import pytest
+import zmq
+
+from tests.common.zmq_server import EchoServer, ECHO_SERVER_ADDR, LEGACY_ECHO_SERVER_ADDR
+from movai_core_shared.consts import OverflowPolicy
+from movai_core_shared.core.zmq.zmq_client import AsyncZMQClient, ZMQClient
+from movai_core_shared.core.zmq.zmq_health import EndpointHealth
+
+MONITORED_ECHO_SERVER_ADDR = "ipc:///tmp/test_zmq_monitored_echo_server"
+
+
+def build_request(msg: str, delay: float = 0, response_required: bool = True) -> dict:
+    return {
+        "request": {
+            "req_type": "echo",
+            "created": 0,
+            "response_required": response_required,
+            "req_data": {"msg": msg, "delay": delay},
+            "robot_info": {"fleet": "fleet", "robot": "robot", "service": "service", "id": "id"},
+        }
+    }
+
+
+@pytest.fixture(scope="module", autouse=True)
+def echo_server():
+    """Runs the echo server in a separate thread"""
+    server = EchoServer()
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    sleep(1)
+    yield server
+
+
+@pytest.fixture(scope="module")
+def legacy_echo_server():
+    """Runs an echo server which does not echo the request ids in a separate thread"""
+    server = EchoServer(LEGACY_ECHO_SERVER_ADDR, echo_req_id=False)
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    sleep(1)
+    yield server
+
+
+@pytest.mark.test_zmq
+class TestAsyncRequestMultiplexing:
+    @pytest.mark.asyncio
+    async def test_request_stamps_req_id(self):
+        client = AsyncZMQClient("mux_dealer_0", ECHO_SERVER_ADDR)
+        request = build_request("hello")
+        response = await client.request(request)
+        assert request["request"]["req_id"]
+        assert response["req_id"] == request["request"]["req_id"]
+        assert response["response"]["msg"] == "hello"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_get_their_own_reply(self):
+        client = AsyncZMQClient("mux_dealer_1", ECHO_SERVER_ADDR)
+        # the first requests are answered last
+        delays = [0.3, 0.2, 0.1, 0]
+        requests = [build_request(f"msg_{i}", delay) for i, delay in enumerate(delays)]
+        responses = await asyncio.gather(*[client.request(request) for request in requests])
+        for i, response in enumerate(responses):
+            assert response["response"]["msg"] == f"msg_{i}"
+
+    @pytest.mark.asyncio
+    async def test_many_concurrent_requests(self):
+        client = AsyncZMQClient("mux_dealer_2", ECHO_SERVER_ADDR)
+        requests = [build_request(f"msg_{i}") for i in range(200)]
+        responses = await asyncio.gather(*[client.request(request) for request in requests])
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(200)]
+
+    @pytest.mark.asyncio
+    async def test_request_timeout(self):
+        client = AsyncZMQClient("mux_dealer_3", ECHO_SERVER_ADDR)
+        response = await client.request(build_request("late", delay=0.5), timeout=0.1)
+        assert response == {}
+        assert not client._pending
+
+
+@pytest.mark.test_zmq
+class TestSyncRequestPipelining:
+    def test_submit_and_result(self):
+        client = ZMQClient("pipe_dealer_0", ECHO_SERVER_ADDR)
+        reply = client.submit(build_request("hello"))
+        response = reply.result()
+        assert reply.done()
+        assert response["req_id"] == reply.req_id
+        assert response["response"]["msg"] == "hello"
+
+    def test_out_of_order_replies(self):
+        client = ZMQClient("pipe_dealer_1", ECHO_SERVER_ADDR)
+        client.submit(build_request("hello")).result()
+        delays = [0.3, 0.2, 0.1, 0]
+        replies = [
+            client.submit(build_request(f"msg_{i}", delay)) for i, delay in enumerate(delays)
+        ]
+        for i, reply in enumerate(replies):
+            assert reply.result()["response"]["msg"] == f"msg_{i}"
+        assert not client._pending
+
+    def test_pipeline_window(self):
+        client = ZMQClient("pipe_dealer_2", ECHO_SERVER_ADDR)
+        client.pipeline_window = 4
+        replies = [client.submit(build_request(f"msg_{i}")) for i in range(50)]
+        assert len(client._pending) <= 4
+        assert [r.result()["response"]["msg"] for r in replies] == [f"msg_{i}" for i in range(50)]
+
+    def test_result_timeout(self):
+        client = ZMQClient("pipe_dealer_3", ECHO_SERVER_ADDR)
+        reply = client.submit(build_request("late", delay=0.5))
+        assert reply.result(timeout=0.1) == {}
+        assert not client._pending
+
+    def test_threads_share_the_socket(self):
+        client = ZMQClient("pipe_dealer_4", ECHO_SERVER_ADDR)
+        results = {}
+
+        def worker(thread_id):
+            replies = [client.submit(build_request(f"{thread_id}_{i}")) for i in range(20)]
+            results[thread_id] = [r.result()["response"]["msg"] for r in replies]
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for thread_id in range(5):
+            assert results[thread_id] == [f"{thread_id}_{i}" for i in range(20)]
+
+    def test_waiting_thread_does_not_block_the_others(self):
+        client = ZMQClient("pipe_dealer_5", ECHO_SERVER_ADDR)
+        # the server echoes the request ids, the requests are pipelined
+        client.submit(build_request("hello")).result()
+        slow = client.submit(build_request("slow", delay=1))
+        waiter = threading.Thread(target=slow.result)
+        waiter.start()
+        sleep(0.1)
+        start_time = time.perf_counter()
+        assert client.submit(build_request("fast")).result()["response"]["msg"] == "fast"
+        assert time.perf_counter() - start_time < 0.5
+        waiter.join()
+        assert slow.result()["response"]["msg"] == "slow"
+
+
+@pytest.mark.test_zmq
+@pytest.mark.usefixtures("legacy_echo_server")
+class TestRepliesWithoutRequestId:
+    def test_sync_late_reply_is_discarded(self):
+        client = ZMQClient("legacy_dealer_0", LEGACY_ECHO_SERVER_ADDR)
+        assert client.submit(build_request("msg_1", delay=0.8)).result(timeout=0.5) == {}
+        sleep(0.5)
+        for i in (2, 3):
+            response = client.submit(build_request(f"msg_{i}")).result()
+            assert response["response"]["msg"] == f"msg_{i}"
+
+    def test_sync_requests_are_served_in_turn(self):
+        client = ZMQClient("legacy_dealer_1", LEGACY_ECHO_SERVER_ADDR)
+        replies = [client.submit(build_request(f"msg_{i}", 0.1 - i * 0.05)) for i in range(3)]
+        assert [reply.result(timeout=1)["response"]["msg"] for reply in replies] == [
+            "msg_0",
+            "msg_1",
+            "msg_2",
+        ]
+        assert not client._echoes_req_id
+
+    @pytest.mark.asyncio
+    async def test_async_late_reply_is_discarded(self):
+        client = AsyncZMQClient("legacy_dealer_2", LEGACY_ECHO_SERVER_ADDR)
+        assert await client.request(build_request("msg_1", delay=0.8), timeout=0.5) == {}
+        # the late reply arrives while no request is pending
+        await asyncio.sleep(0.5)
+        for i in (2, 3):
+            response = await client.request(build_request(f"msg_{i}"))
+            assert response["response"]["msg"] == f"msg_{i}"
+
+    @pytest.mark.asyncio
+    async def test_async_concurrent_requests_are_served_in_turn(self):
+        client = AsyncZMQClient("legacy_dealer_3", LEGACY_ECHO_SERVER_ADDR)
+        responses = await asyncio.gather(
+            *(client.request(build_request(f"msg_{i}", delay=0.1), timeout=1) for i in range(3))
+        )
+        assert [response["response"]["msg"] for response in responses] == [
+            "msg_0",
+            "msg_1",
+            "msg_2",
+        ]
+        assert not client._echoes_req_id
+
+    @pytest.mark.asyncio
+    async def test_async_requests_are_multiplexed_once_ids_are_echoed(self):
+        client = AsyncZMQClient("echo_dealer_serial", ECHO_SERVER_ADDR)
+        await client.request(build_request("first"))
+        assert client._echoes_req_id
+        start_time = time.perf_counter()
+        await asyncio.gather(*(client.request(build_request("msg", delay=0.2)) for _ in range(5)))
+        assert time.perf_counter() - start_time < 0.6
+
+
+@pytest.mark.test_zmq
+class TestTimeoutReset:
+    def test_receive_resets_the_backoff(self):
+        client = ZMQClient("backoff_dealer_0", ECHO_SERVER_ADDR)
+        client._reconnect.schedule()
+        client._reconnect.schedule()
+        client.send(build_request("hello"))
+        assert client.receive()["response"]["msg"] == "hello"
+        assert client._reconnect.attempts == 0
+
+    def test_timeout_schedules_a_reset(self):
+        client = ZMQClient("backoff_dealer_1", ECHO_SERVER_ADDR)
+        socket = client._socket
+        client.send(build_request("late", delay=0.5))
+        client._socket.setsockopt(zmq.RCVTIMEO, 100)
+        assert client.receive() == {}
+        assert client._scheduled_reset
+        response = client.submit(build_request("hello")).result()
+        assert response["response"]["msg"] == "hello"
+        assert socket.closed
+
+
+@pytest.mark.test_zmq
+class TestAsyncSendQueue:
+    @staticmethod
+    def queued_msgs(client: AsyncZMQClient) -> list:
+        return [msg["request"]["req_data"]["msg"] for msg in client._send_queue._queue]
+
+    @pytest.mark.asyncio
+    async def test_enqueue_and_flush(self):
+        client = AsyncZMQClient("queue_dealer_0", ECHO_SERVER_ADDR)
+        for i in range(100):
+            assert await client.enqueue(build_request(f"msg_{i}", response_required=False))
+        await client.flush()
+        assert client.get_queue_stats() == {"queued": 100, "sent": 100, "dropped": 0, "size": 0}
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest(self):
+        client = AsyncZMQClient("queue_dealer_1", ECHO_SERVER_ADDR)
+        client.send_queue_size = 4
+        client.send_queue_policy = OverflowPolicy.DROP_OLDEST
+        for i in range(10):
+            assert client.enqueue_nowait(build_request(f"msg_{i}", response_required=False))
+        assert self.queued_msgs(client) == ["msg_6", "msg_7", "msg_8", "msg_9"]
+        await client.flush()
+        assert client.get_queue_stats() == {"queued": 10, "sent": 4, "dropped": 6, "size": 0}
+
+    @pytest.mark.asyncio
+    async def test_drop_newest(self):
+        client = AsyncZMQClient("queue_dealer_2", ECHO_SERVER_ADDR)
+        client.send_queue_size = 4
+        client.send_queue_policy = OverflowPolicy.DROP_NEWEST
+        results = [
+            client.enqueue_nowait(build_request(f"msg_{i}", response_required=False))
+            for i in range(10)
+        ]
+        assert results == [True] * 4 + [False] * 6
+        assert self.queued_msgs(client) == ["msg_0", "msg_1", "msg_2", "msg_3"]
+        await client.flush()
+        assert client.get_queue_stats() == {"queued": 4, "sent": 4, "dropped": 6, "size": 0}
+
+    @pytest.mark.asyncio
+    async def test_block(self):
+        client = AsyncZMQClient("queue_dealer_3", ECHO_SERVER_ADDR)
+        client.send_queue_size = 4
+        client.send_queue_policy = OverflowPolicy.BLOCK
+        for i in range(10):
+            assert await client.enqueue(build_request(f"msg_{i}", response_required=False))
+        await client.flush()
+        assert client.get_queue_stats() == {"queued": 10, "sent": 10, "dropped": 0, "size": 0}
+
+    @pytest.mark.asyncio
+    async def test_storm_is_bounded(self):
+        client = AsyncZMQClient("queue_dealer_4", ECHO_SERVER_ADDR)
+        client.send_queue_size = 1000
+        nb_tasks = len(asyncio.all_tasks())
+        msg = build_request("storm", response_required=False)
+        for _ in range(50000):
+            client.enqueue_nowait(msg)
+        # a single sender task, no matter how many messages were queued
+        assert len(asyncio.all_tasks()) == nb_tasks + 1
+        assert client.get_queue_stats()["size"] == 1000
+        await client.flush()
+        stats = client.get_queue_stats()
+        assert stats["sent"] + stats["dropped"] == 50000
+
+    @pytest.mark.asyncio
+    async def test_send_errors_are_dropped(self):
+        client = AsyncZMQClient("queue_dealer_5", ECHO_SERVER_ADDR)
+        with mock.patch.object(client._socket, "send_multipart", side_effect=zmq.error.Again()):
+            for i in range(3):
+                assert client.enqueue_nowait(build_request(f"msg_{i}", response_required=False))
+            await client.flush()
+        assert client.get_queue_stats() == {"queued": 3, "sent": 0, "dropped": 3, "size": 0}
+        assert client.get_stats() == {"send_timeouts": 3, "dropped": 3}
+
+
+def start_echo_server(addr: str):
+    server = EchoServer(addr)
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return True
+        sleep(0.05)
+    return condition()
+
+
+@pytest.mark.test_zmq
+class TestEndpointHealthTracking:
+    def test_disconnect_marks_the_endpoint_down(self):
+        server, thread = start_echo_server(MONITORED_ECHO_SERVER_ADDR)
+        client = ZMQClient("health_dealer_monitored", MONITORED_ECHO_SERVER_ADDR)
+        health = client._health
+        assert client.submit(build_request("hello")).result(timeout=5) is not None
+        server.stop(drain_timeout=0)
+        thread.join(5)
+        # no request is sent, the disconnection alone marks the endpoint down
+        assert wait_for(lambda: not health.is_up)
+        server, thread = start_echo_server(MONITORED_ECHO_SERVER_ADDR)
+        assert wait_for(lambda: health.is_up)
+        assert client.submit(build_request("hello")).result(timeout=5) is not None
+        server.stop(drain_timeout=0)
+        thread.join(5)
+
+    def test_sync_rtt_and_timeout(self):
+        client = ZMQClient("health_dealer_0", ECHO_SERVER_ADDR)
+        client._health = health = EndpointHealth(ECHO_SERVER_ADDR)
+        client.submit(build_request("hello", delay=0.05)).result()
+        assert health.is_up
+        assert 0.05 <= health.last_rtt < 1
+        client.submit(build_request("late", delay=0.5)).result(timeout=0.1)
+        assert not health.is_up
+        client.submit(build_request("hello")).result()
+        assert health.is_up
+
+    @pytest.mark.asyncio
+    async def test_async_rtt_and_timeout(self):
+        client = AsyncZMQClient("health_dealer_1", ECHO_SERVER_ADDR)
+        client._health = health = EndpointHealth(ECHO_SERVER_ADDR)
+        await client.request(build_request("hello", delay=0.05))
+        assert 0.05 <= health.ewma_rtt < 1
+        await client.request(build_request("late", delay=0.5), timeout=0.1)
+        assert not health.is_up
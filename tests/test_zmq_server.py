@@ -0,0 +1,997 @@
+""" Test the concurrency limits of ZMQServer """
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+from time import perf_counter, sleep
+
+import mock
+import psutil
+import pytest
+import zmq
+import zmq.asyncio
+
+from tests.common.zmq_server import EchoServer
+from tests.test_zmq_codec import LOG_REQUEST, METRIC_REQUEST
+from movai_core_shared.consts import (
+    ALERT_QUERY_HANDLER_MSG_TYPE,
+    COMMAND_HANDLER_MSG_TYPE,
+    ExecutorType,
+    LOGS_HANDLER_MSG_TYPE,
+    LOGS_QUERY_HANDLER_MSG_TYPE,
+    METRICS_HANDLER_MSG_TYPE,
+    Priority,
+    SERVER_STATS_MSG_TYPE,
+    ZMQ_SERVER_STATS_MEASUREMENT,
+)
+from movai_core_shared.core.message_client import AsyncMessageClient
+from movai_core_shared.core.zmq.zmq_cache import MISS, ResponseCache, make_cache_key
+from movai_core_shared.core.zmq.zmq_client import AsyncZMQClient
+from movai_core_shared.core.zmq.zmq_helpers import get_codec
+from movai_core_shared.core.zmq.zmq_lanes import IntakeLanes, peek_req_type
+from movai_core_shared.core.zmq.zmq_routes import route
+from movai_core_shared.core.zmq.zmq_server import ZMQServer
+from movai_core_shared.core.zmq.zmq_stats import LATENCY_BUCKETS_MS, RequestTypeStats
+from movai_core_shared.exceptions import ArgumentError
+from movai_core_shared.messages.general_data import Request
+from movai_core_shared.messages.log_data import LogRequest
+from movai_core_shared.messages.metric_data import MetricRequest
+
+LIMITED_SERVER_ADDR = "ipc:///tmp/test_zmq_limited_server"
+QUEUED_SERVER_ADDR = "ipc:///tmp/test_zmq_queued_server"
+MULTI_PROCESS_SERVER_ADDR = "ipc:///tmp/test_zmq_multi_process_server"
+BATCH_SERVER_ADDR = "ipc:///tmp/test_zmq_batch_server"
+ROUTED_SERVER_ADDR = "ipc:///tmp/test_zmq_routed_server"
+STATS_SERVER_ADDR = "ipc:///tmp/test_zmq_stats_server"
+DRAIN_SERVER_ADDR = "ipc:///tmp/test_zmq_drain_server"
+OFFLOAD_SERVER_ADDR = "ipc:///tmp/test_zmq_offload_server"
+QUERY_SERVER_ADDR = "ipc:///tmp/test_zmq_query_server"
+TELEMETRY_SERVER_ADDR = "ipc:///tmp/test_zmq_telemetry_server"
+PERF_TEST_RESULTS_DIR = "perf_results"
+
+
+class PeakEchoServer(EchoServer):
+    """Records the highest number of requests handled at the same time"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__(addr, **kwargs)
+        self.peak_in_flight = 0
+        self.peak_queue_depth = 0
+
+    async def handle(self, buffer) -> None:
+        stats = self.get_stats()
+        self.peak_in_flight = max(self.peak_in_flight, stats["in_flight"])
+        self.peak_queue_depth = max(self.peak_queue_depth, stats["queue_depth"])
+        await super().handle(buffer)
+
+
+class PidEchoServer(EchoServer):
+    """Replies with the pid of the process which handled the request"""
+
+    async def handle(self, buffer) -> None:
+        request = json.loads(buffer[-1])["request"]
+        await asyncio.sleep(request["req_data"]["delay"])
+        resp = {"req_id": request["req_id"], "response": {"pid": os.getpid()}}
+        await self._socket.send_multipart([buffer[0], json.dumps(resp).encode("utf8")])
+
+
+class BatchEchoServer(EchoServer):
+    """Records the sizes of the batches it handled"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__(addr, **kwargs)
+        self.batch_sizes = []
+
+    async def handle_batch(self, buffers) -> None:
+        self.batch_sizes.append(len(buffers))
+        await super().handle_batch(buffers)
+
+
+class SlowServer(ZMQServer):
+    """Handles every request in 0.2 seconds, without replying"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__("SLOW_SERVER", addr, **kwargs)
+        self.nb_handled = 0
+
+    async def handle(self, buffer) -> None:
+        await asyncio.sleep(0.2)
+        self.nb_handled += 1
+
+
+class RoutedServer(ZMQServer):
+    """Replies with a summary of the validated logs and metrics"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__("ROUTED_SERVER", addr, **kwargs)
+        self.requests = []
+
+    @route(LOGS_HANDLER_MSG_TYPE, LogRequest)
+    async def handle_log(self, request: LogRequest) -> dict:
+        self.requests.append(request)
+        return {"lineno": request.req_data.log_fields.lineno}
+
+    @route(METRICS_HANDLER_MSG_TYPE, MetricRequest)
+    def handle_metric(self, request: MetricRequest) -> dict:
+        self.requests.append(request)
+        if request.req_data.metric_fields.get("fail"):
+            raise ValueError("failed")
+        return {"cpu": request.req_data.metric_fields.get("cpu")}
+
+
+class MetricOnlyServer(RoutedServer):
+    """Overrides the log route of its base class"""
+
+    @route(LOGS_HANDLER_MSG_TYPE, LogRequest)
+    async def handle_log(self, request: LogRequest) -> dict:
+        return {"ignored": True}
+
+
+def burn(seconds: float) -> None:
+    """Keeps the CPU busy, holding the GIL"""
+    end_time = perf_counter() + seconds
+    while perf_counter() < end_time:
+        pass
+
+
+class OffloadServer(ZMQServer):
+    """Runs the same blocking handler in the event loop, a thread and a process"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__("OFFLOAD_SERVER", addr, **kwargs)
+
+    @route("ping")
+    async def handle_ping(self, request: Request) -> dict:
+        return {"pong": True}
+
+    @route("sleep_inline")
+    def handle_sleep_inline(self, request: Request) -> dict:
+        sleep(0.3)
+        return {"thread": threading.current_thread().name}
+
+    @route("sleep_thread", executor=ExecutorType.THREAD)
+    def handle_sleep_thread(self, request: Request) -> dict:
+        sleep(0.3)
+        return {"thread": threading.current_thread().name}
+
+    @route("burn_inline")
+    def handle_burn_inline(self, request: Request) -> dict:
+        burn(0.02)
+        return {}
+
+    @route("burn_thread", executor=ExecutorType.THREAD)
+    def handle_burn_thread(self, request: Request) -> dict:
+        burn(0.02)
+        return {}
+
+    @staticmethod
+    @route("burn_process", LogRequest, executor=ExecutorType.PROCESS)
+    def handle_burn_process(request: LogRequest) -> dict:
+        burn(0.02)
+        return {"pid": os.getpid(), "lineno": request.req_data.log_fields.lineno}
+
+
+class QueryRequest(Request):
+    req_data: dict
+
+
+class QueryServer(ZMQServer):
+    """Counts the queries which were not served from the cache"""
+
+    def __init__(self, addr, **kwargs) -> None:
+        super().__init__("QUERY_SERVER", addr, **kwargs)
+        self.nb_queries = 0
+        self.nb_failures = 0
+
+    @route(LOGS_QUERY_HANDLER_MSG_TYPE, QueryRequest, cacheable=True)
+    async def handle_query(self, request: QueryRequest) -> dict:
+        self.nb_queries += 1
+        await asyncio.sleep(request.req_data.get("delay", 0))
+        if self.nb_failures > 0:
+            self.nb_failures -= 1
+            raise ValueError("query failed")
+        return {"rows": [request.req_data["robot"]] * 3}
+
+    @route(ALERT_QUERY_HANDLER_MSG_TYPE, QueryRequest, coalesce=True)
+    async def handle_coalesced_query(self, request: QueryRequest) -> dict:
+        return await self.handle_query(request)
+
+    @route("uncoalesced_query", QueryRequest)
+    async def handle_uncoalesced_query(self, request: QueryRequest) -> dict:
+        return await self.handle_query(request)
+
+
+class TelemetryServer(ZMQServer):
+    """Handles the logs one at a time, the commands reply with the number of logs handled"""
+
+    def __init__(self, addr) -> None:
+        super().__init__("TELEMETRY_SERVER", addr, max_in_flight=1, intake_queue_size=5000)
+        self.nb_logs = 0
+
+    @route(LOGS_HANDLER_MSG_TYPE)
+    async def handle_log(self, request: Request) -> None:
+        await asyncio.sleep(0.001)
+        self.nb_logs += 1
+
+    @route(COMMAND_HANDLER_MSG_TYPE)
+    async def handle_command(self, request: Request) -> dict:
+        return {"logs_before": self.nb_logs}
+
+
+class FifoTelemetryServer(TelemetryServer):
+    """Handles all the requests in the order they were received"""
+
+    priorities = {}
+
+
+def run_server(server: ZMQServer) -> threading.Thread:
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    sleep(0.5)
+    return thread
+
+
+@pytest.fixture(scope="module")
+def limited_server():
+    server = PeakEchoServer(LIMITED_SERVER_ADDR, max_in_flight=2)
+    run_server(server)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def queued_server():
+    server = PeakEchoServer(QUEUED_SERVER_ADDR, max_in_flight=2, intake_queue_size=3)
+    run_server(server)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def batch_server():
+    server = BatchEchoServer(BATCH_SERVER_ADDR, max_in_flight=100, batch_size=16)
+    run_server(server)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def routed_server():
+    server = RoutedServer(ROUTED_SERVER_ADDR, batch_size=8)
+    run_server(server)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def multi_process_server():
+    server = PidEchoServer(MULTI_PROCESS_SERVER_ADDR, workers=3)
+    # not a daemon, daemon processes can not fork the workers
+    process = multiprocessing.get_context("fork").Process(target=server.start)
+    process.start()
+    sleep(1)
+    yield process
+    if process.is_alive():
+        process.kill()
+    process.join()
+
+
+def build_request(msg: str, delay: float) -> dict:
+    return {
+        "request": {
+            "req_type": "echo",
+            "created": 0,
+            "response_required": True,
+            "req_data": {"msg": msg, "delay": delay},
+            "robot_info": {"fleet": "fleet", "robot": "robot", "service": "service", "id": "id"},
+        }
+    }
+
+
+async def echoing_client(identity: str, addr: str, request: dict) -> AsyncZMQClient:
+    """Returns a client which got a reply echoing its req_id, so it sends its requests at once"""
+    client = AsyncZMQClient(identity, addr)
+    await client.request(request, timeout=5)
+    return client
+
+
+async def send_requests(
+    addr: str, nb_requests: int, delay: float, client: AsyncZMQClient = None
+) -> list:
+    client = client or AsyncZMQClient(f"limit_dealer_{addr}", addr)
+    requests = [build_request(f"msg_{i}", delay) for i in range(nb_requests)]
+    return await asyncio.gather(*[client.request(request, timeout=5) for request in requests])
+
+
+@pytest.mark.test_zmq
+class TestServerBackpressure:
+    @pytest.mark.asyncio
+    async def test_max_in_flight(self, limited_server):
+        start_time = perf_counter()
+        responses = await send_requests(LIMITED_SERVER_ADDR, 6, 0.1)
+        assert perf_counter() - start_time >= 0.3
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(6)]
+        assert limited_server.peak_in_flight == 2
+        stats = limited_server.get_stats()
+        assert stats["received"] == 6
+        assert stats["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_intake_queue(self, queued_server):
+        responses = await send_requests(QUEUED_SERVER_ADDR, 10, 0.1)
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(10)]
+        assert queued_server.peak_in_flight == 2
+        assert 0 < queued_server.peak_queue_depth <= 3
+        assert queued_server.get_stats()["queue_depth"] == 0
+
+
+@pytest.mark.test_zmq
+class TestBatchedReceive:
+    @pytest.mark.asyncio
+    async def test_pending_requests_are_batched(self, batch_server):
+        responses = await send_requests(BATCH_SERVER_ADDR, 500, 0)
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(500)]
+        assert sum(batch_server.batch_sizes) <= 500
+        assert 1 < max(batch_server.batch_sizes) <= 16
+        stats = batch_server.get_stats()
+        assert stats["received"] == 500
+        assert stats["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_batched_requests_are_handled_concurrently(self):
+        server = SlowServer(f"{BATCH_SERVER_ADDR}_slow")
+        start_time = perf_counter()
+        await server.handle_batch([[b"identity", b"request"]] * 16)
+        assert perf_counter() - start_time < 0.6
+        assert server.nb_handled == 16
+
+    @pytest.mark.asyncio
+    async def test_batches_respect_max_in_flight(self, limited_server):
+        limited_server._batch_size = 16
+        responses = await send_requests(LIMITED_SERVER_ADDR, 20, 0.05)
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(20)]
+        assert limited_server.peak_in_flight == 2
+        limited_server._batch_size = 1
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.asyncio
+    async def test_perf_batched_receive(self):
+        """Compares the throughput of the server with and without batching"""
+        nb_requests = 20000
+        request = json.dumps(build_request("perf", 0)).encode()
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "server_batch_perf.txt"), "a") as f:
+            f.write("batch_size,requests,requests_per_sec\n")
+            for batch_size in (1, 64):
+                addr = f"{BATCH_SERVER_ADDR}_perf_{batch_size}"
+                server = EchoServer(addr, batch_size=batch_size)
+                run_server(server)
+                # a raw socket, so the client overhead does not hide the server one
+                socket = zmq.asyncio.Context.instance().socket(zmq.DEALER)
+                socket.setsockopt(zmq.LINGER, 0)
+                socket.connect(addr)
+
+                async def send_all():
+                    for _ in range(nb_requests):
+                        await socket.send(request)
+
+                async def receive_all():
+                    for _ in range(nb_requests):
+                        await socket.recv()
+
+                start_time = perf_counter()
+                await asyncio.wait_for(asyncio.gather(send_all(), receive_all()), 60)
+                duration = perf_counter() - start_time
+                socket.close()
+                server.stop()
+                f.write(f"{batch_size},{nb_requests},{nb_requests / duration:.0f}\n")
+
+
+def with_response(msg: dict, req_type: str = None) -> dict:
+    request = dict(msg["request"], response_required=True)
+    if req_type is not None:
+        request["req_type"] = req_type
+    return {"request": request}
+
+
+def log_request_with_id(msg: dict) -> dict:
+    request = with_response(msg)
+    request["request"]["req_id"] = "0" * 32
+    return request
+
+
+@pytest.mark.test_zmq
+class TestRoutes:
+    def test_routes_are_collected(self):
+        assert set(RoutedServer._routes) == {
+            LOGS_HANDLER_MSG_TYPE,
+            METRICS_HANDLER_MSG_TYPE,
+            SERVER_STATS_MSG_TYPE,
+        }
+        assert RoutedServer._routes[LOGS_HANDLER_MSG_TYPE].model is LogRequest
+        assert ZMQServer._validator is None
+        assert MetricOnlyServer._routes[METRICS_HANDLER_MSG_TYPE].handler_name == "handle_metric"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("codec_name", ["json", "msgpack"])
+    async def test_requests_are_routed(self, routed_server, codec_name):
+        client = AsyncZMQClient(f"routed_dealer_{codec_name}", ROUTED_SERVER_ADDR)
+        client.codec = get_codec(codec_name)
+        log_request = with_response(LOG_REQUEST)
+        log = await client.request(log_request, timeout=5)
+        metric = await client.request(with_response(METRIC_REQUEST), timeout=5)
+        assert log["req_id"] == log_request["request"]["req_id"]
+        assert log["response"] == {"lineno": 142}
+        assert metric["response"] == {"cpu": 12.5}
+        assert isinstance(routed_server.requests[-2], LogRequest)
+        assert isinstance(routed_server.requests[-1], MetricRequest)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("codec_name", ["json", "msgpack"])
+    async def test_zero_copy_requests_are_routed(self, codec_name):
+        addr = f"{ROUTED_SERVER_ADDR}_zero_copy_{codec_name}"
+        server = RoutedServer(addr, zero_copy=True)
+        run_server(server)
+        client = AsyncZMQClient(f"zero_copy_dealer_{codec_name}", addr)
+        client.codec = get_codec(codec_name)
+        with mock.patch.object(server, "_validate", wraps=server._validate) as validate:
+            log = await client.request(with_response(LOG_REQUEST), timeout=5)
+        server.stop()
+        assert log["response"] == {"lineno": 142}
+        # the request is decoded from the buffer of its frame
+        assert isinstance(validate.call_args.args[0], memoryview)
+
+    @pytest.mark.asyncio
+    async def test_invalid_requests_are_dropped(self, routed_server):
+        client = AsyncZMQClient("routed_dealer_invalid", ROUTED_SERVER_ADDR)
+        unknown = await client.request(with_response(LOG_REQUEST, "unknown"), timeout=0.2)
+        invalid = await client.request(with_response(METRIC_REQUEST, LOGS_HANDLER_MSG_TYPE), 0.2)
+        assert unknown == {} and invalid == {}
+        assert (await client.request(with_response(LOG_REQUEST), timeout=5))["response"]
+
+    @pytest.mark.asyncio
+    async def test_batched_requests_are_routed(self, routed_server):
+        client = AsyncZMQClient("routed_dealer_batch", ROUTED_SERVER_ADDR)
+        requests = [with_response(LOG_REQUEST) for _ in range(50)]
+        responses = await asyncio.gather(*[client.request(r, timeout=5) for r in requests])
+        assert [r["req_id"] for r in responses] == [r["request"]["req_id"] for r in requests]
+
+    @pytest.mark.test_zmq_perf
+    def test_perf_route_validation(self, nb_iterations=10000):
+        """Compares validating the request bytes with building the model from a dict"""
+
+        class LogServer(ZMQServer):
+            @route(LOGS_HANDLER_MSG_TYPE, LogRequest)
+            async def handle_log(self, request: LogRequest) -> None:
+                pass
+
+        data = json.dumps(LOG_REQUEST).encode()
+        validations = {
+            "json_loads_model": lambda: LogRequest(**json.loads(data)["request"]),
+            "single_route": lambda: LogServer._validator.validate_json(data),
+            "two_routes": lambda: RoutedServer._validator.validate_json(data),
+        }
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "route_validation_perf.txt"), "a") as f:
+            f.write("validation,msgs_per_sec\n")
+            for name, validate in validations.items():
+                validate()
+                start_time = perf_counter()
+                for _ in range(nb_iterations):
+                    validate()
+                f.write(f"{name},{nb_iterations / (perf_counter() - start_time):.0f}\n")
+
+
+@pytest.mark.test_zmq
+class TestServerStats:
+    def test_latency_histogram(self):
+        stats = RequestTypeStats()
+        stats.record(0.0005, 10, False)
+        stats.record(0.003, 10, True)
+        stats.record(60, 10, False)
+        result = stats.to_dict()
+        assert result["requests"] == 3 and result["errors"] == 1 and result["bytes_in"] == 30
+        assert result["latency_le_1ms"] == 1
+        assert result["latency_le_5ms"] == 1
+        assert result["latency_le_inf"] == 1
+        assert len([key for key in result if key.startswith("latency_le")]) == (
+            len(LATENCY_BUCKETS_MS) + 1
+        )
+
+    def test_stats_interval_in_whole_seconds(self):
+        server = RoutedServer(STATS_SERVER_ADDR + "_int", stats_interval=5)
+        assert server._stats_interval == 5
+
+    @pytest.mark.asyncio
+    async def test_server_stats_request(self):
+        server = RoutedServer(STATS_SERVER_ADDR)
+        run_server(server)
+        client = AsyncZMQClient("stats_dealer", STATS_SERVER_ADDR)
+        for _ in range(3):
+            await client.request(with_response(LOG_REQUEST), timeout=5)
+        failing = with_response(METRIC_REQUEST)
+        failing["request"]["req_data"] = dict(failing["request"]["req_data"], metric_fields={})
+        failing["request"]["req_data"]["metric_fields"]["fail"] = True
+        await client.request(failing, timeout=0.2)
+        await client.request(with_response(METRIC_REQUEST, "unknown"), timeout=0.2)
+
+        stats_request = with_response(METRIC_REQUEST, SERVER_STATS_MSG_TYPE)
+        stats = (await client.request(stats_request, timeout=5))["response"]
+        server.stop()
+        logs = stats["req_types"][LOGS_HANDLER_MSG_TYPE]
+        assert stats["received"] == 6
+        assert logs["requests"] == 3 and logs["errors"] == 0 and logs["in_flight"] == 0
+        assert logs["bytes_in"] == 3 * len(json.dumps(log_request_with_id(LOG_REQUEST)))
+        assert logs["bytes_out"] > 0
+        assert stats["req_types"][METRICS_HANDLER_MSG_TYPE]["errors"] == 1
+        assert stats["req_types"]["invalid"]["errors"] == 1
+        # the stats request is handled while its own stats are recorded
+        assert stats["req_types"][SERVER_STATS_MSG_TYPE]["in_flight"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats_are_sent_as_metrics(self, routed_server):
+        server = RoutedServer(STATS_SERVER_ADDR + "_periodic", stats_interval=0.1)
+        server.stats_addr = ROUTED_SERVER_ADDR
+        run_server(server)
+        client = AsyncZMQClient("stats_dealer_periodic", STATS_SERVER_ADDR + "_periodic")
+        await client.request(with_response(LOG_REQUEST), timeout=5)
+        await asyncio.sleep(0.5)
+        server.stop()
+        metrics = [
+            request.req_data
+            for request in routed_server.requests
+            if isinstance(request, MetricRequest)
+            and request.req_data.measurement == ZMQ_SERVER_STATS_MEASUREMENT
+        ]
+        assert metrics
+        assert metrics[-1].metric_tags == {"server": "ROUTED_SERVER", "req_type": "logs"}
+        assert metrics[-1].metric_fields["requests"] == 1
+
+
+async def stop_later(server: ZMQServer, after: float, drain_timeout: float) -> None:
+    await asyncio.sleep(after)
+    server.stop(drain_timeout=drain_timeout)
+
+
+@pytest.mark.test_zmq
+class TestGracefulStop:
+    def test_stop_interrupts_receive(self):
+        server = EchoServer(f"{DRAIN_SERVER_ADDR}_idle")
+        thread = run_server(server)
+        start_time = perf_counter()
+        server.stop()
+        thread.join(2)
+        assert not thread.is_alive()
+        assert perf_counter() - start_time < 1
+
+    @pytest.mark.asyncio
+    async def test_completed_receive_is_not_interrupted(self):
+        server = EchoServer(f"{DRAIN_SERVER_ADDR}_race", batch_size=1)
+        received = asyncio.get_running_loop().create_future()
+        server._socket = mock.Mock(recv_multipart=mock.Mock(return_value=received))
+        server._spin_task = asyncio.create_task(server._receive())
+        await asyncio.sleep(0)
+        # the request arrives, stop() runs before spin() resumes
+        received.set_result([b"identity", b"request"])
+        server._interrupt_receive()
+        assert await server._spin_task == [[b"identity", b"request"]]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("max_in_flight, intake_queue_size", [(8, 0), (2, 10)])
+    async def test_received_requests_are_drained(self, max_in_flight, intake_queue_size):
+        addr = f"{DRAIN_SERVER_ADDR}_{intake_queue_size}"
+        server = EchoServer(addr, max_in_flight=max_in_flight, intake_queue_size=intake_queue_size)
+        thread = run_server(server)
+        client = await echoing_client(f"drain_dealer_{addr}", addr, build_request("hello", 0))
+        responses, _ = await asyncio.gather(
+            send_requests(addr, 8, 0.2, client), stop_later(server, 0.1, drain_timeout=2)
+        )
+        assert [r["response"]["msg"] for r in responses] == [f"msg_{i}" for i in range(8)]
+        thread.join(2)
+        assert not thread.is_alive()
+        assert server.get_stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_drain_timeout(self):
+        addr = f"{DRAIN_SERVER_ADDR}_timeout"
+        server = EchoServer(addr)
+        thread = run_server(server)
+        client = AsyncZMQClient("drain_dealer_timeout", addr)
+        response, _ = await asyncio.gather(
+            client.request(build_request("slow", 3), timeout=1),
+            stop_later(server, 0.1, drain_timeout=0.2),
+        )
+        assert response == {}
+        # the handler would still sleep for 2 seconds
+        thread.join(0.5)
+        assert not thread.is_alive()
+
+
+@pytest.fixture(scope="module")
+def offload_server():
+    server = OffloadServer(OFFLOAD_SERVER_ADDR)
+    run_server(server)
+    yield server
+    server.stop()
+
+
+async def ping_latency(client: AsyncZMQClient) -> float:
+    start_time = perf_counter()
+    await client.request(with_response(LOG_REQUEST, "ping"), timeout=5)
+    return perf_counter() - start_time
+
+
+@pytest.mark.test_zmq
+class TestExecutorOffload:
+    def test_unknown_executor(self):
+        with pytest.raises(ArgumentError):
+            route("ping", executor="gpu")
+
+    def test_process_handler_must_be_a_staticmethod(self):
+        with pytest.raises(ArgumentError):
+
+            class MethodProcessServer(ZMQServer):
+                @route("burn_process", LogRequest, executor=ExecutorType.PROCESS)
+                def burn_process(self, request: LogRequest) -> dict:
+                    return {}
+
+    def test_thread_handler_can_not_be_a_coroutine(self):
+        with pytest.raises(ArgumentError):
+
+            class AsyncThreadServer(ZMQServer):
+                @route("sleep_thread", executor=ExecutorType.THREAD)
+                async def sleep_thread(self, request: Request) -> dict:
+                    return {}
+
+    @pytest.mark.asyncio
+    async def test_thread_handler_does_not_block_the_loop(self, offload_server):
+        client = await echoing_client(
+            "offload_dealer_thread", OFFLOAD_SERVER_ADDR, with_response(LOG_REQUEST, "ping")
+        )
+        for req_type, blocked in (("sleep_thread", False), ("sleep_inline", True)):
+            response, latency = await asyncio.gather(
+                client.request(with_response(LOG_REQUEST, req_type), timeout=5),
+                ping_latency(client),
+            )
+            assert (latency >= 0.3) is blocked
+            assert response["response"]["thread"].startswith("OFFLOAD_SERVER") is not blocked
+        stats = offload_server.get_request_stats()["sleep_thread"]
+        assert stats["run_avg_ms"] >= 300
+        assert 0 <= stats["queue_avg_ms"] < 300
+        assert "run_avg_ms" not in offload_server.get_request_stats()["sleep_inline"]
+
+    @pytest.mark.asyncio
+    async def test_process_handler(self, offload_server):
+        client = AsyncZMQClient("offload_dealer_process", OFFLOAD_SERVER_ADDR)
+        requests = [with_response(LOG_REQUEST, "burn_process") for _ in range(4)]
+        responses = await asyncio.gather(*[client.request(r, timeout=10) for r in requests])
+        assert all(r["response"]["lineno"] == 142 for r in responses)
+        assert os.getpid() not in {r["response"]["pid"] for r in responses}
+        process_pool = offload_server._executors[ExecutorType.PROCESS]
+        assert process_pool._mp_context.get_start_method() == "forkserver"
+        assert offload_server.get_request_stats()["burn_process"]["run_avg_ms"] >= 20
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.asyncio
+    async def test_perf_offload_ping_latency(self, offload_server, nb_requests=50):
+        """Compares the latency of light requests sent along CPU-heavy ones"""
+        client = AsyncZMQClient("offload_dealer_perf", OFFLOAD_SERVER_ADDR)
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "server_offload_perf.txt"), "a") as f:
+            f.write("executor,heavy_requests,avg_ping_ms,max_ping_ms\n")
+            for executor in ("inline", "thread", "process"):
+                heavy = [
+                    client.request(with_response(LOG_REQUEST, f"burn_{executor}"), timeout=30)
+                    for _ in range(nb_requests)
+                ]
+                heavy_task = asyncio.gather(*heavy)
+                latencies = []
+                while not heavy_task.done():
+                    latencies.append(await ping_latency(client))
+                await heavy_task
+                f.write(
+                    f"{executor},{nb_requests},{sum(latencies) * 1000 / len(latencies):.1f},"
+                    f"{max(latencies) * 1000:.1f}\n"
+                )
+
+
+def build_query(robot: str, delay: float = 0, req_type=LOGS_QUERY_HANDLER_MSG_TYPE) -> dict:
+    request = with_response(LOG_REQUEST, req_type)
+    request["request"]["req_data"] = {"robot": robot, "limit": 100, "delay": delay}
+    return request
+
+
+@pytest.mark.test_zmq
+class TestResponseCache:
+    def test_key_ignores_the_order_of_the_keys(self):
+        first = QueryRequest(**build_query("robot_1")["request"])
+        second = build_query("robot_1")["request"]
+        second["req_data"] = dict(reversed(list(second["req_data"].items())))
+        other = QueryRequest(**build_query("robot_2")["request"])
+        assert make_cache_key(first) == make_cache_key(QueryRequest(**second))
+        assert make_cache_key(first) != make_cache_key(other)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.05, max_bytes=100)
+        cache.put("key", None, 10)
+        assert cache.get("key") is None
+        sleep(0.06)
+        assert cache.get("key") is MISS
+        assert cache.get_stats() == {
+            "hits": 1,
+            "misses": 1,
+            "evictions": 0,
+            "expired": 1,
+            "entries": 0,
+            "bytes": 0,
+        }
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(ttl=10, max_bytes=100)
+        for key in ("a", "b", "c"):
+            cache.put(key, key, 40)
+        assert cache.get("a") is MISS
+        # b is used, so c is evicted first
+        assert cache.get("b") == "b"
+        cache.put("d", "d", 40)
+        assert cache.get("c") is MISS
+        assert cache.get("b") == "b"
+        cache.put("huge", "huge", 101)
+        assert cache.get("huge") is MISS
+        stats = cache.get_stats()
+        assert stats["evictions"] == 2 and stats["entries"] == 2 and stats["bytes"] == 80
+
+    @pytest.mark.asyncio
+    async def test_cached_responses(self):
+        server = QueryServer(QUERY_SERVER_ADDR)
+        run_server(server)
+        client = AsyncZMQClient("query_dealer", QUERY_SERVER_ADDR)
+        queries = [build_query("robot_1"), build_query("robot_1"), build_query("robot_2")]
+        responses = [await client.request(query, timeout=5) for query in queries]
+        server.stop()
+        assert server.nb_queries == 2
+        assert [r["req_id"] for r in responses] == [q["request"]["req_id"] for q in queries]
+        assert responses[0]["response"] == responses[1]["response"] == {"rows": ["robot_1"] * 3}
+        assert responses[2]["response"] == {"rows": ["robot_2"] * 3}
+        stats = server.get_cache_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["entries"] == 2
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.asyncio
+    async def test_perf_polled_queries(self, nb_polls=200):
+        """Compares the latency of dashboards polling the same or distinct queries"""
+        addr = f"{QUERY_SERVER_ADDR}_perf"
+        server = QueryServer(addr)
+        run_server(server)
+        client = AsyncZMQClient("query_dealer_perf", addr)
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "server_cache_perf.txt"), "a") as f:
+            f.write("queries,polls,backend_queries,avg_latency_ms\n")
+            for queries in ("same", "distinct"):
+                nb_queries = server.nb_queries
+                start_time = perf_counter()
+                for i in range(nb_polls):
+                    robot = "robot" if queries == "same" else f"robot_{i}"
+                    await client.request(build_query(robot, delay=0.005), timeout=5)
+                latency = (perf_counter() - start_time) / nb_polls
+                f.write(
+                    f"{queries},{nb_polls},{server.nb_queries - nb_queries},"
+                    f"{latency * 1000:.2f}\n"
+                )
+        server.stop()
+
+
+@pytest.mark.test_zmq
+class TestCoalescing:
+    @pytest.mark.asyncio
+    async def test_identical_requests_are_handled_once(self):
+        addr = f"{QUERY_SERVER_ADDR}_coalesce"
+        server = QueryServer(addr)
+        run_server(server)
+        clients = [AsyncZMQClient(f"coalesce_dealer_{i}", addr) for i in range(10)]
+        queries = [build_query("robot_1", 0.2, ALERT_QUERY_HANDLER_MSG_TYPE) for _ in clients]
+        queries.append(build_query("robot_2", 0.2, ALERT_QUERY_HANDLER_MSG_TYPE))
+        clients.append(clients[0])
+        responses = await asyncio.gather(
+            *[client.request(query, timeout=5) for client, query in zip(clients, queries)]
+        )
+        assert server.nb_queries == 2
+        assert [r["req_id"] for r in responses] == [q["request"]["req_id"] for q in queries]
+        assert all(r["response"] == {"rows": ["robot_1"] * 3} for r in responses[:10])
+        assert responses[10]["response"] == {"rows": ["robot_2"] * 3}
+        # the requests received once the response was sent are handled again
+        await clients[0].request(build_query("robot_1", 0, ALERT_QUERY_HANDLER_MSG_TYPE), 5)
+        server.stop()
+        assert server.nb_queries == 3
+        stats = server.get_request_stats()[ALERT_QUERY_HANDLER_MSG_TYPE]
+        assert stats["coalesced"] == 9 and stats["requests"] == 3
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_handled_again_when_the_request_fails(self):
+        addr = f"{QUERY_SERVER_ADDR}_coalesce_failure"
+        server = QueryServer(addr)
+        server.nb_failures = 1
+        run_server(server)
+        clients = [AsyncZMQClient(f"coalesce_failure_dealer_{i}", addr) for i in range(5)]
+        query = build_query("robot_1", 0.2, ALERT_QUERY_HANDLER_MSG_TYPE)
+        responses = await asyncio.gather(*[client.request(query, timeout=2) for client in clients])
+        server.stop()
+        # the failed request gets no reply, the requests which joined it get the response
+        assert responses.count({}) == 1
+        assert all(r["response"] == {"rows": ["robot_1"] * 3} for r in responses if r)
+        assert server.nb_queries == 2
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.asyncio
+    async def test_perf_refresh_storm(self, nb_clients=50):
+        """Compares the backend load of many dashboards refreshing the same query"""
+        addr = f"{QUERY_SERVER_ADDR}_storm"
+        server = QueryServer(addr)
+        run_server(server)
+        clients = [AsyncZMQClient(f"storm_dealer_{i}", addr) for i in range(nb_clients)]
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "server_coalesce_perf.txt"), "a") as f:
+            f.write("req_type,clients,backend_queries,storm_ms\n")
+            for req_type in ("uncoalesced_query", ALERT_QUERY_HANDLER_MSG_TYPE):
+                nb_queries = server.nb_queries
+                start_time = perf_counter()
+                await asyncio.gather(
+                    *[c.request(build_query("robot", 0.05, req_type), 10) for c in clients]
+                )
+                duration = perf_counter() - start_time
+                f.write(
+                    f"{req_type},{nb_clients},{server.nb_queries - nb_queries},"
+                    f"{duration * 1000:.1f}\n"
+                )
+        server.stop()
+
+
+async def command_during_log_flood(server: TelemetryServer, nb_logs: int) -> tuple:
+    """Sends a command after a flood of logs, returns its latency and the logs handled before"""
+    client = AsyncMessageClient(server._addr)
+    for i in range(nb_logs):
+        await client.send_request(LOGS_HANDLER_MSG_TYPE, {"lineno": i})
+    # the logs wait in the intake queue, not on the socket
+    while server.get_stats()["received"] < nb_logs:
+        await asyncio.sleep(0.001)
+    start_time = perf_counter()
+    response = await client.send_request(COMMAND_HANDLER_MSG_TYPE, {}, response_required=True)
+    latency = perf_counter() - start_time
+    while server.nb_logs < nb_logs:
+        await asyncio.sleep(0.05)
+    return latency, response["response"]["logs_before"]
+
+
+@pytest.mark.test_zmq
+class TestPriorityLanes:
+    @pytest.mark.asyncio
+    async def test_lanes_are_weighted(self):
+        lanes = IntakeLanes(100, {Priority.LOW: 1, Priority.HIGH: 8, Priority.NORMAL: 2})
+        for i in range(4):
+            await lanes.put(Priority.LOW, f"low_{i}")
+        for i in range(3):
+            await lanes.put(Priority.HIGH, f"high_{i}")
+        for i in range(5):
+            await lanes.put(Priority.NORMAL, f"normal_{i}")
+        assert lanes.qsizes() == {Priority.HIGH: 3, Priority.NORMAL: 5, Priority.LOW: 4}
+        order = []
+        for _ in range(12):
+            priority, buffer = await lanes.get()
+            order.append(buffer)
+            lanes.task_done(priority)
+        assert order == [
+            "high_0",
+            "high_1",
+            "high_2",
+            "normal_0",
+            "normal_1",
+            "low_0",
+            "normal_2",
+            "normal_3",
+            "low_1",
+            "normal_4",
+            "low_2",
+            "low_3",
+        ]
+        await asyncio.wait_for(lanes.join(), 1)
+        assert lanes.qsize() == 0
+
+    @pytest.mark.parametrize("codec_name", ["json", "msgpack"])
+    def test_peek_req_type(self, codec_name):
+        codec = get_codec(codec_name)
+        buffer = [b"identity", codec.tag, codec.encode(LOG_REQUEST)]
+        assert peek_req_type(buffer) == LOGS_HANDLER_MSG_TYPE
+        assert peek_req_type([b"identity", b"{}"]) is None
+        assert peek_req_type([b"identity", b"not json"]) is None
+
+    @pytest.mark.asyncio
+    async def test_commands_skip_the_log_flood(self):
+        server = TelemetryServer(TELEMETRY_SERVER_ADDR)
+        run_server(server)
+        _, logs_before = await command_during_log_flood(server, 300)
+        server.stop()
+        assert logs_before < 100
+
+    @pytest.mark.asyncio
+    async def test_fifo_without_priorities(self):
+        addr = f"{TELEMETRY_SERVER_ADDR}_fifo"
+        server = FifoTelemetryServer(addr)
+        run_server(server)
+        _, logs_before = await command_during_log_flood(server, 300)
+        server.stop()
+        assert logs_before == 300
+
+    @pytest.mark.test_zmq_perf
+    @pytest.mark.asyncio
+    async def test_perf_command_latency(self):
+        """Compares the latency of a command sent during a log flood with and without lanes"""
+        if not os.path.exists(PERF_TEST_RESULTS_DIR):
+            os.makedirs(PERF_TEST_RESULTS_DIR)
+
+        with open(os.path.join(PERF_TEST_RESULTS_DIR, "server_priority_perf.txt"), "a") as f:
+            f.write("server,logs,command_latency_ms,logs_before_command\n")
+            for server_type in (FifoTelemetryServer, TelemetryServer):
+                for nb_logs in (100, 1000):
+                    addr = f"{TELEMETRY_SERVER_ADDR}_perf_{server_type.__name__}_{nb_logs}"
+                    server = server_type(addr)
+                    run_server(server)
+                    latency, logs_before = await command_during_log_flood(server, nb_logs)
+                    server.stop()
+                    f.write(
+                        f"{server_type.__name__},{nb_logs},{latency * 1000:.1f},{logs_before}\n"
+                    )
+
+
+@pytest.mark.test_zmq
+class TestMultiProcessServer:
+    @pytest.mark.asyncio
+    async def test_requests_are_handled_by_the_workers(self, multi_process_server):
+        responses = await send_requests(MULTI_PROCESS_SERVER_ADDR, 30, 0.05)
+        pids = {response["response"]["pid"] for response in responses}
+        assert len(pids) == 3
+        assert multi_process_server.pid not in pids
+
+    @pytest.mark.asyncio
+    async def test_workers_drain_and_stop_with_the_server(self, multi_process_server):
+        workers = psutil.Process(multi_process_server.pid).children()
+        assert len(workers) == 3
+
+        async def terminate_later():
+            await asyncio.sleep(0.1)
+            os.kill(multi_process_server.pid, signal.SIGTERM)
+
+        responses, _ = await asyncio.gather(
+            send_requests(MULTI_PROCESS_SERVER_ADDR, 6, 0.3), terminate_later()
+        )
+        assert all(response["response"]["pid"] for response in responses)
+        await asyncio.get_running_loop().run_in_executor(None, multi_process_server.join, 5)
+        assert multi_process_server.exitcode == 0
+        _, alive = psutil.wait_procs(workers, timeout=5)
+        assert not alive
+
+    def test_workers_stop_when_the_server_is_killed(self):
+        server = PidEchoServer(MULTI_PROCESS_SERVER_ADDR, workers=2)
+        process = multiprocessing.get_context("fork").Process(target=server.start)
+        process.start()
+        sleep(1)
+        workers = psutil.Process(process.pid).children()
+        process.kill()
+        process.join()
+        _, alive = psutil.wait_procs(workers, timeout=5)
+        assert not alive
+        # a killed server can not remove its backend socket
+        os.remove(os.path.join(tempfile.gettempdir(), f"ECHO_SERVER-workers-{process.pid}.sock"))